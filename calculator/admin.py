@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .catalog import bump_catalog_version
 from .models import Tank
 
 
@@ -12,3 +13,15 @@ class TankAdmin(admin.ModelAdmin):
     search_fields = ("model",)
     # no inlines needed
 
+    # Admin writes change the catalog too: invalidate cached counts and stats
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_catalog_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_catalog_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
@@ -1,14 +1,33 @@
 from django.shortcuts import render, redirect
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.db import transaction
+from django.db.models import Count, Q
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from .models import Tank
-import csv
-import io
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ImportJob, PendingImport, Tank, WriteJournal
+from .chunked_writes import close_journal, rollback_journal, start_journal
+from .csv_import import (
+    LOOKUP_CHUNK_SIZE, TANK_FIELDS, chunked, classify, existing_tanks,
+    iter_csv_rows, parse_tank_row,
+)
+from .staging import (
+    apply_price_import, discard_import, finish_import, get_import,
+    release_import, stage_rows, start_import,
+)
+from .jobs import fail_stale_jobs, is_stale, submit_import_job
+from .pricing import fold_price_lists, schedule_price_import, with_effective_prices
+from .repricing import apply_reprice, parse_rule, preview_reprice
+from .exports import stream_export
+from .catalog import bump_catalog_version, cached_count
+from .pagination import keyset_page
+from .validation import validate_catalog, validate_staged_import
+from .instrumentation import SAMPLE_RATE, JsonResponse, collected_stats, reset_stats, stats_scope
 from decimal import Decimal, InvalidOperation
 from datetime import datetime
 
@@ -16,61 +35,151 @@ from datetime import datetime
 @login_required
 def admin_dashboard(request):
     """Main admin dashboard with statistics"""
+    # Totals and the category breakdown come from one grouped query
+    counts = {
+        row['category']: row
+        for row in Tank.objects.order_by().values('category').annotate(
+            count=Count('id'), active=Count('id', filter=Q(is_active=True)),
+        )
+    }
+    total_tanks  = sum(row['count'] for row in counts.values())
+    active_tanks = sum(row['active'] for row in counts.values())
+    
     context = {
-        'total_tanks': Tank.objects.count(),
-        'active_tanks': Tank.objects.filter(is_active=True).count(),
-        'inactive_tanks': Tank.objects.filter(is_active=False).count(),
-        'last_updated': Tank.objects.order_by('-updated_at').first(),
+        'total_tanks': total_tanks,
+        'active_tanks': active_tanks,
+        'inactive_tanks': total_tanks - active_tanks,
+        'last_updated': Tank.objects.only('updated_at').order_by('-updated_at').first(),
         'categories': {}
     }
     
     # Category breakdown
     for category_code, category_name in Tank.CATEGORY_CHOICES:
+        row = counts.get(category_code, {})
         context['categories'][category_code] = {
             'name': category_name,
-            'count': Tank.objects.filter(category=category_code).count(),
-            'active': Tank.objects.filter(category=category_code, is_active=True).count()
+            'count': row.get('count', 0),
+            'active': row.get('active', 0)
         }
     
     return render(request, 'calculator/admin/dashboard.html', context)
 
 
-@login_required
-def admin_tank_list(request):
-    """Tank list with search, filter, and pagination"""
-    tanks = Tank.objects.all().order_by('-updated_at')
-    
-    # Search
-    search = request.GET.get('search', '').strip()
+TANK_LIST_PAGE_SIZE = 25
+
+# Range filters: request parameter → Tank lookup
+RANGE_FILTERS = {
+    'min_capacity': 'net_capacity__gte',
+    'max_capacity': 'net_capacity__lte',
+    'min_diameter': 'diameter__gte',
+    'max_diameter': 'diameter__lte',
+    'min_height':   'height__gte',
+    'max_height':   'height__lte',
+}
+
+
+def _apply_tank_filters(qs, params):
+    """
+    Narrow a Tank queryset by the admin filter parameters (request.GET
+    or a JSON dict): search, category, status and the RANGE_FILTERS.
+    Raises ValueError for non-numeric range values.
+    """
+    search = str(params.get('search') or '').strip()
     if search:
-        tanks = tanks.filter(model__icontains=search)
+        qs = qs.filter(model__icontains=search)
     
-    # Filter by category
-    category = request.GET.get('category', '').strip()
+    category = str(params.get('category') or '').strip()
     if category:
-        tanks = tanks.filter(category=category)
+        qs = qs.filter(category=category.upper())
     
-    # Filter by status
-    status = request.GET.get('status', '').strip()
+    status = str(params.get('status') or '').strip()
     if status == 'active':
-        tanks = tanks.filter(is_active=True)
+        qs = qs.filter(is_active=True)
     elif status == 'inactive':
-        tanks = tanks.filter(is_active=False)
+        qs = qs.filter(is_active=False)
+    
+    for param, lookup in RANGE_FILTERS.items():
+        value = params.get(param)
+        if value not in (None, ''):
+            try:
+                qs = qs.filter(**{lookup: float(value)})
+            except (TypeError, ValueError):
+                raise ValueError(f"'{param}' must be a number")
+    
+    return qs
+
+
+@login_required
+def admin_tank_list(request):
+    """Tank list with search, filter, and keyset pagination"""
+    search = request.GET.get('search', '').strip()
+    category = request.GET.get('category', '').strip()
+    status = request.GET.get('status', '').strip()
+    
+    try:
+        tanks = _apply_tank_filters(Tank.objects.all(), request.GET)
+    except ValueError:
+        tanks = Tank.objects.none()
+    
+    # Totals are cached per catalog version, so paging doesn't COUNT(*) every time
+    filters = {key: request.GET.get(key) for key in ('search', 'category', 'status', *RANGE_FILTERS)}
+    total = cached_count(tanks, 'admin_tank_list', filters)
     
-    # Pagination
-    paginator = Paginator(tanks, 25)
-    page = request.GET.get('page', 1)
-    tanks_page = paginator.get_page(page)
+    # Show the prices customers see, effective price lists included
+    tanks = with_effective_prices(tanks)
+    
+    # Pagination: (updated_at, id) cursors instead of OFFSET
+    try:
+        number = int(request.GET.get('p', 1))
+    except ValueError:
+        number = 1
+    tanks_page = keyset_page(
+        tanks,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=TANK_LIST_PAGE_SIZE,
+        number=number,
+        count=total,
+    )
     
     return render(request, 'calculator/admin/tank_list.html', {
         'tanks': tanks_page,
         'categories': Tank.CATEGORY_CHOICES,
         'current_search': search,
         'current_category': category,
-        'current_status': status
+        'current_status': status,
+        'filter_query': _filter_query(request.GET),
     })
 
 
+def _filter_query(params):
+    """The list's filter parameters as a query string (for export links)."""
+    query = params.copy()
+    for key in ('after', 'before', 'p', 'type', 'format'):
+        query.pop(key, None)
+    return query.urlencode()
+
+
+# Inline-editable tank fields
+PRICE_EDIT_FIELDS   = ('ideal_price', 'nrp')
+NUMBER_EDIT_FIELDS  = ('net_capacity', 'gross_capacity', 'diameter', 'height')
+EDITABLE_FIELDS     = PRICE_EDIT_FIELDS + NUMBER_EDIT_FIELDS + ('is_active',)
+
+# Most cells accepted by one batch edit request
+TANK_BATCH_LIMIT = 5000
+
+
+def _parse_tank_value(field, value):
+    """Convert a submitted cell value; raises ValueError / InvalidOperation."""
+    if field in PRICE_EDIT_FIELDS:
+        return Decimal(str(value))
+    if field in NUMBER_EDIT_FIELDS:
+        return float(value)
+    if field == 'is_active':
+        return value is True or str(value).lower() == 'true'
+    raise ValueError('Invalid field')
+
+
 @login_required
 @require_POST
 def admin_tank_update(request):
@@ -83,16 +192,15 @@ def admin_tank_update(request):
         tank = Tank.objects.get(id=tank_id)
         
         # Validate and update field
-        if field == 'ideal_price' or field == 'nrp':
-            setattr(tank, field, Decimal(value))
-        elif field == 'net_capacity' or field == 'gross_capacity' or field == 'diameter' or field == 'height':
-            setattr(tank, field, float(value))
-        elif field == 'is_active':
-            setattr(tank, field, value == 'true')
-        else:
+        if field not in EDITABLE_FIELDS:
             return JsonResponse({'success': False, 'error': 'Invalid field'}, status=400)
+        setattr(tank, field, _parse_tank_value(field, value))
         
-        tank.save()
+        # An effective price list would otherwise keep overriding the edit
+        if field in PRICE_EDIT_FIELDS:
+            fold_price_lists()
+        tank.save(update_fields=[field, 'updated_at'])
+        bump_catalog_version()
         
         return JsonResponse({
             'success': True,
@@ -114,9 +222,10 @@ def admin_tank_toggle(request):
     """Toggle tank active status"""
     try:
         tank_id = request.POST.get('tank_id')
-        tank = Tank.objects.get(id=tank_id)
+        tank = Tank.objects.only('id', 'is_active').get(id=tank_id)
         tank.is_active = not tank.is_active
-        tank.save()
+        tank.save(update_fields=['is_active', 'updated_at'])
+        bump_catalog_version()
         
         return JsonResponse({
             'success': True,
@@ -129,6 +238,102 @@ def admin_tank_toggle(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required
+@require_POST
+def admin_tank_batch_update(request):
+    """
+    Apply many cell edits and toggles in one request.
+    Body: {"edits":   [{"tank_id": 1, "field": "ideal_price", "value": "125000"}, ...],
+           "toggles": [{"tank_id": 2, "is_active": false}, {"tank_id": 3}, ...],
+           "all_or_nothing": false}
+    Every cell is validated first; the valid ones are written with one
+    bulk_update limited to the touched fields. A toggle without
+    is_active flips the current status. Returns one result per cell.
+    """
+    import json
+    
+    try:
+        body = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    
+    cells = [dict(cell, field=cell.get('field')) for cell in body.get('edits', [])]
+    cells += [dict(cell, field='is_active', value=cell.get('is_active')) for cell in body.get('toggles', [])]
+    if not cells:
+        return JsonResponse({'success': False, 'error': 'No edits'}, status=400)
+    if len(cells) > TANK_BATCH_LIMIT:
+        return JsonResponse({'success': False, 'error': f'At most {TANK_BATCH_LIMIT} edits per request'}, status=400)
+    
+    try:
+        # ── Validate everything before touching the database ──
+        ids = set()
+        for cell in cells:
+            try:
+                ids.add(int(cell.get('tank_id')))
+            except (TypeError, ValueError):
+                pass
+        fields = {cell['field'] for cell in cells if cell['field'] in EDITABLE_FIELDS}
+        # Fold effective price lists before loading: the bulk UPDATE writes
+        # every edited field back, and must not resurrect pre-fold prices
+        if fields & set(PRICE_EDIT_FIELDS):
+            fold_price_lists()
+        tanks = Tank.objects.only('id', *fields).in_bulk(ids)
+        
+        results = []
+        changed = {}
+        for cell in cells:
+            result = {'tank_id': cell.get('tank_id'), 'field': cell['field']}
+            results.append(result)
+            try:
+                tank = tanks.get(int(cell.get('tank_id')))
+            except (TypeError, ValueError):
+                tank = None
+            if tank is None:
+                result.update(success=False, error='Tank not found')
+                continue
+            if cell['field'] not in EDITABLE_FIELDS:
+                result.update(success=False, error='Invalid field')
+                continue
+            try:
+                if cell['field'] == 'is_active' and cell.get('value') is None:
+                    value = not tank.is_active
+                else:
+                    value = _parse_tank_value(cell['field'], cell.get('value'))
+            except (ValueError, InvalidOperation, TypeError):
+                result.update(success=False, error=f"Invalid value: {cell.get('value')}")
+                continue
+            setattr(tank, cell['field'], value)
+            changed[tank.id] = tank
+            result.update(success=True, value=str(value))
+        
+        failed = sum(1 for result in results if not result['success'])
+        if failed and body.get('all_or_nothing'):
+            for result in results:
+                if result['success']:
+                    result.update(success=False, error='Not applied: other edits failed')
+            return JsonResponse({'success': False, 'error': f'{failed} invalid edits', 'results': results}, status=400)
+        
+        # ── One bulk UPDATE for all valid cells ──
+        if changed:
+            now = timezone.now()
+            for tank in changed.values():
+                tank.updated_at = now
+            with transaction.atomic():
+                Tank.objects.bulk_update(changed.values(), [*sorted(fields), 'updated_at'], batch_size=500)
+            bump_catalog_version()
+        
+        return JsonResponse({
+            'success': failed == 0,
+            'updated_tanks': len(changed),
+            'applied': len(results) - failed,
+            'failed': failed,
+            'results': results,
+        })
+        
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
 @login_required
 def admin_csv_upload(request):
     """CSV upload page"""
@@ -148,151 +353,343 @@ def admin_csv_preview(request):
         if not csv_file.name.endswith('.csv'):
             return JsonResponse({'success': False, 'error': 'File must be CSV'}, status=400)
         
-        # Read CSV
-        decoded_file = csv_file.read().decode('utf-8')
-        io_string = io.StringIO(decoded_file)
-        reader = csv.DictReader(io_string)
-        
         changes = []
         errors = []
+        unchanged_count = 0
         
-        for row_num, row in enumerate(reader, start=2):
-            try:
-                model = row.get('tank_model', '').strip()
-                
-                if not model:
-                    errors.append(f"Row {row_num}: Missing tank_model")
-                    continue
-                
-                # Check if tank exists
-                existing_tank = Tank.objects.filter(model=model).first()
-                
-                change_data = {
-                    'row': row_num,
-                    'model': model,
-                    'action': 'update' if existing_tank else 'create',
-                    'old_data': {},
-                    'new_data': {}
-                }
-                
-                # Parse new data
-                try:
-                    new_data = {
-                        'diameter': float(row.get('diameter', 0)),
-                        'height': float(row.get('height', 0)),
-                        'net_capacity': float(row.get('net_capacity', 0)),
-                        'gross_capacity': float(row.get('gross_capacity', 0)),
-                        'ideal_price': float(row.get('ideal_price', 0)),
-                        'nrp': float(row.get('nrp', 0)),
-                    }
-                    change_data['new_data'] = new_data
-                except (ValueError, KeyError) as e:
-                    errors.append(f"Row {row_num}: Invalid data - {str(e)}")
-                    continue
-                
-                # If updating, show old values
-                if existing_tank:
-                    change_data['old_data'] = {
-                        'diameter': float(existing_tank.diameter),
-                        'height': float(existing_tank.height),
-                        'net_capacity': float(existing_tank.net_capacity),
-                        'gross_capacity': float(existing_tank.gross_capacity),
-                        'ideal_price': float(existing_tank.ideal_price),
-                        'nrp': float(existing_tank.nrp),
-                    }
-                
-                changes.append(change_data)
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
+        # No transaction around the whole preview: each chunk's staged rows
+        # commit on their own, so the write lock is held per INSERT only
+        pending = start_import(request, PendingImport.KIND_CATALOG, csv_file.name)
+        try:
+            # Stream the upload and resolve existing tanks one chunk at a time
+            # (one model__in query per chunk instead of one query per row)
+            for chunk in chunked(iter_csv_rows(csv_file), LOOKUP_CHUNK_SIZE):
+                chunk_changes, chunk_unchanged = _preview_csv_chunk(pending, chunk, errors)
+                changes.extend(chunk_changes)
+                unchanged_count += chunk_unchanged
+        except Exception:
+            discard_import(request, PendingImport.KIND_CATALOG)
+            raise
         
-        # Store changes in session for confirmation
-        request.session['csv_changes'] = changes
+        summary = {
+            'to_create': len([c for c in changes if c['action'] == 'create']),
+            'to_update': len([c for c in changes if c['action'] == 'update']),
+            'unchanged': unchanged_count,
+            'errors': len(errors)
+        }
+        
+        # Consistency checks on the catalog as it would look after import,
+        # read outside any write transaction
+        validation = validate_staged_import(pending)
+        summary['validation_errors'] = validation['errors']
+        summary['validation_warnings'] = validation['warnings']
+        finish_import(pending, summary)
         
         return JsonResponse({
             'success': True,
+            'import_id': str(pending.import_id),
             'changes': changes,
             'errors': errors,
-            'summary': {
-                'to_create': len([c for c in changes if c['action'] == 'create']),
-                'to_update': len([c for c in changes if c['action'] == 'update']),
-                'errors': len(errors)
-            }
+            'summary': summary,
+            'validation': validation
         })
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _preview_csv_chunk(pending, chunk, errors):
+    """
+    Classify one chunk of CSV rows against the catalog and stage the
+    creates/updates. Returns (changes shown in the preview, unchanged count).
+    """
+    changes = []
+    staged = []
+    parsed = []
+    unchanged = 0
+    for row_num, row in chunk:
+        model = (row.get('tank_model') or '').strip()
+        
+        if not model:
+            errors.append(f"Row {row_num}: Missing tank_model")
+            continue
+        
+        try:
+            new_data = parse_tank_row(row)
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(f"Row {row_num}: Invalid data - {str(e)}")
+            continue
+        
+        parsed.append((row_num, model, new_data))
+    
+    existing = existing_tanks(model for _, model, _ in parsed)
+    
+    for row_num, model, new_data in parsed:
+        old_data = existing.get(model)
+        action = classify(old_data, new_data)
+        
+        if action == 'unchanged':
+            unchanged += 1
+            continue
+        
+        staged.append(dict(
+            new_data,
+            row_num=row_num,
+            tank_id=old_data['id'] if old_data else None,
+            model=model,
+            action=action,
+        ))
+        changes.append({
+            'row': row_num,
+            'model': model,
+            'action': action,
+            # If updating, show old values
+            'old_data': {f: old_data[f] for f in TANK_FIELDS} if old_data else {},
+            'new_data': dict(new_data, category=Tank.extract_category_from_model(model)),
+        })
+    
+    stage_rows(pending, staged)
+    return changes, unchanged
+
+
 @login_required
 @require_POST
 def admin_csv_confirm(request):
-    """Apply confirmed CSV changes"""
+    """Queue confirmed CSV changes as a background import job"""
     try:
-        changes = request.session.get('csv_changes', [])
+        pending = get_import(request, PendingImport.KIND_CATALOG)
         
-        if not changes:
+        if not pending or not pending.rows.exists():
             return JsonResponse({'success': False, 'error': 'No changes to apply'}, status=400)
         
-        created_count = 0
-        updated_count = 0
-        errors = []
-        
-        with transaction.atomic():
-            for change in changes:
-                try:
-                    model = change['model']
-                    new_data = change['new_data']
-                    
-                    # Extract category
-                    category = Tank.extract_category_from_model(model)
-                    if not category:
-                        errors.append(f"{model}: Could not determine category")
-                        continue
-                    
-                    # Create or update
-                    tank, created = Tank.objects.update_or_create(
-                        model=model,
-                        defaults={
-                            'category': category,
-                            'diameter': new_data['diameter'],
-                            'height': new_data['height'],
-                            'net_capacity': new_data['net_capacity'],
-                            'gross_capacity': new_data['gross_capacity'],
-                            'ideal_price': new_data['ideal_price'],
-                            'nrp': new_data['nrp'],
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-                        
-                except Exception as e:
-                    errors.append(f"{model}: {str(e)}")
-        
-        # Clear session
-        if 'csv_changes' in request.session:
-            del request.session['csv_changes']
+        # The job upserts straight from the staging table; the request
+        # returns immediately and the page polls the status URL
+        job = submit_import_job(pending, created_by=request.user.get_username())
+        release_import(request, PendingImport.KIND_CATALOG)
         
         return JsonResponse({
             'success': True,
-            'created': created_count,
-            'updated': updated_count,
-            'errors': errors
-        })
+            'job': job.to_dict(),
+            'status_url': reverse('admin_import_job_status', args=[job.job_id]),
+            'cancel_url': reverse('admin_import_job_cancel', args=[job.job_id]),
+        }, status=202)
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required
+def admin_import_job_status(request, job_id):
+    """Progress of a background import job (polled by the upload page)"""
+    job = ImportJob.objects.select_related('journal').filter(job_id=job_id).first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    # The worker running it restarted or crashed
+    if is_stale(job):
+        fail_stale_jobs([job])
+        job.refresh_from_db()
+    
+    data = {'success': True, 'job': job.to_dict()}
+    if job.is_finished and job.journal_id:
+        data['rollback_url'] = reverse('admin_write_journal_rollback', args=[job.journal.journal_id])
+    return JsonResponse(data)
+
+
+@login_required
+@require_POST
+def admin_import_job_cancel(request, job_id):
+    """Ask a running import job to stop after its current batch"""
+    updated = ImportJob.objects.filter(
+        job_id=job_id,
+        status__in=[ImportJob.STATUS_QUEUED, ImportJob.STATUS_RUNNING],
+    ).update(cancel_requested=True)
+    
+    # A job that never started can be cancelled on the spot
+    ImportJob.objects.filter(job_id=job_id, status=ImportJob.STATUS_QUEUED).update(
+        status=ImportJob.STATUS_CANCELLED, finished_at=timezone.now(),
+        message='Cancelled before start',
+    )
+    
+    if not updated:
+        return JsonResponse({'success': False, 'error': 'Job is not running'}, status=400)
+    job = ImportJob.objects.get(job_id=job_id)
+    return JsonResponse({'success': True, 'job': job.to_dict()})
+
+
+@login_required
+@require_POST
+def admin_write_journal_rollback(request, journal_id):
+    """Undo a finished catalog import or bulk price update from its write journal"""
+    journal = WriteJournal.objects.filter(journal_id=journal_id).first()
+    if journal is None:
+        return JsonResponse({'success': False, 'error': 'Journal not found'}, status=404)
+    
+    try:
+        result = rollback_journal(journal)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    
+    return JsonResponse({'success': True, **result})
+
+
 @login_required
 def admin_bulk_price(request):
     """Bulk price update page"""
     return render(request, 'calculator/admin/bulk_price.html')
 
 
+def _parse_price(value, label):
+    """Parse a ₹-formatted price string; must be > 0."""
+    price = float(value.replace('₹', '').replace(',', '').strip())
+    if price <= 0:
+        raise ValueError(f"{label} must be greater than 0")
+    return price
+
+
+def _price_sheet_row(row):
+    """
+    Pull (model, ideal_price_str, nrp_str) out of a price sheet row,
+    trying the different column names people use.
+    """
+    model = (
+        (row.get('model_number') or '').strip() or
+        (row.get('tank_model') or '').strip() or
+        (row.get('model') or '').strip()
+    )
+    ideal_price_str = (
+        (row.get('ideal_price') or '').strip() or
+        (row.get('new_price') or '').strip() or
+        (row.get('price') or '').strip()
+    )
+    nrp_str = (row.get('nrp') or '').strip()
+    return model, ideal_price_str, nrp_str
+
+
+def _preview_price_chunk(pending, chunk, skipped):
+    """
+    Resolve one chunk of price sheet rows against the catalog (one
+    model__in query), stage the valid changes and return them.
+    """
+    parsed = []
+    for row_num, row in chunk:
+        model, ideal_price_str, nrp_str = _price_sheet_row(row)
+        
+        if not model:
+            skipped.append({
+                'model': f'Row {row_num}',
+                'reason': 'Missing model number'
+            })
+            continue
+        
+        # At least one price must be provided
+        if not ideal_price_str and not nrp_str:
+            skipped.append({
+                'model': model,
+                'reason': 'Missing price data (need ideal_price or nrp or both)'
+            })
+            continue
+        
+        parsed.append((row_num, model, ideal_price_str, nrp_str))
+    
+    tanks = {
+        tank['model']: tank
+        for tank in Tank.objects.filter(model__in={p[1] for p in parsed})
+                                .values('id', 'model', 'category', 'ideal_price', 'nrp')
+    }
+    
+    changes = []
+    staged = []
+    for row_num, model, ideal_price_str, nrp_str in parsed:
+        tank = tanks.get(model)
+        
+        if not tank:
+            skipped.append({
+                'model': model,
+                'reason': 'Tank not found in database'
+            })
+            continue
+        
+        try:
+            new_ideal_price = _parse_price(ideal_price_str, "Ideal price") if ideal_price_str else None
+            new_nrp = _parse_price(nrp_str, "NRP") if nrp_str else None
+        except (ValueError, InvalidOperation) as e:
+            skipped.append({
+                'model': model,
+                'reason': f'Invalid price format: {str(e)}'
+            })
+            continue
+        
+        old_ideal_price = float(tank['ideal_price'])
+        old_nrp = float(tank['nrp'])
+        changes.append({
+            'model': tank['model'],
+            'tank_id': tank['id'],
+            'category': tank['category'],
+            'old_ideal_price': old_ideal_price,
+            'old_nrp': old_nrp,
+            # Missing prices keep the current value
+            'new_ideal_price': new_ideal_price if new_ideal_price is not None else old_ideal_price,
+            'new_nrp': new_nrp if new_nrp is not None else old_nrp,
+        })
+        staged.append({
+            'row_num': row_num,
+            'tank_id': tank['id'],
+            'model': tank['model'],
+            'action': 'update',
+            'ideal_price': new_ideal_price,
+            'nrp': new_nrp,
+        })
+    
+    stage_rows(pending, staged)
+    return changes
+
+
+def _restage_price_changes(pending, changes):
+    """
+    Replace the staged rows with the (possibly hand-edited) changes the
+    admin confirmed in the preview table. Returns validation errors.
+    """
+    errors = []
+    staged = []
+    for row_num, change in enumerate(changes, start=1):
+        tank_id = change.get('tank_id')
+        model = change.get('model')
+        new_ideal_price = change.get('new_ideal_price')
+        new_nrp = change.get('new_nrp')
+        
+        if not tank_id:
+            errors.append(f"{model}: Missing tank ID")
+            continue
+        
+        try:
+            # Validate prices
+            if new_ideal_price is not None and float(new_ideal_price) <= 0:
+                errors.append(f"{model}: Ideal price must be greater than 0")
+                continue
+            
+            if new_nrp is not None and float(new_nrp) <= 0:
+                errors.append(f"{model}: NRP must be greater than 0")
+                continue
+            
+            staged.append({
+                'row_num': row_num,
+                'tank_id': tank_id,
+                'model': model or '',
+                'action': 'update',
+                'ideal_price': Decimal(str(new_ideal_price)) if new_ideal_price is not None else None,
+                'nrp': Decimal(str(new_nrp)) if new_nrp is not None else None,
+            })
+        except (ValueError, TypeError, InvalidOperation) as e:
+            errors.append(f"{model}: {str(e)}")
+    
+    pending.rows.all().delete()
+    stage_rows(pending, staged)
+    return errors
+
+
 @login_required
 @require_POST
 def admin_bulk_price_update(request):
@@ -313,119 +710,32 @@ def admin_bulk_price_update(request):
             if not csv_file.name.endswith('.csv'):
                 return JsonResponse({'success': False, 'error': 'File must be CSV'}, status=400)
             
-            # Read CSV
-            decoded_file = csv_file.read().decode('utf-8')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-            
             changes = []
             skipped = []
             
-            for row_num, row in enumerate(reader, start=2):
-                # Try different column name variations for model
-                model = (
-                    row.get('model_number', '').strip() or 
-                    row.get('tank_model', '').strip() or
-                    row.get('model', '').strip()
-                )
-                
-                if not model:
-                    skipped.append({
-                        'model': f'Row {row_num}',
-                        'reason': 'Missing model number'
-                    })
-                    continue
-                
-                # Try to get ideal_price
-                ideal_price_str = (
-                    row.get('ideal_price', '').strip() or
-                    row.get('new_price', '').strip() or
-                    row.get('price', '').strip()
-                )
-                
-                # Try to get nrp
-                nrp_str = row.get('nrp', '').strip()
-                
-                # At least one price must be provided
-                if not ideal_price_str and not nrp_str:
-                    skipped.append({
-                        'model': model,
-                        'reason': 'Missing price data (need ideal_price or nrp or both)'
-                    })
-                    continue
-                
-                try:
-                    # Find tank in database
-                    tank = Tank.objects.filter(model=model).first()
-                    
-                    if not tank:
-                        skipped.append({
-                            'model': model,
-                            'reason': 'Tank not found in database'
-                        })
-                        continue
-                    
-                    # Parse prices
-                    new_ideal_price = None
-                    new_nrp = None
-                    
-                    if ideal_price_str:
-                        ideal_price_str = ideal_price_str.replace('₹', '').replace(',', '').strip()
-                        new_ideal_price = float(ideal_price_str)
-                        if new_ideal_price <= 0:
-                            raise ValueError("Ideal price must be greater than 0")
-                    
-                    if nrp_str:
-                        nrp_str = nrp_str.replace('₹', '').replace(',', '').strip()
-                        new_nrp = float(nrp_str)
-                        if new_nrp <= 0:
-                            raise ValueError("NRP must be greater than 0")
-                    
-                    # Create change object
-                    change_data = {
-                        'model': tank.model,
-                        'tank_id': tank.id,
-                        'category': tank.category,
-                        'old_ideal_price': float(tank.ideal_price),
-                        'old_nrp': float(tank.nrp),
-                    }
-                    
-                    # Add new prices if provided
-                    if new_ideal_price is not None:
-                        change_data['new_ideal_price'] = new_ideal_price
-                    else:
-                        change_data['new_ideal_price'] = float(tank.ideal_price)  # Keep old
-                    
-                    if new_nrp is not None:
-                        change_data['new_nrp'] = new_nrp
-                    else:
-                        change_data['new_nrp'] = float(tank.nrp)  # Keep old
-                    
-                    changes.append(change_data)
-                    
-                except (ValueError, InvalidOperation) as e:
-                    skipped.append({
-                        'model': model,
-                        'reason': f'Invalid price format: {str(e)}'
-                    })
-                except Exception as e:
-                    skipped.append({
-                        'model': model,
-                        'reason': str(e)
-                    })
+            # Stage changes server-side; the session only keeps the import_id.
+            # Each chunk commits on its own rather than locking for the whole file
+            pending = start_import(request, PendingImport.KIND_PRICES, csv_file.name)
+            try:
+                for chunk in chunked(iter_csv_rows(csv_file), LOOKUP_CHUNK_SIZE):
+                    changes.extend(_preview_price_chunk(pending, chunk, skipped))
+            except Exception:
+                discard_import(request, PendingImport.KIND_PRICES)
+                raise
             
-            # Store changes in session for confirmation step
-            request.session['bulk_price_changes'] = changes
+            summary = {
+                'total': len(changes) + len(skipped),
+                'to_update': len(changes),
+                'skipped': len(skipped)
+            }
+            finish_import(pending, summary)
             
             return JsonResponse({
                 'success': True,
+                'import_id': str(pending.import_id),
                 'changes': changes,
                 'skipped': skipped,
-                'summary': {
-                    'total': len(changes) + len(skipped),
-                    'to_update': len(changes),
-                    'skipped': len(skipped)
-                }
+                'summary': summary
             })
             
         except Exception as e:
@@ -435,71 +745,76 @@ def admin_bulk_price_update(request):
     else:
         try:
             # Parse JSON body
-            body = json.loads(request.body)
+            body = json.loads(request.body) if request.body else {}
             changes = body.get('changes', [])
+            errors = []
+            
+            effective_from = None
+            if body.get('effective_from'):
+                effective_from = parse_datetime(body['effective_from'])
+                if effective_from is None:
+                    return JsonResponse({'success': False, 'error': 'Invalid effective_from date'}, status=400)
+                if timezone.is_naive(effective_from):
+                    effective_from = timezone.make_aware(effective_from)
             
-            if not changes:
-                # Try to get from session as fallback
-                changes = request.session.get('bulk_price_changes', [])
+            with transaction.atomic():
+                pending = get_import(request, PendingImport.KIND_PRICES)
+                
+                if changes:
+                    # The preview table allows editing new prices before confirming
+                    if pending is None:
+                        pending = start_import(request, PendingImport.KIND_PRICES)
+                    errors = _restage_price_changes(pending, changes)
             
-            if not changes:
+            if not pending or not pending.rows.exists():
                 return JsonResponse({'success': False, 'error': 'No changes to apply'}, status=400)
             
-            updated_count = 0
-            errors = []
+            # Tanks deleted since the preview
+            for model in (pending.rows.exclude(tank_id__in=Tank.objects.values('id'))
+                                      .values_list('model', flat=True)):
+                errors.append(f"{model}: Tank not found")
             
-            with transaction.atomic():
-                for change in changes:
-                    try:
-                        tank_id = change.get('tank_id')
-                        model = change.get('model')
-                        new_ideal_price = change.get('new_ideal_price')
-                        new_nrp = change.get('new_nrp')
-                        
-                        if not tank_id:
-                            errors.append(f"{model}: Missing tank ID")
-                            continue
-                        
-                        # Validate prices
-                        if new_ideal_price and float(new_ideal_price) <= 0:
-                            errors.append(f"{model}: Ideal price must be greater than 0")
-                            continue
-                        
-                        if new_nrp and float(new_nrp) <= 0:
-                            errors.append(f"{model}: NRP must be greater than 0")
-                            continue
-                        
-                        # Get tank and update prices
-                        tank = Tank.objects.get(id=tank_id)
-                        
-                        update_fields = []
-                        
-                        if new_ideal_price is not None:
-                            tank.ideal_price = Decimal(str(new_ideal_price))
-                            update_fields.append('ideal_price')
-                        
-                        if new_nrp is not None:
-                            tank.nrp = Decimal(str(new_nrp))
-                            update_fields.append('nrp')
-                        
-                        if update_fields:
-                            update_fields.append('updated_at')
-                            tank.save(update_fields=update_fields)
-                            updated_count += 1
-                        
-                    except Tank.DoesNotExist:
-                        errors.append(f"{model}: Tank not found")
-                    except Exception as e:
-                        errors.append(f"{model}: {str(e)}")
+            # Scheduled revision: stored as a price list that takes effect
+            # on its own at effective_from, without touching Tank now
+            if effective_from is not None:
+                price_list = schedule_price_import(
+                    pending, effective_from,
+                    name=body.get('name', ''),
+                    created_by=request.user.get_username(),
+                )
+                release_import(request, PendingImport.KIND_PRICES)
+                bump_catalog_version()
+                return JsonResponse({
+                    'success': True,
+                    'scheduled': True,
+                    'price_list': {
+                        'id': price_list.id,
+                        'name': price_list.name,
+                        'effective_from': price_list.effective_from.isoformat(),
+                        'status': price_list.status,
+                        'entries': price_list.entry_count,
+                    },
+                    'updated': price_list.entry_count,
+                    'errors': errors,
+                })
             
-            # Clear session after successful update
-            if 'bulk_price_changes' in request.session:
-                del request.session['bulk_price_changes']
+            # Set-based UPDATEs from the staging table, committed in
+            # time-bounded batches with an undo journal
+            journal = start_journal('bulk_price', request.user.get_username())
+            try:
+                updated_count, _ = apply_price_import(pending, journal=journal)
+            except Exception:
+                close_journal(journal, WriteJournal.STATUS_FAILED)
+                raise
+            close_journal(journal)
+            release_import(request, PendingImport.KIND_PRICES)
             
             return JsonResponse({
                 'success': True,
                 'updated': updated_count,
-                'errors': errors
+                'errors': errors,
+                'journal_id': str(journal.journal_id),
+                'rollback_url': reverse('admin_write_journal_rollback', args=[journal.journal_id]),
             })
             
         except Exception as e:
@@ -507,12 +822,153 @@ def admin_bulk_price_update(request):
 
 
 @login_required
-def admin_tank_export(request):
+@require_POST
+def admin_reprice(request):
+    """
+    Declarative bulk repricing (see calculator.repricing).
+    Body: {"filters": {...}, "rule": {...}, "apply": false}
+    Always returns the preview; with "apply": true the rule is applied too.
+    """
+    import json
+    
+    try:
+        body = json.loads(request.body or '{}')
+        rule = parse_rule(body.get('rule') or {})
+        tanks = _apply_tank_filters(Tank.objects.all(), body.get('filters') or {})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    try:
+        preview = preview_reprice(tanks, rule)
+        if not body.get('apply'):
+            return JsonResponse({'success': True, 'applied': False, 'preview': preview})
+        
+        updated, journal = apply_reprice(tanks, rule, created_by=request.user.get_username())
+        return JsonResponse({
+            'success': True,
+            'applied': True,
+            'preview': preview,
+            'updated': updated,
+            'journal_id': str(journal.journal_id),
+            'rollback_url': reverse('admin_write_journal_rollback', args=[journal.journal_id]),
+        })
+        
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required
+@require_POST
+def admin_tank_bulk_status(request):
+    """
+    Activate or deactivate every tank matching the admin_tank_list filters.
+    Body: {"filters": {...}, "is_active": false, "apply": false}
+    Always returns the preview counts; with "apply": true the change is
+    written as one UPDATE and the catalog version is bumped.
+    """
+    import json
+    
+    try:
+        body = json.loads(request.body or '{}')
+        tanks = _apply_tank_filters(Tank.objects.all(), body.get('filters') or {})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    is_active = body.get('is_active')
+    if not isinstance(is_active, bool):
+        return JsonResponse({'success': False, 'error': "'is_active' must be true or false"}, status=400)
+    
+    try:
+        preview = tanks.order_by().aggregate(
+            matched=Count('id'),
+            changed=Count('id', filter=~Q(is_active=is_active)),
+        )
+        if not body.get('apply'):
+            return JsonResponse({'success': True, 'applied': False, 'preview': preview})
+        
+        # Tanks already in the target state are left alone (and keep updated_at)
+        updated = tanks.exclude(is_active=is_active).update(is_active=is_active, updated_at=timezone.now())
+        if updated:
+            bump_catalog_version()
+        
+        return JsonResponse({
+            'success': True,
+            'applied': True,
+            'preview': preview,
+            'updated': updated,
+            'message': f"{updated} tanks {'activated' if is_active else 'deactivated'}",
+        })
+        
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required
+def admin_catalog_validate(request):
+    """
+    Consistency report (see calculator.validation) for the catalog,
+    narrowed by any admin_tank_list filters.
+    """
+    try:
+        tanks = _apply_tank_filters(Tank.objects.all(), request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    try:
+        return JsonResponse({'success': True, 'report': validate_catalog(tanks)})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+PERFORMANCE_TOP = 20
+
+
+@staff_member_required(login_url='custom_login')
+def admin_performance(request):
+    """
+    Slowest endpoints and worst N+1 offenders, from the request timing
+    middleware (calculator.instrumentation). ?format=json for raw data.
+    """
+    stats = collected_stats()
+    endpoints = [dict(s, view=view) for view, s in stats.items()]
+    slowest = sorted(endpoints, key=lambda e: e['p95_ms'], reverse=True)[:PERFORMANCE_TOP]
+    n_plus_one = sorted((e for e in endpoints if e['max_repeated']),
+                        key=lambda e: e['max_repeated'], reverse=True)[:PERFORMANCE_TOP]
 
+    workers, shared = stats_scope()
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'success': True, 'endpoints': stats, 'workers': workers, 'shared': shared})
+
+    return render(request, 'calculator/admin/performance.html', {
+        'slowest': slowest,
+        'n_plus_one': n_plus_one,
+        'requests': sum(e['calls'] for e in endpoints),
+        'sample_rate': SAMPLE_RATE,
+        'workers': workers,
+        'shared': shared,
+    })
+
+
+@staff_member_required(login_url='custom_login')
+@require_POST
+def admin_performance_reset(request):
+    """Clear the collected request timings of every worker."""
+    reset_stats()
+    return JsonResponse({'success': True})
+
+
+@login_required
+def admin_tank_export(request):
+    """
+    Stream the catalog as csv, csv.gz or ndjson (?format=). Narrowed by
+    ?type= (all / active / inactive / modified_today / category code)
+    and by any admin_tank_list filters.
+    """
     export_type = request.GET.get("type", "all")
+    export_format = request.GET.get("format", "csv")
 
-    # Always define tanks first
-    tanks = Tank.objects.all().order_by('-updated_at')
+    tanks = Tank.objects.all().order_by('-updated_at', '-id')
 
     # === Filename logic ===
     if export_type == "all":
@@ -527,49 +983,26 @@ def admin_tank_export(request):
         tanks = tanks.filter(is_active=False)
 
     elif export_type == "modified_today":
-        from django.utils.timezone import now
-        today = now().date()
+        today = timezone.now().date()
         filename = "modified_today_tanks"
         tanks = tanks.filter(updated_at__date=today)
 
+    elif export_type == "filtered":
+        filename = "filtered_tanks"
+
     else:
         # Category export (GFS, RCT, SST, FM etc)
         filename = f"{export_type.lower()}_tanks"
         tanks = tanks.filter(category=export_type)
 
-    # === Create CSV ===
-    response = HttpResponse(content_type="text/csv")
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-
-    writer = csv.writer(response)
-
-    writer.writerow([
-        "ID",
-        "Model",
-        "Category",
-        "Diameter",
-        "Height",
-        "Net Capacity",
-        "Gross Capacity",
-        "Ideal Price",
-        "NRP",
-        "Status",
-        "Last Updated"
-    ])
-
-    for tank in tanks:
-        writer.writerow([
-            tank.id,
-            tank.model,
-            tank.get_category_display(),
-            tank.diameter,
-            tank.height,
-            tank.net_capacity,
-            tank.gross_capacity,
-            tank.ideal_price,
-            tank.nrp,
-            "Active" if tank.is_active else "Inactive",
-            tank.updated_at.strftime("%Y-%m-%d %H:%M"),
-        ])
-
+    try:
+        tanks = _apply_tank_filters(tanks, request.GET)
+        stream, content_type, extension = stream_export(
+            tanks, export_format, asynchronous=isinstance(request, ASGIRequest))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    # === Stream the file ===
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
     return response
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CalculatorConfig(AppConfig):
     name = 'calculator'
+
+    def ready(self):
+        from .instrumentation import install_query_wrapper
+        from .metrics import install_sqlite_wrapper
+        connection_created.connect(install_sqlite_wrapper)
+        connection_created.connect(install_query_wrapper)
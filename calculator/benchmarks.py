@@ -0,0 +1,561 @@
+"""
+Endpoint benchmarks on synthetic catalogs.
+
+seed_catalog() fills the current database with a synthetic catalog and
+EndpointBenchmark times every public and admin endpoint against it
+through the Django test client, with Nexus replaced by an in-process
+stub (NexusStub). Results are plain dicts so runs can be saved as JSON
+and compared with compare_runs().
+
+With a simulated Nexus latency, the concurrency cases show how many
+Nexus-bound requests one ASGI worker serves at once (AsyncClient on one
+event loop) against a worker that serves them one at a time.
+
+`manage.py benchmark_endpoints` runs this in a throwaway test database.
+"""
+import asyncio
+import io
+import json
+import random
+import statistics
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .catalog_generator import generate_tanks, insert_tanks, split_count
+from .instrumentation import record_nexus
+from .models import (
+    ImportJob, NexusExportLog, PendingImport, PriceList, Tank, WriteJournal,
+)
+
+
+DEFAULT_SIZES  = [1000, 10000, 100000]
+DEFAULT_REPEAT = 5
+
+# Rows in the synthetic CSV / price sheet uploads
+DEFAULT_UPLOAD_ROWS = 1000
+
+# Cells sent by the admin_tank_batch_update case
+BATCH_EDIT_CELLS = 50
+
+STUB_SALES_PEOPLE = ['Asha Rao', 'Vikram Shah', 'Meera Iyer', 'Rohan Gupta']
+
+# Projects per stub salesperson in nexus.pricing_logs
+STUB_LOGS_PER_PERSON = 60
+
+# Simultaneous requests per concurrency case
+DEFAULT_CONCURRENCY = 50
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SYNTHETIC CATALOG
+# ══════════════════════════════════════════════════════════════════════════════
+
+def reset_catalog():
+    """Delete the catalog and everything written by earlier benchmark runs."""
+    for model in (ImportJob, PendingImport, WriteJournal, PriceList, NexusExportLog):
+        model.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(Tank._meta.db_table)}")
+    bump_catalog_version()
+
+
+def seed_catalog(size, seed=0):
+    """
+    Replace the catalog with `size` generated tanks (see
+    catalog_generator). Returns seconds taken.
+    """
+    started = time.perf_counter()
+    reset_catalog()
+    insert_tanks(generate_tanks(split_count(size), seed=seed))
+    bump_catalog_version()
+    return time.perf_counter() - started
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# NEXUS STUB
+# ══════════════════════════════════════════════════════════════════════════════
+
+class _StubCursor:
+    def __init__(self, stub):
+        self.stub    = stub
+        self.result  = []
+        self.pending = []
+
+    def execute(self, sql, params=()):
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        self.result = self.stub.query(sql, params)
+
+    def executemany(self, sql, params_seq, returning=False):
+        # Pipelined by psycopg: one round trip for every row
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        results = [self.stub.query(sql, params) for params in params_seq]
+        self.result, self.pending = (results[0], results[1:]) if results else ([], [])
+
+    def nextset(self):
+        if not self.pending:
+            return None
+        self.result = self.pending.pop(0)
+        return True
+
+    def fetchall(self):
+        return list(self.result)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def close(self):
+        pass
+
+
+class _AsyncStubCursor(_StubCursor):
+    """psycopg 3 AsyncCursor lookalike; waits without blocking the loop."""
+
+    async def execute(self, sql, params=()):
+        if self.stub.latency:
+            await asyncio.sleep(self.stub.latency)
+        self.result = self.stub.query(sql, params)
+
+    async def fetchall(self):
+        return list(self.result)
+
+    async def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+class NexusStub:
+    """
+    In-process stand-in for the Nexus pricing_logs table. Answers the
+    queries TankMate sends (distinct salespeople, a salesperson's logs,
+    INSERT … RETURNING log_id), each after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.0, logs_per_person=STUB_LOGS_PER_PERSON, seed=0):
+        rng = random.Random(seed)
+        now = timezone.now()
+        self.latency = latency
+        self.logs    = []
+        for person in STUB_SALES_PEOPLE:
+            for n in range(logs_per_person):
+                self.logs.append((
+                    len(self.logs) + 1,
+                    f"{rng.choice(['Aqua', 'Green', 'City', 'Agro', 'Delta'])} "
+                    f"{rng.choice(['Farms', 'Water Works', 'Industries', 'Utilities'])} {n}",
+                    person,
+                    now - timedelta(days=n),
+                    [{'model': f"RCT{rng.randint(10, 90)}-{rng.randint(10, 40)}", 'qty': 1}],
+                ))
+
+    def query(self, sql, params):
+        if 'DISTINCT sales_person' in sql:
+            return [(person,) for person in sorted({log[2] for log in self.logs})]
+        if 'INSERT INTO nexus.pricing_logs' in sql:
+            log_id = len(self.logs) + 1
+            self.logs.append((log_id, params[0], params[1], timezone.now(), json.loads(params[2])))
+            return [(log_id,)]
+        if 'FROM   nexus.pricing_logs' in sql or 'FROM nexus.pricing_logs' in sql:
+            person = str(params[0]).lower()
+            rows = sorted((log for log in self.logs if log[2].lower() == person),
+                          key=lambda log: log[3], reverse=True)
+            rows = [(log_id, client, created, payload) for log_id, client, _, created, payload in rows]
+            return rows[:50] if 'LIMIT' in sql else rows
+        return []
+
+    @contextmanager
+    def cursor(self, commit=False):
+        started = time.perf_counter()
+        try:
+            yield _StubCursor(self)
+        finally:
+            record_nexus(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def async_cursor(self, commit=False):
+        started = time.perf_counter()
+        try:
+            yield _AsyncStubCursor(self)
+        finally:
+            record_nexus(time.perf_counter() - started)
+
+    @contextmanager
+    def installed(self):
+        """Route every Nexus query in calculator to this stub."""
+        from . import views
+        from .nexus import salesperson_directory
+
+        salesperson_directory.clear()
+        views.client_index.clear()
+        with mock.patch('calculator.nexus.nexus_cursor', self.cursor), \
+             mock.patch('calculator.views.nexus_cursor', self.cursor), \
+             mock.patch('calculator.nexus.async_nexus_cursor', self.async_cursor), \
+             mock.patch('calculator.views.async_nexus_cursor', self.async_cursor):
+            yield self
+        salesperson_directory.clear()
+        views.client_index.clear()
+
+    def sync_client_index(self):
+        """Mark every stub salesperson as synced so no background sync starts."""
+        from . import views
+        for person in STUB_SALES_PEOPLE:
+            views.client_index.bucket(person, loader=lambda: ())
+            if views.client_index.begin_sync(person):
+                views.client_index.finish_sync(person, [
+                    views._client_entry(log_id, client, created, len(payload), False)
+                    for log_id, client, created, payload in self.query('FROM nexus.pricing_logs', (person,))
+                ])
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _request(client, method, path, data):
+    """Client or AsyncClient request (a coroutine for the latter)."""
+    if method == 'post':
+        return client.post(path, json.dumps(data), content_type='application/json')
+    return client.get(path, data)
+
+
+def _csv_upload(name, header, rows):
+    lines = [','.join(header)] + [','.join(str(v) for v in row) for row in rows]
+    upload = io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+    upload.name = name
+    return upload
+
+
+class EndpointBenchmark:
+    """
+    Times the calculator endpoints against whatever catalog is loaded.
+
+    Each case is requested once to warm up, then `repeat` times; writes
+    made by admin cases stay in the database (the next size reseeds).
+    """
+
+    def __init__(self, repeat=DEFAULT_REPEAT, upload_rows=DEFAULT_UPLOAD_ROWS,
+                 nexus_latency=0.0, only=None):
+        self.repeat      = repeat
+        self.upload_rows = upload_rows
+        self.nexus       = NexusStub(latency=nexus_latency)
+        self.only        = only
+        self.client      = Client()
+        self._round      = 0
+
+    def login(self):
+        User = get_user_model()
+        user = User.objects.filter(username='benchmark').first()
+        if user is None:
+            user = User.objects.create_superuser('benchmark', 'benchmark@example.com', None)
+        self.client.force_login(user)
+
+    # ── Request cases ─────────────────────────────────────────────────────────
+
+    def _sample(self):
+        """Search values that hit the middle of the loaded catalog."""
+        tank = Tank.objects.order_by('id')[Tank.objects.count() // 2]
+        return {
+            'id': tank.id,
+            'category': tank.category,
+            'model': tank.model[:5],
+            'capacity': tank.net_capacity,
+            'diameter': tank.diameter,
+            'height': tank.height,
+            'price': float(tank.ideal_price),
+        }
+
+    def _catalog_upload(self):
+        """Half updates of existing tanks (new prices), half new tanks."""
+        self._round += 1
+        half = self.upload_rows // 2
+        existing = list(Tank.objects.order_by('id').values_list(
+            'model', 'diameter', 'height', 'net_capacity', 'gross_capacity', 'ideal_price', 'nrp')[:half])
+        rows = [(model, d, h, net, gross, float(ideal) + self._round, float(nrp))
+                for model, d, h, net, gross, ideal, nrp in existing]
+        new = generate_tanks(split_count(self.upload_rows - len(rows)), seed=self._round)
+        rows += [(f"{model}-U{self._round}", *values) for model, _, *values in new]
+        return _csv_upload('benchmark.csv',
+                           ['tank_model', 'diameter', 'height', 'net_capacity',
+                            'gross_capacity', 'ideal_price', 'nrp'], rows)
+
+    def _price_sheet(self):
+        self._round += 1
+        rows = Tank.objects.order_by('-id').values_list('model', 'ideal_price', 'nrp')[:self.upload_rows]
+        return _csv_upload('prices.csv', ['model', 'ideal_price', 'nrp'],
+                           [(model, float(ideal) + self._round, float(nrp)) for model, ideal, nrp in rows])
+
+    def cases(self):
+        """
+        (name, request, setup) for every endpoint. request() returns the
+        response; setup(), if given, runs untimed before each request.
+        """
+        c, s = self.client, self._sample()
+        person = STUB_SALES_PEOPLE[0]
+        export_body = json.dumps({
+            'client_name': 'Benchmark Client', 'sales_person': person,
+            'tanks': [{'model': s['model'], 'category': s['category'], 'quantity': 1}],
+        })
+
+        def get(path, params=None):
+            return lambda: c.get(path, params or {})
+
+        def stage_catalog():
+            c.post('/admin-dashboard/csv/preview/', {'csv_file': self._catalog_upload()})
+
+        def stage_prices():
+            c.post('/admin-dashboard/bulk-price/update/', {'price_csv': self._price_sheet()})
+
+        def post_json(path, body):
+            return lambda: c.post(path, json.dumps(body), content_type='application/json')
+
+        job = {}
+
+        def find_job():
+            # The job queued by admin_csv_confirm
+            job['id'] = ImportJob.objects.order_by('-created_at').values_list('job_id', flat=True).first()
+
+        batch_edits = [
+            {'tank_id': tank_id, 'field': 'nrp', 'value': str(nrp)}
+            for tank_id, nrp in Tank.objects.order_by('id').values_list('id', 'nrp')[:BATCH_EDIT_CELLS]
+        ]
+        filters = {'category': s['category'], 'min_capacity': s['capacity']}
+
+        return [
+            # Public
+            ('tank_search:browse',          get('/api/search/'), None),
+            ('tank_search:browse_category', get('/api/search/', {'category': s['category']}), None),
+            ('tank_search:model',           get('/api/search/', {'model': s['model']}), None),
+            ('tank_search:capacity',        get('/api/search/', {'capacity': s['capacity']}), None),
+            ('tank_search:dimensions',      get('/api/search/', {'diameter': s['diameter'], 'height': s['height']}), None),
+            ('tank_search:diameter',        get('/api/search/', {'diameter': s['diameter']}), None),
+            ('tank_search:height',          get('/api/search/', {'height': s['height']}), None),
+            ('tank_search:price_filtered',  get('/api/search/', {'capacity': s['capacity'],
+                                                                 'max_price': s['price'] * 1.1,
+                                                                 'sort_by': 'price_asc'}), None),
+            ('get_models_for_type',         get('/api/models/', {'q': s['model'][:3]}), None),
+            ('get_category_stats',          get('/api/stats/'), None),
+            ('nexus_users',                 get('/api/nexus/users/'), None),
+            ('nexus_projects',              get('/api/nexus/projects/', {'sales_person': person}), None),
+            ('nexus_check',                 get('/api/nexus/check/', {'sales_person': person, 'q': 'Aqua'}), None),
+            ('nexus_export',                lambda: c.post('/api/nexus/export/', export_body,
+                                                           content_type='application/json'), None),
+            ('nexus_export_batch',          post_json('/api/nexus/export/batch/',
+                                                      {'collections': [json.loads(export_body)] * 10}), None),
+            ('home',                        get('/'), None),
+            ('download_tank_template',      get('/download-template/'), None),
+            # Admin
+            ('admin_dashboard',             get('/admin-dashboard/'), None),
+            ('admin_performance',           get('/admin-dashboard/performance/'), None),
+            ('admin_csv_upload',            get('/admin-dashboard/csv/upload/'), None),
+            ('admin_bulk_price',            get('/admin-dashboard/bulk-price/'), None),
+            ('admin_tank_update',           lambda: c.post('/admin-dashboard/tank/update/',
+                                                           {'tank_id': s['id'], 'field': 'ideal_price',
+                                                            'value': s['price']}), None),
+            ('admin_tank_toggle',           lambda: c.post('/admin-dashboard/tank/toggle/',
+                                                           {'tank_id': s['id']}), None),
+            ('admin_tank_batch_update',     post_json('/admin-dashboard/tank/batch/', {'edits': batch_edits}), None),
+            ('admin_tank_bulk_status',      post_json('/admin-dashboard/tank/bulk-status/',
+                                                      {'filters': filters, 'is_active': False}), None),
+            ('admin_reprice',               post_json('/admin-dashboard/reprice/',
+                                                      {'filters': filters,
+                                                       'rule': {'field': 'ideal_price', 'operation': 'percent',
+                                                                'value': 5}}), None),
+            ('admin_tank_list',             get('/admin-dashboard/tanks/'), None),
+            ('admin_tank_list:filtered',    get('/admin-dashboard/tanks/', {'category': s['category'],
+                                                                           'min_capacity': s['capacity']}), None),
+            ('admin_tank_export:csv',       get('/admin-dashboard/tanks/export/'), None),
+            ('admin_tank_export:csv.gz',    get('/admin-dashboard/tanks/export/', {'type': 'filtered',
+                                                                                  'format': 'csv.gz',
+                                                                                  'category': s['category']}), None),
+            ('admin_catalog_validate',      get('/admin-dashboard/catalog/validate/'), None),
+            ('admin_csv_preview',           lambda: c.post('/admin-dashboard/csv/preview/',
+                                                           {'csv_file': self._catalog_upload()}), None),
+            ('admin_csv_confirm',           lambda: c.post('/admin-dashboard/csv/confirm/'), stage_catalog),
+            ('admin_import_job_status',     lambda: c.get(f"/admin-dashboard/jobs/{job['id']}/"), find_job),
+            ('admin_bulk_price_preview',    lambda: c.post('/admin-dashboard/bulk-price/update/',
+                                                           {'price_csv': self._price_sheet()}), None),
+            ('admin_bulk_price_confirm',    lambda: c.post('/admin-dashboard/bulk-price/update/', '{}',
+                                                           content_type='application/json'), stage_prices),
+        ]
+
+    # ── Timing ────────────────────────────────────────────────────────────────
+
+    def time_case(self, request, setup=None):
+        """One warm-up request, then `repeat` timed ones (body fully read)."""
+        timings, statuses = [], set()
+        queries = size = 0
+        view = None
+        for attempt in range(self.repeat + 1):
+            if setup is not None:
+                setup()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                body = (b''.join(response.streaming_content) if response.streaming
+                        else response.content)
+                elapsed = time.perf_counter() - started
+            if attempt == 0:
+                continue
+            timings.append(elapsed * 1000)
+            statuses.add(response.status_code)
+            queries, size = len(captured), len(body)
+            view = response.resolver_match.view_name
+        return _summary(timings, queries, size, statuses, view)
+
+    # ── Concurrency ───────────────────────────────────────────────────────────
+
+    def concurrency_cases(self):
+        """(name, method, path, data) for the endpoints that wait on Nexus."""
+        person = STUB_SALES_PEOPLE[0]
+        s = self._sample()
+        return [
+            ('nexus_projects', 'get',  '/api/nexus/projects/', {'sales_person': person}),
+            ('nexus_export',   'post', '/api/nexus/export/',
+             {'client_name': 'Benchmark Client', 'sales_person': person,
+              'tanks': [{'model': s['model'], 'category': s['category'], 'quantity': 1}]}),
+        ]
+
+    def time_concurrency(self, method, path, data, requests):
+        """
+        `requests` identical requests served one after another, as a sync
+        worker would, then all at once through AsyncClient on one event
+        loop, as one ASGI worker does.
+        """
+        started = time.perf_counter()
+        statuses = {_request(self.client, method, path, data).status_code for _ in range(requests)}
+        sequential = time.perf_counter() - started
+
+        async def burst():
+            client = AsyncClient()
+            responses = await asyncio.gather(
+                *(_request(client, method, path, data) for _ in range(requests)))
+            return {response.status_code for response in responses}
+
+        started = time.perf_counter()
+        statuses |= async_to_sync(burst)()
+        concurrent = time.perf_counter() - started
+        return {
+            'requests':       requests,
+            'sequential_ms':  round(sequential * 1000, 1),
+            'concurrent_ms':  round(concurrent * 1000, 1),
+            'sequential_rps': round(requests / sequential, 1),
+            'concurrent_rps': round(requests / concurrent, 1),
+            'speedup':        round(sequential / concurrent, 1),
+            'status':         sorted(statuses),
+        }
+
+    def run_concurrency(self, requests=DEFAULT_CONCURRENCY):
+        """Time every concurrency case. Returns {case: result}."""
+        results = {}
+        with self.nexus.installed():
+            self.nexus.sync_client_index()
+            for name, method, path, data in self.concurrency_cases():
+                if self.only and not any(name.startswith(prefix) for prefix in self.only):
+                    continue
+                _request(self.client, method, path, data)   # warm-up
+                results[name] = self.time_concurrency(method, path, data, requests)
+        return results
+
+    def run(self):
+        """Time every case against the loaded catalog. Returns {case: summary}."""
+        results = {}
+        with override_settings(IMPORT_JOB_RUNNER='inline'), self.nexus.installed():
+            self.login()
+            self.nexus.sync_client_index()
+            for name, request, setup in self.cases():
+                if self.only and not any(name.startswith(prefix) for prefix in self.only):
+                    continue
+                results[name] = self.time_case(request, setup)
+        return results
+
+
+def _summary(timings, queries, size, statuses, view):
+    ordered = sorted(timings)
+    return {
+        'view':      view,
+        'runs':      len(ordered),
+        'min_ms':    round(ordered[0], 2),
+        'median_ms': round(statistics.median(ordered), 2),
+        'p95_ms':    round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max_ms':    round(ordered[-1], 2),
+        'queries':   queries,
+        'bytes':     size,
+        'status':    sorted(statuses),
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RUNS
+# ══════════════════════════════════════════════════════════════════════════════
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, upload_rows=DEFAULT_UPLOAD_ROWS,
+                   nexus_latency=0.0, only=None, seed=0, concurrency=0, log=None):
+    """
+    Seed each catalog size in turn and time every endpoint against it,
+    plus the concurrency cases when `concurrency` (requests) is set.
+    """
+    import django
+    import platform
+
+    report = {
+        'generated_at':  timezone.now().isoformat(),
+        'python':        platform.python_version(),
+        'django':        django.get_version(),
+        'database':      connection.vendor,
+        'repeat':        repeat,
+        'upload_rows':   upload_rows,
+        'nexus_latency': nexus_latency,
+        'seed':          seed,
+        'concurrency':   concurrency,
+        'sizes':         {},
+    }
+    for size in sizes:
+        if log:
+            log(f"Seeding {size:,} tanks...")
+        seed_seconds = seed_catalog(size, seed=seed)
+        benchmark = EndpointBenchmark(repeat=repeat, upload_rows=upload_rows,
+                                      nexus_latency=nexus_latency, only=only)
+        endpoints = benchmark.run()
+        report['sizes'][str(size)] = {'seed_seconds': round(seed_seconds, 2), 'endpoints': endpoints}
+        if log:
+            for name, result in endpoints.items():
+                log(f"  {name:<30} {result['median_ms']:>10.1f} ms  {result['queries']:>4} queries")
+        if concurrency:
+            results = benchmark.run_concurrency(concurrency)
+            report['sizes'][str(size)]['concurrency'] = results
+            if log:
+                for name, result in results.items():
+                    log(f"  {name + ' x' + str(concurrency):<30} {result['sequential_rps']:>7.1f} req/s "
+                        f"one at a time, {result['concurrent_rps']:>7.1f} req/s concurrent")
+    return report
+
+
+def compare_runs(baseline, current, max_slowdown=1.25, min_delta_ms=2.0):
+    """
+    Endpoints whose median got more than max_slowdown times slower (and
+    by at least min_delta_ms, to ignore noise on very fast endpoints).
+    Returns [{'size', 'endpoint', 'baseline_ms', 'current_ms', 'ratio'}].
+    """
+    regressions = []
+    for size, result in current['sizes'].items():
+        before = baseline.get('sizes', {}).get(size, {}).get('endpoints', {})
+        for name, timing in result['endpoints'].items():
+            if name not in before:
+                continue
+            old, new = before[name]['median_ms'], timing['median_ms']
+            if new - old >= min_delta_ms and new > old * max_slowdown:
+                regressions.append({
+                    'size': int(size), 'endpoint': name,
+                    'baseline_ms': old, 'current_ms': new,
+                    'ratio': round(new / old, 2) if old else None,
+                })
+    return regressions
@@ -0,0 +1,49 @@
+"""
+Catalog version pointer.
+
+Caches derived from the tank catalog key on catalog_version(). Every
+catalog write path (imports, price updates, repricing, swaps, admin
+edits) calls bump_catalog_version() once when it finishes, which
+invalidates all of them at the same moment.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import cache_lookup
+from .models import CatalogState
+
+
+def catalog_version():
+    """Current catalog version (one primary-key read)."""
+    version = CatalogState.objects.filter(pk=1).values_list('version', flat=True).first()
+    return version or 1
+
+
+def bump_catalog_version():
+    """Increment the catalog version and return the new value."""
+    CatalogState.load()
+    CatalogState.objects.filter(pk=1).update(version=F('version') + 1, changed_at=timezone.now())
+    return catalog_version()
+
+
+# Cached row counts live until the catalog version changes (or this many seconds)
+COUNT_CACHE_TIMEOUT = 3600
+
+
+def cached_count(queryset, namespace, params):
+    """
+    queryset.count(), cached per catalog version and filter parameters.
+    A version bump makes every cached count unreachable at once.
+    """
+    filters = '&'.join(f'{key}={params[key]}' for key in sorted(params) if params[key] not in (None, ''))
+    digest = hashlib.md5(filters.encode('utf-8')).hexdigest()
+    key = f'catalog:{catalog_version()}:count:{namespace}:{digest}'
+    count = cache.get(key)
+    cache_lookup('catalog_count', count is not None)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
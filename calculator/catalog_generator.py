@@ -0,0 +1,204 @@
+"""
+Synthetic tank catalogs for load testing.
+
+Series geometry comes from the per-series capacity sheets in
+calculator/data (RCT, SST/GFS, SFM). A category's catalog walks its
+series × height grid: heights listed in the sheet use the sheet's
+capacity, further heights continue the series' height step with
+capacities scaled from the sheet's fill ratio, so net capacity always
+agrees with π(d/2)²h. Once the grid is used up, models repeat as
+revisions (RCT15-22-R2) with slightly different prices.
+
+Rows are produced as tuples in the order of GENERATED_COLUMNS, from a
+seeded random.Random, so the same seed always yields the same catalog.
+"""
+import csv
+import math
+import random
+from functools import lru_cache
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import Tank
+
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+# Capacity sheet per category (GFS tanks share the SST geometry)
+SERIES_FILES = {
+    'RCT': 'rct_tank_capacities.csv',
+    'SST': 'sst_tank_capacities.csv',
+    'SFM': 'fm_tank_capacities.csv',
+    'GFS': 'sst_tank_capacities.csv',
+}
+
+# Model suffixes, one model per variant for every series/height
+VARIANTS = {
+    'RCT': [''],
+    'SST': ['(ETP)', '(BioD)'],
+    'SFM': [''],
+    'GFS': [''],
+}
+
+# Price curve: price = base + rate × net_capacity ** 0.8
+PRICE_CURVES = {
+    # category: (base ₹, rate ₹)
+    'RCT': (180000, 21000),
+    'SST': (150000, 17500),
+    'SFM': (260000, 26000),
+    'GFS': (210000, 23000),
+}
+VARIANT_PRICE_FACTOR = {'': 1.0, '(ETP)': 1.0, '(BioD)': 1.06}
+
+# Heights generated per series, including the ones listed in the sheet
+HEIGHT_LEVELS = 20
+
+GENERATED_COLUMNS = ['model', 'category', 'diameter', 'height',
+                     'net_capacity', 'gross_capacity', 'ideal_price', 'nrp']
+
+# Header of the admin CSV template, so generated files can be imported
+CSV_HEADER = ['id', 'tank_model', 'diameter', 'height',
+              'net_capacity', 'gross_capacity', 'ideal_price', 'nrp']
+
+INSERT_BATCH_SIZE = 5000
+
+
+@lru_cache(maxsize=None)
+def load_series(category):
+    """
+    [(series, diameter, fill_ratio, [(height, net_kl), ...])] from the
+    category's capacity sheet. Sheets list litres or KL; both become KL.
+    """
+    series = {}
+    with open(DATA_DIR / SERIES_FILES[category], newline='') as f:
+        for row in csv.DictReader(f):
+            number = ''.join(ch for ch in row['model'].split('-')[0] if ch.isdigit())
+            diameter, height = float(row['diameter']), float(row['height'])
+            capacity = float(row['capacity'])
+            volume = math.pi / 4 * diameter * diameter * height
+            if capacity > volume * 10:
+                capacity /= 1000
+            entry = series.setdefault(int(number), (diameter, {}))
+            entry[1][height] = capacity
+
+    result = []
+    for number, (diameter, heights) in sorted(series.items()):
+        ratios = [net / (math.pi / 4 * diameter * diameter * h) for h, net in heights.items()]
+        result.append((number, diameter, sum(ratios) / len(ratios), sorted(heights.items())))
+    return result
+
+
+def _height_grid(heights):
+    """Sheet heights, continued with the last step up to HEIGHT_LEVELS."""
+    grid = list(heights)
+    step = round(grid[-1][0] - grid[-2][0], 2) if len(grid) > 1 else 0.6
+    while len(grid) < HEIGHT_LEVELS:
+        grid.append((round(grid[-1][0] + step, 2), None))
+    return grid
+
+
+def _round_capacity(value):
+    return round(value) if value >= 10 else round(value, 1)
+
+
+def _round_price(value):
+    return round(value / 100) * 100
+
+
+def generate_tanks(per_category, categories=None, seed=0):
+    """
+    Yield GENERATED_COLUMNS tuples: per_category tanks for each category
+    (an int, or a {category: count} dict).
+    """
+    rng = random.Random(seed)
+    categories = categories or [code for code, _ in Tank.CATEGORY_CHOICES]
+    counts = per_category if isinstance(per_category, dict) else dict.fromkeys(categories, per_category)
+
+    for category in categories:
+        base, rate = PRICE_CURVES[category]
+        grid = [
+            (number, diameter, ratio, height, net)
+            for number, diameter, ratio, heights in load_series(category)
+            for height, net in _height_grid(heights)
+        ]
+        remaining = counts.get(category, 0)
+        revision = 1
+        while remaining > 0:
+            suffix = f"-R{revision}" if revision > 1 else ''
+            for number, diameter, ratio, height, net in grid:
+                volume = math.pi / 4 * diameter * diameter * height
+                net = _round_capacity(net if net is not None else volume * ratio)
+                # SFM sheets list net capacity; gross is the full cylinder
+                gross = max(net, _round_capacity(volume)) if category == 'SFM' else net
+                for variant in VARIANTS[category]:
+                    if remaining <= 0:
+                        break
+                    price = ((base + rate * net ** 0.8) * VARIANT_PRICE_FACTOR[variant]
+                             * (1 + 0.01 * ((revision - 1) % 10)) * rng.uniform(0.97, 1.03))
+                    ideal = _round_price(price)
+                    nrp = _round_price(ideal * rng.uniform(0.88, 0.95))
+                    yield (f"{category}{number}-{int(height * 10 + 1e-6)}{suffix}{variant}",
+                           category, round(diameter, 2), height, net, gross, ideal, nrp)
+                    remaining -= 1
+                if remaining <= 0:
+                    break
+            revision += 1
+
+
+def split_count(total, categories=None):
+    """{category: count} spreading `total` tanks over the categories."""
+    categories = categories or [code for code, _ in Tank.CATEGORY_CHOICES]
+    share, extra = divmod(total, len(categories))
+    return {category: share + (1 if i < extra else 0) for i, category in enumerate(categories)}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# OUTPUT
+# ══════════════════════════════════════════════════════════════════════════════
+
+def write_csv(rows, stream):
+    """Stream rows as an importable catalog CSV. Returns the row count."""
+    writer = csv.writer(stream)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for count, (model, _, *values) in enumerate(rows, start=1):
+        writer.writerow([count, model, *values])
+    return count
+
+
+def insert_tanks(rows, batch_size=INSERT_BATCH_SIZE):
+    """
+    Insert rows straight into the Tank table with executemany, one
+    committed batch at a time, skipping models that already exist.
+    Returns the number of rows sent.
+    """
+    qn = connection.ops.quote_name
+    fields = [Tank._meta.get_field(name) for name in GENERATED_COLUMNS + ['is_active', 'created_at', 'updated_at']]
+    sql = (
+        f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} "
+        f"{qn(Tank._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"{connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)}"
+    ).strip()
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    active = True
+
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append((*row, active, now, now))
+        if len(batch) >= batch_size:
+            count += _insert_batch(sql, batch)
+            batch = []
+    if batch:
+        count += _insert_batch(sql, batch)
+    return count
+
+
+def _insert_batch(sql, batch):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, batch)
+    return len(batch)
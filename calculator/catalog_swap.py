@@ -0,0 +1,380 @@
+"""
+Blue/green replacement of the whole tank catalog.
+
+Re-importing a full price book with upserts leaves the live catalog a
+mix of old and new rows until the import finishes. Instead:
+
+    load_shadow()    – fold effective price lists into live, then load the
+                       new catalog into calculator_tank_shadow (tank ids,
+                       is_active and created_at are kept for models that
+                       already exist)
+    diff_shadow()    – compare shadow with live
+    validate_shadow()– refuse empty or suspicious catalogs, or a shadow
+                       loaded before live changed
+    promote_shadow() – rename live → _previous and shadow → live in one
+                       transaction and bump the catalog version once
+    rollback_swap()  – swap _previous back in the same way
+
+The new catalog replaces every price, so price lists that are effective
+when it is loaded are folded first: otherwise their entries would keep
+overlaying the new prices. A list that takes effect between load and
+promote is folded at promote, which makes the shadow stale.
+
+Table renames are only used on SQLite, the database this project runs on.
+"""
+from django.apps.registry import Apps
+from django.db import connection, models, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .csv_import import LOOKUP_CHUNK_SIZE, TANK_FIELDS, UPSERT_BATCH_SIZE, chunked, values_differ
+from .models import CatalogState, Tank
+from .pricing import fold_price_lists
+
+
+LIVE_TABLE     = Tank._meta.db_table
+SHADOW_TABLE   = f'{LIVE_TABLE}_shadow'
+PREVIOUS_TABLE = f'{LIVE_TABLE}_previous'
+SWAP_TABLE     = f'{LIVE_TABLE}_swap'
+
+# Refuse to promote a catalog that drops more than this share of live tanks
+MAX_REMOVED_SHARE = 0.5
+
+DIFF_SAMPLE_SIZE = 10
+
+
+class CatalogSwapError(Exception):
+    """The shadow catalog can't be loaded, promoted or rolled back."""
+
+
+# Registry for the table models below, so they never reach migrations
+_table_apps = Apps()
+_table_models = {}
+
+
+def _table_model(table):
+    """
+    Unmanaged copy of Tank bound to another table. Only the primary key
+    and the unique model column are indexed; the live table's secondary
+    indexes are moved across when tables are swapped.
+    """
+    if table not in _table_models:
+        attrs = {'__module__': __name__}
+        for field in Tank._meta.local_fields:
+            clone = field.clone()
+            clone.db_index = False
+            if isinstance(clone, models.DateTimeField):
+                clone.auto_now = clone.auto_now_add = False
+            attrs[field.name] = clone
+        attrs['Meta'] = type('Meta', (), {
+            'app_label': 'calculator',
+            'db_table': table,
+            'apps': _table_apps,
+        })
+        name = ''.join(part.title() for part in table.split('_'))
+        _table_models[table] = type(name, (models.Model,), attrs)
+    return _table_models[table]
+
+
+def _table_exists(table):
+    return table in connection.introspection.table_names()
+
+
+def _check_backend():
+    if connection.vendor != 'sqlite':
+        raise CatalogSwapError('Catalog swap is only supported on SQLite')
+
+
+def live_fingerprint():
+    """
+    Cheap summary of the live catalog. Price totals and the active count
+    are included because queryset updates don't touch updated_at.
+    """
+    stats = Tank.objects.aggregate(
+        count=Count('id'), active=Count('id', filter=Q(is_active=True)),
+        last=Max('updated_at'), ideal=Sum('ideal_price'), nrp=Sum('nrp'),
+    )
+    return {
+        'count': stats['count'],
+        'active': stats['active'],
+        'last_updated': stats['last'].isoformat() if stats['last'] else None,
+        'ideal_total': str(stats['ideal'] or 0),
+        'nrp_total': str(stats['nrp'] or 0),
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# LOAD
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _next_tank_id():
+    """First id not used by the live or previous catalog."""
+    ids = [Tank.objects.aggregate(m=Max('id'))['m'] or 0]
+    if _table_exists(PREVIOUS_TABLE):
+        ids.append(_table_model(PREVIOUS_TABLE).objects.aggregate(m=Max('id'))['m'] or 0)
+    return max(ids) + 1
+
+
+def load_shadow(rows, file_name='', drop_missing=False, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Replace the shadow table with a new catalog.
+
+    rows: iterable of (label, model, data) like upsert_tanks().
+    Live tanks missing from the new catalog are carried over inactive,
+    or left out entirely with drop_missing=True.
+
+    Returns the load report, which is also stored on CatalogState.
+    """
+    _check_backend()
+    Shadow = _table_model(SHADOW_TABLE)
+    report = {'rows': 0, 'loaded': 0, 'duplicates': 0, 'carried_over': 0,
+              'drop_missing': drop_missing, 'skipped': []}
+
+    with connection.schema_editor() as editor:
+        if _table_exists(SHADOW_TABLE):
+            editor.delete_model(Shadow)
+        editor.create_model(Shadow)
+
+    fold_price_lists()
+    base = live_fingerprint()
+    next_id = _next_tank_id()
+    now = timezone.now()
+    seen = set()
+
+    for chunk in chunked(rows, batch_size):
+        live = {}
+        for models_chunk in chunked({model for _, model, _ in chunk}, LOOKUP_CHUNK_SIZE):
+            for row in Tank.objects.filter(model__in=models_chunk).values(
+                    'id', 'model', 'is_active', 'created_at', 'updated_at', *TANK_FIELDS):
+                live[row['model']] = row
+
+        tanks = {}
+        for label, model, data in chunk:
+            report['rows'] += 1
+            category = Tank.extract_category_from_model(model)
+            if not category:
+                report['skipped'].append(f"{label}: Could not determine category from '{model}'")
+                continue
+            if model in seen:
+                report['duplicates'] += 1
+            seen.add(model)
+
+            current = live.get(model)
+            if current is None:
+                tank_id, is_active, created_at, updated_at = next_id, True, now, now
+                next_id += 1
+            else:
+                old_data = {field: float(current[field]) for field in TANK_FIELDS}
+                tank_id, is_active, created_at = current['id'], current['is_active'], current['created_at']
+                updated_at = now if values_differ(old_data, data) else current['updated_at']
+
+            # A model repeated in the file keeps its last row
+            tanks[model] = Shadow(
+                id=tanks[model].id if model in tanks else tank_id,
+                model=model, category=category, is_active=is_active,
+                created_at=created_at, updated_at=updated_at,
+                **{field: data[field] for field in TANK_FIELDS},
+            )
+
+        Shadow.objects.bulk_create(
+            tanks.values(),
+            update_conflicts=True,
+            unique_fields=['model'],
+            update_fields=['category', *TANK_FIELDS, 'updated_at'],
+        )
+
+    if not drop_missing:
+        report['carried_over'] = _carry_over_missing(now)
+    report['loaded'] = Shadow.objects.count()
+
+    state = CatalogState.load()
+    state.shadow_file = file_name
+    state.shadow_loaded_at = now
+    state.shadow_base = base
+    state.shadow_report = report
+    state.save(update_fields=['shadow_file', 'shadow_loaded_at', 'shadow_base', 'shadow_report'])
+    return report
+
+
+def _carry_over_missing(now):
+    """Copy live tanks absent from the shadow into it, deactivated."""
+    qn = connection.ops.quote_name
+    columns = [f.column for f in Tank._meta.local_fields]
+    select = [
+        '0' if c == 'is_active' else '%s' if c == 'updated_at' else f'l.{qn(c)}'
+        for c in columns
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(SHADOW_TABLE)} ({', '.join(qn(c) for c in columns)}) "
+            f"SELECT {', '.join(select)} FROM {qn(LIVE_TABLE)} l "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {qn(SHADOW_TABLE)} s WHERE s.{qn('model')} = l.{qn('model')})",
+            [connection.ops.adapt_datetimefield_value(now)],
+        )
+        return cursor.rowcount
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# DIFF / VALIDATE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def diff_shadow(sample_size=DIFF_SAMPLE_SIZE):
+    """
+    Compare the shadow catalog with live.
+
+    Returns counts (and a few sample models) of tanks added, removed,
+    changed (any dimension or price), deactivated and unchanged.
+    """
+    if not _table_exists(SHADOW_TABLE):
+        raise CatalogSwapError('No shadow catalog loaded')
+
+    qn = connection.ops.quote_name
+    live, shadow, model = qn(LIVE_TABLE), qn(SHADOW_TABLE), qn('model')
+    # `t` is the table the counted models come from
+    changed = ' OR '.join(f't.{qn(f)} <> l.{qn(f)}' for f in TANK_FIELDS)
+    deactivated = f't.{qn("is_active")} = 0 AND l.{qn("is_active")} = 1'
+    join = f"FROM {shadow} t JOIN {live} l ON l.{model} = t.{model}"
+
+    queries = {
+        'added': f"FROM {shadow} t WHERE NOT EXISTS "
+                 f"(SELECT 1 FROM {live} l WHERE l.{model} = t.{model})",
+        'removed': f"FROM {live} t WHERE NOT EXISTS "
+                   f"(SELECT 1 FROM {shadow} s WHERE s.{model} = t.{model})",
+        'changed': f"{join} WHERE {changed}",
+        'deactivated': f"{join} WHERE {deactivated}",
+        'unchanged': f"{join} WHERE NOT ({changed}) AND NOT ({deactivated})",
+    }
+
+    diff = {}
+    with connection.cursor() as cursor:
+        for key, tail in queries.items():
+            cursor.execute(f"SELECT COUNT(*) {tail}")
+            count = cursor.fetchone()[0]
+            cursor.execute(f"SELECT t.{model} {tail} ORDER BY t.{model} LIMIT %s", [sample_size])
+            diff[key] = {'count': count, 'sample': [row[0] for row in cursor.fetchall()]}
+    return diff
+
+
+def validate_shadow(diff=None):
+    """Return a list of problems that block promoting the shadow catalog."""
+    if not _table_exists(SHADOW_TABLE):
+        return ['No shadow catalog loaded']
+
+    problems = []
+    Shadow = _table_model(SHADOW_TABLE)
+    if not Shadow.objects.filter(is_active=True).exists():
+        problems.append('Shadow catalog has no active tanks')
+
+    invalid = Shadow.objects.filter(
+        Q(diameter__lte=0) | Q(height__lte=0) | Q(net_capacity__lte=0)
+        | Q(ideal_price__lte=0) | Q(nrp__lte=0)
+    ).count()
+    if invalid:
+        problems.append(f'{invalid} tanks have zero or negative dimensions, capacity or price')
+
+    state = CatalogState.load()
+    if state.shadow_base != live_fingerprint():
+        problems.append('Live catalog changed after the shadow was loaded; reload it')
+
+    diff = diff or diff_shadow()
+    live_count = Tank.objects.count()
+    if live_count and diff['removed']['count'] > live_count * MAX_REMOVED_SHARE:
+        problems.append(f"Shadow catalog drops {diff['removed']['count']} of {live_count} live tanks")
+
+    return problems
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SWAP
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _move_indexes(editor, from_table):
+    """Drop the secondary indexes left on from_table and build Tank's on the live table."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, from_table)
+    for name, info in constraints.items():
+        if info['index'] and not info['unique'] and not info['primary_key']:
+            editor.execute(f'DROP INDEX {editor.quote_name(name)}')
+    for statement in editor._model_indexes_sql(Tank):
+        editor.execute(statement)
+
+
+def _rename(editor, old, new):
+    editor.alter_db_table(Tank, old, new)
+
+
+def promote_shadow(force=False):
+    """
+    Swap the shadow catalog in. Live becomes the previous catalog, kept
+    for rollback_swap(). Runs in one transaction: readers see either the
+    old or the new catalog, never a mix.
+    """
+    _check_backend()
+    # Folding a list that took effect since the load changes live, so
+    # validation then reports the shadow as stale
+    fold_price_lists()
+    diff = diff_shadow()
+    problems = validate_shadow(diff)
+    if problems and not force:
+        raise CatalogSwapError('; '.join(problems))
+
+    with connection.schema_editor() as editor:
+        if _table_exists(PREVIOUS_TABLE):
+            editor.delete_model(_table_model(PREVIOUS_TABLE))
+        _rename(editor, LIVE_TABLE, PREVIOUS_TABLE)
+        _rename(editor, SHADOW_TABLE, LIVE_TABLE)
+        _move_indexes(editor, PREVIOUS_TABLE)
+        version = _record_swap(clear_shadow=True)
+
+    return {'version': version, 'diff': diff, 'problems': problems}
+
+
+def rollback_swap():
+    """
+    Swap the previous catalog back in (the current one becomes previous).
+    Lists effective by now are folded into the restored catalog.
+    """
+    _check_backend()
+    if not _table_exists(PREVIOUS_TABLE):
+        raise CatalogSwapError('No previous catalog to roll back to')
+
+    with connection.schema_editor() as editor:
+        _rename(editor, LIVE_TABLE, SWAP_TABLE)
+        _rename(editor, PREVIOUS_TABLE, LIVE_TABLE)
+        _rename(editor, SWAP_TABLE, PREVIOUS_TABLE)
+        _move_indexes(editor, PREVIOUS_TABLE)
+        fold_price_lists()
+        version = _record_swap()
+
+    return {'version': version}
+
+
+def _record_swap(clear_shadow=False):
+    """Bump the catalog version (once per swap) inside the swap transaction."""
+    assert transaction.get_connection().in_atomic_block
+    version = bump_catalog_version()
+    state = CatalogState.load()
+    state.swapped_at = timezone.now()
+    fields = ['swapped_at']
+    if clear_shadow:
+        state.shadow_file, state.shadow_loaded_at = '', None
+        state.shadow_base = state.shadow_report = None
+        fields += ['shadow_file', 'shadow_loaded_at', 'shadow_base', 'shadow_report']
+    state.save(update_fields=fields)
+    return version
+
+
+def catalog_status():
+    state = CatalogState.load()
+    return {
+        'version': state.version,
+        'changed_at': state.changed_at,
+        'swapped_at': state.swapped_at,
+        'live_tanks': Tank.objects.count(),
+        'shadow_loaded': _table_exists(SHADOW_TABLE),
+        'shadow_file': state.shadow_file,
+        'shadow_loaded_at': state.shadow_loaded_at,
+        'shadow_report': state.shadow_report,
+        'previous_available': _table_exists(PREVIOUS_TABLE),
+    }
@@ -0,0 +1,204 @@
+"""
+Chunked-commit writes for bulk catalog changes.
+
+Large imports used to run in one transaction. On SQLite that holds the
+database write lock for the whole import and, in rollback-journal mode,
+blocks readers too. In chunked mode every batch commits on its own
+(WAL keeps readers going in between) and the batch size adapts so one
+commit stays inside a configurable time budget.
+
+Because a half-applied import can no longer be undone by the database,
+each batch also records the previous state of the rows it touches in a
+WriteJournal, in the same transaction as the write. rollback_journal()
+replays those entries to compensate.
+"""
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import Tank, WriteJournal, WriteJournalEntry
+
+
+# Target wall time for a single committed batch, in seconds (0 = fixed batch size)
+WRITE_TIME_BUDGET = getattr(settings, 'BULK_WRITE_TIME_BUDGET', 0.25)
+
+# Rows per batch when undoing a journal
+ROLLBACK_BATCH_SIZE = 1000
+
+
+class WriteBudget:
+    """
+    Adaptive batch size for chunked commits.
+
+    After each batch the size is scaled towards the number of rows that
+    would have fit in time_budget, never by more than 2x per step, and
+    kept within [min_size, max_size]. With no budget the size is fixed.
+    """
+
+    def __init__(self, batch_size, time_budget=WRITE_TIME_BUDGET, min_size=50, max_size=None):
+        self.time_budget = time_budget or 0
+        self.min_size    = min(min_size, batch_size)
+        self.max_size    = max_size or batch_size * 4
+        self.size        = batch_size
+        self.batches     = 0
+        self.slowest     = 0.0
+
+    def record(self, rows, elapsed):
+        self.batches += 1
+        self.slowest  = max(self.slowest, elapsed)
+        if not self.time_budget or not rows:
+            return
+        target = rows * self.time_budget / max(elapsed, 1e-6)
+        target = max(self.size / 2, min(self.size * 2, target))
+        self.size = int(max(self.min_size, min(self.max_size, target)))
+
+
+def take(iterator, size):
+    """Next list of at most `size` items from an iterator."""
+    return list(islice(iterator, size))
+
+
+def _price(value):
+    return None if value is None else Decimal(str(round(value, 2)))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# JOURNAL
+# ══════════════════════════════════════════════════════════════════════════════
+
+def start_journal(source, created_by=''):
+    return WriteJournal.objects.create(source=source, created_by=created_by)
+
+
+def catalog_entry(journal, model, old_data):
+    """Entry for an upserted tank; old_data is None for a created tank."""
+    if old_data is None:
+        return WriteJournalEntry(journal=journal, action='create', model=model)
+    return WriteJournalEntry(
+        journal=journal, action='update', tank_id=old_data['id'], model=model,
+        diameter=old_data['diameter'],
+        height=old_data['height'],
+        net_capacity=old_data['net_capacity'],
+        gross_capacity=old_data['gross_capacity'],
+        ideal_price=_price(old_data['ideal_price']),
+        nrp=_price(old_data['nrp']),
+    )
+
+
+def price_entries(journal, tank_ids):
+    """Entries holding the current prices of the given tanks."""
+    rows = Tank.objects.filter(id__in=tank_ids).values_list('id', 'model', 'ideal_price', 'nrp')
+    return [
+        WriteJournalEntry(journal=journal, action='update', tank_id=tank_id,
+                          model=model, ideal_price=ideal_price, nrp=nrp)
+        for tank_id, model, ideal_price, nrp in rows
+    ]
+
+
+def journal_prices(journal, queryset):
+    """
+    Record the current prices of every tank in queryset with one
+    INSERT … SELECT, for writes that are a single set-based UPDATE.
+    """
+    sql, params = (queryset.order_by()
+                   .values_list('id', 'model', 'ideal_price', 'nrp')
+                   .query.sql_with_params())
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(c) for c in ('journal_id', 'action', 'tank_id', 'model', 'ideal_price', 'nrp'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(WriteJournalEntry._meta.db_table)} ({columns}) "
+            f"SELECT %s, %s, t.* FROM ({sql}) t",
+            [journal.pk, 'update', *params],
+        )
+        return cursor.rowcount
+
+
+def record_batch(journal, entries, rows_written):
+    """Store a batch's entries. Call inside the batch's transaction."""
+    if journal is None:
+        return
+    WriteJournalEntry.objects.bulk_create(entries)
+    WriteJournal.objects.filter(pk=journal.pk).update(
+        batches=F('batches') + 1,
+        rows_written=F('rows_written') + rows_written,
+    )
+
+
+def close_journal(journal, status=WriteJournal.STATUS_COMPLETE):
+    """Finish a journaled write; bumps the catalog version if anything was written."""
+    if journal is None:
+        return
+    journal.refresh_from_db(fields=['batches', 'rows_written'])
+    journal.status = status
+    journal.finished_at = timezone.now()
+    journal.save(update_fields=['status', 'finished_at'])
+    if journal.rows_written:
+        bump_catalog_version()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ROLLBACK
+# ══════════════════════════════════════════════════════════════════════════════
+
+CATALOG_RESTORE_FIELDS = ['diameter', 'height', 'net_capacity', 'gross_capacity', 'ideal_price', 'nrp']
+PRICE_RESTORE_FIELDS   = ['ideal_price', 'nrp']
+
+
+def rollback_journal(journal, batch_size=ROLLBACK_BATCH_SIZE):
+    """
+    Undo a journaled write, newest entries first, in committed batches.
+
+    Created tanks are deleted and updated tanks get their recorded
+    values back. Edits made to the same tanks after the import are
+    overwritten. Returns {'deleted': n, 'restored': n}.
+    """
+    if journal.status == WriteJournal.STATUS_ROLLED_BACK:
+        raise ValueError('This write has already been rolled back')
+    if journal.status == WriteJournal.STATUS_OPEN:
+        raise ValueError('This write is still running')
+
+    deleted = restored = 0
+    last_id = None
+    while True:
+        entries = journal.entries.order_by('-id')
+        if last_id is not None:
+            entries = entries.filter(id__lt=last_id)
+        entries = list(entries[:batch_size])
+        if not entries:
+            break
+
+        created  = [e.model for e in entries if e.action == 'create']
+        catalog  = [e for e in entries if e.action == 'update' and e.diameter is not None]
+        prices   = [e for e in entries if e.action == 'update' and e.diameter is None]
+        now      = timezone.now()
+
+        with transaction.atomic():
+            if created:
+                deleted += Tank.objects.filter(model__in=created).delete()[0]
+            for group, fields in ((catalog, CATALOG_RESTORE_FIELDS), (prices, PRICE_RESTORE_FIELDS)):
+                # Oldest entry per tank wins when a tank was touched twice
+                by_tank = {}
+                for entry in group:
+                    by_tank[entry.tank_id] = entry
+                existing = set(Tank.objects.filter(id__in=by_tank).values_list('id', flat=True))
+                tanks = [
+                    Tank(id=tank_id, updated_at=now, **{f: getattr(e, f) for f in fields})
+                    for tank_id, e in by_tank.items() if tank_id in existing
+                ]
+                if tanks:
+                    Tank.objects.bulk_update(tanks, [*fields, 'updated_at'])
+                    restored += len(tanks)
+
+        last_id = entries[-1].id
+
+    journal.status = WriteJournal.STATUS_ROLLED_BACK
+    journal.rolled_back_at = timezone.now()
+    journal.save(update_fields=['status', 'rolled_back_at'])
+    bump_catalog_version()
+    return {'deleted': deleted, 'restored': restored}
@@ -0,0 +1,194 @@
+"""
+In-memory trigram index over (sales_person, client_name).
+
+Backs the "possible duplicate" typeahead in the export modal. Each worker
+keeps one bucket per salesperson, fed from local NexusExportLog rows,
+new exports and synced Nexus pricing_logs rows, so keystrokes are
+answered from memory instead of a LIKE '%q%' scan on the Nexus database.
+Near-duplicate spellings ("Acme Industires") are ranked by trigram overlap.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+
+def normalize(name):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', (name or '').lower()).split())
+
+
+def trigrams(text):
+    """Character trigrams of a normalized string, padded like pg_trgm."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Bucket:
+    """All indexed collections for one salesperson."""
+
+    def __init__(self):
+        self.entries   = {}                  # log_id -> entry dict
+        self.names     = {}                  # log_id -> normalized client name
+        self.grams     = {}                  # log_id -> trigram set
+        self.postings  = defaultdict(set)    # trigram -> {log_id}
+        self.synced_at = None                # last full sync from Nexus
+        self.syncing   = False
+
+    def put(self, entry):
+        log_id = str(entry['log_id'])
+        self.discard(log_id)
+        name  = normalize(entry['client_name'])
+        grams = trigrams(name)
+        self.entries[log_id] = entry
+        self.names[log_id]   = name
+        self.grams[log_id]   = grams
+        for gram in grams:
+            self.postings[gram].add(log_id)
+
+    def discard(self, log_id):
+        for gram in self.grams.pop(log_id, ()):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(log_id)
+                if not ids:
+                    del self.postings[gram]
+        self.entries.pop(log_id, None)
+        self.names.pop(log_id, None)
+
+
+class ClientNameIndex:
+    """
+    Per-worker index of client names, one bucket per salesperson.
+
+    Buckets are created lazily from the local export log (loader callback)
+    and marked synced once the salesperson's Nexus rows have been merged in.
+    """
+
+    # Minimum share of the query's trigrams a fuzzy match must contain
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self, ttl=300):
+        self.ttl      = ttl
+        self._lock    = threading.Lock()
+        self._buckets = {}
+
+    @staticmethod
+    def _key(sales_person):
+        return (sales_person or '').strip().lower()
+
+    def bucket(self, sales_person, loader=None):
+        """Return the bucket for a salesperson, seeding it via loader() if new."""
+        key = self._key(sales_person)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                return bucket
+
+        # Seed outside the lock so a slow query doesn't block other lookups
+        bucket = _Bucket()
+        for entry in (loader() if loader is not None else ()):
+            bucket.put(entry)
+        with self._lock:
+            return self._buckets.setdefault(key, bucket)
+
+    def has_bucket(self, sales_person):
+        with self._lock:
+            return self._key(sales_person) in self._buckets
+
+    def add(self, sales_person, entry):
+        """Index (or re-index) one collection for a salesperson."""
+        key = self._key(sales_person)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # Not seeded yet: the loader will pick it up from the DB
+                return
+            bucket.put(entry)
+
+    def needs_sync(self, sales_person):
+        """True if the bucket was never synced from Nexus or the sync expired."""
+        with self._lock:
+            bucket = self._buckets.get(self._key(sales_person))
+            if bucket is None or bucket.syncing:
+                return False
+            return bucket.synced_at is None or time.monotonic() - bucket.synced_at >= self.ttl
+
+    def is_synced(self, sales_person):
+        with self._lock:
+            bucket = self._buckets.get(self._key(sales_person))
+            return bucket is not None and bucket.synced_at is not None
+
+    def begin_sync(self, sales_person):
+        """Claim the sync for a bucket; False if another thread already has it."""
+        with self._lock:
+            bucket = self._buckets.get(self._key(sales_person))
+            if bucket is None or bucket.syncing:
+                return False
+            bucket.syncing = True
+            return True
+
+    def finish_sync(self, sales_person, entries=None):
+        """Merge a full set of Nexus rows into a bucket (None = sync failed)."""
+        with self._lock:
+            bucket = self._buckets.get(self._key(sales_person))
+            if bucket is None:
+                return
+            bucket.syncing = False
+            if entries is None:
+                return
+            for entry in entries:
+                bucket.put(entry)
+            bucket.synced_at = time.monotonic()
+
+    def search(self, sales_person, query, limit=6):
+        """
+        Rank a salesperson's collections against a typeahead query.
+
+        Substring matches come first (newest first), followed by fuzzy
+        matches ordered by trigram similarity. Queries shorter than a
+        trigram only match as substrings, found by scanning the bucket.
+        """
+        needle = normalize(query)
+        if not needle:
+            return []
+        query_grams = trigrams(needle)
+
+        with self._lock:
+            bucket = self._buckets.get(self._key(sales_person))
+            if bucket is None:
+                return []
+
+            shared = defaultdict(int)
+            if len(needle) < 3:
+                # No trigram of the query lies inside a longer word ("cm" in "acme")
+                for log_id, name in bucket.names.items():
+                    if needle in name:
+                        shared[log_id] = 0
+            else:
+                for gram in query_grams:
+                    for log_id in bucket.postings.get(gram, ()):
+                        shared[log_id] += 1
+
+            ranked = []
+            for log_id, count in shared.items():
+                entry = bucket.entries[log_id]
+                if needle in bucket.names[log_id]:
+                    score = 1.0
+                else:
+                    score = count / len(query_grams)
+                    if score < self.MIN_SIMILARITY:
+                        continue
+                ranked.append((score, entry))
+
+        ranked.sort(key=lambda item: (item[0], _sort_time(item[1])), reverse=True)
+        return [dict(entry, score=round(score, 3)) for score, entry in ranked[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def _sort_time(entry):
+    created_at = entry.get('created_at')
+    return created_at.timestamp() if created_at else 0.0
@@ -0,0 +1,206 @@
+"""
+Shared helpers for reading tank CSV files and comparing them with the catalog.
+
+Used by the admin CSV preview/confirm flow and the import_tank_csv
+management command. Rows are streamed from the file and matched against
+existing tanks in chunks (one model__in query per chunk) instead of one
+query per row.
+"""
+import codecs
+import csv
+import time
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .chunked_writes import WRITE_TIME_BUDGET, WriteBudget, catalog_entry, record_batch, take
+from .models import Tank
+
+
+# Numeric tank columns every catalog CSV row carries
+TANK_FIELDS = ['diameter', 'height', 'net_capacity', 'gross_capacity', 'ideal_price', 'nrp']
+
+PRICE_FIELDS = {'ideal_price', 'nrp'}
+
+# Rows resolved against the database per model__in query
+LOOKUP_CHUNK_SIZE = 500
+
+# Rows written per bulk upsert statement
+UPSERT_BATCH_SIZE = getattr(settings, 'TANK_UPSERT_BATCH_SIZE', 1000)
+
+
+def iter_csv_rows(uploaded_file, start=2):
+    """
+    Stream (row_num, row_dict) pairs from an uploaded CSV file without
+    reading and decoding the whole upload into memory first.
+    """
+    lines = codecs.iterdecode(uploaded_file, 'utf-8-sig')
+    reader = csv.DictReader(lines)
+    return enumerate(reader, start=start)
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_tank_row(row):
+    """
+    Parse the numeric columns of a tank CSV row.
+    Raises ValueError / KeyError for missing or malformed values.
+    """
+    return {field: float(row.get(field, 0)) for field in TANK_FIELDS}
+
+
+def existing_tanks(models):
+    """
+    Map model name → current column values for the given models.
+    One model__in query per LOOKUP_CHUNK_SIZE models.
+    """
+    found = {}
+    for chunk in chunked(set(models), LOOKUP_CHUNK_SIZE):
+        rows = Tank.objects.filter(model__in=chunk).values('id', 'model', *TANK_FIELDS)
+        for row in rows:
+            found[row['model']] = dict(
+                {field: float(row[field]) for field in TANK_FIELDS},
+                id=row['id'],
+            )
+    return found
+
+
+def values_differ(old_data, new_data):
+    """True if any tank column differs (prices compared to the paisa)."""
+    for field in TANK_FIELDS:
+        old, new = old_data[field], new_data[field]
+        if field in PRICE_FIELDS:
+            if round(old, 2) != round(new, 2):
+                return True
+        elif old != new:
+            return True
+    return False
+
+
+def classify(old_data, new_data):
+    """Return 'create', 'update' or 'unchanged' for a parsed row."""
+    if old_data is None:
+        return 'create'
+    return 'update' if values_differ(old_data, new_data) else 'unchanged'
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BULK UPSERT ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _upsert_batch(tanks):
+    Tank.objects.bulk_create(
+        tanks,
+        update_conflicts=True,
+        unique_fields=['model'],
+        update_fields=['category', *TANK_FIELDS, 'updated_at'],
+    )
+
+
+def upsert_tanks(rows, batch_size=UPSERT_BATCH_SIZE, on_batch=None,
+                 time_budget=WRITE_TIME_BUDGET, journal=None):
+    """
+    Create or update tanks from parsed rows with set-based writes.
+
+    rows: iterable of (label, model, data) where data holds TANK_FIELDS
+          and label identifies the row in error messages ("Row 12", model…).
+
+    Per batch: one model__in lookup, then one
+    INSERT … ON CONFLICT(model) DO UPDATE for every new or changed row.
+    Rows identical to the catalog are skipped and counted as unchanged.
+    If a batch write fails, its rows are retried one by one (each in a
+    savepoint) so the error can be pinned to the offending row.
+
+    Each batch commits on its own (unless called inside an outer
+    transaction). With a time_budget the batch size adapts so a single
+    commit holds the write lock for about that long. With a journal,
+    the previous state of every written row is recorded in the same
+    transaction as the write, so the import can be rolled back.
+
+    on_batch(result) is called after every batch with the running totals.
+
+    Returns a dict:
+        {'created', 'updated', 'unchanged', 'processed', 'batches': int,
+         'skipped': [msg], 'errors': [msg], 'created_by_category': Counter}
+    """
+    result = {
+        'created': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'processed': 0,
+        'batches': 0,
+        'skipped': [],
+        'errors': [],
+        'created_by_category': Counter(),
+    }
+
+    budget = WriteBudget(batch_size, time_budget)
+    iterator = iter(rows)
+    while True:
+        chunk = take(iterator, budget.size)
+        if not chunk:
+            break
+        started = time.perf_counter()
+        existing = existing_tanks(model for _, model, _ in chunk)
+
+        # model → (label, Tank, old_data); a model repeated in one batch keeps its last row
+        pending = {}
+        for label, model, data in chunk:
+            category = Tank.extract_category_from_model(model)
+            if not category:
+                result['skipped'].append(f"{label}: Could not determine category from '{model}'")
+                continue
+
+            old_data = existing.get(model)
+            if old_data is not None and not values_differ(old_data, data):
+                pending.pop(model, None)
+                result['unchanged'] += 1
+                continue
+
+            tank = Tank(model=model, category=category,
+                        **{field: data[field] for field in TANK_FIELDS})
+            pending[model] = (label, tank, old_data)
+
+        if pending:
+            written = []
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        _upsert_batch([tank for _, tank, _ in pending.values()])
+                    written = list(pending.values())
+                except Exception:
+                    for label, tank, old_data in pending.values():
+                        try:
+                            with transaction.atomic():
+                                _upsert_batch([tank])
+                            written.append((label, tank, old_data))
+                        except Exception as e:
+                            result['errors'].append(f"{label}: {str(e)}")
+
+                record_batch(journal, [catalog_entry(journal, tank.model, old_data)
+                                       for _, tank, old_data in written], len(written))
+
+            for _, tank, old_data in written:
+                if old_data is None:
+                    result['created'] += 1
+                    result['created_by_category'][tank.category] += 1
+                else:
+                    result['updated'] += 1
+
+        budget.record(len(chunk), time.perf_counter() - started)
+        result['processed'] += len(chunk)
+        result['batches'] = budget.batches
+        if on_batch is not None:
+            on_batch(result)
+
+    return result
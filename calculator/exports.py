@@ -0,0 +1,151 @@
+"""
+Streaming catalog export.
+
+Rows are read with values_list().iterator(), so no model instances are
+built and memory stays flat. They are encoded in blocks and yielded to a
+StreamingHttpResponse, so the download starts on the first block.
+Formats: csv, csv.gz (gzip stream) and ndjson.
+
+Under ASGI, Django reads a sync iterator into a list before sending
+anything, so ASGI requests get an async iterator that produces each
+block in the request's sync thread instead.
+"""
+import csv
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+
+from .models import Tank
+from .pricing import with_effective_prices
+
+
+# Rows fetched per database round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows encoded per yielded block
+EXPORT_BLOCK_ROWS = 500
+
+EXPORT_FORMATS = {
+    # format: (content type, file extension)
+    'csv':    ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# (CSV header, NDJSON key, values_list column)
+EXPORT_COLUMNS = [
+    ('ID',             'id',             'id'),
+    ('Model',          'model',          'model'),
+    ('Category',       'category',       'category'),
+    ('Diameter',       'diameter',       'diameter'),
+    ('Height',         'height',         'height'),
+    ('Net Capacity',   'net_capacity',   'net_capacity'),
+    ('Gross Capacity', 'gross_capacity', 'gross_capacity'),
+    ('Ideal Price',    'ideal_price',    'effective_ideal_price'),
+    ('NRP',            'nrp',            'effective_nrp'),
+    ('Status',         'status',         'is_active'),
+    ('Last Updated',   'updated_at',     'updated_at'),
+]
+
+CATEGORY_NAMES = dict(Tank.CATEGORY_CHOICES)
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield export rows as lists, in EXPORT_COLUMNS order, with display
+    values (category name, Active/Inactive, minute timestamps).
+    Prices include effective price lists.
+    """
+    columns = [column for _, _, column in EXPORT_COLUMNS]
+    rows = with_effective_prices(queryset).values_list(*columns).iterator(chunk_size=chunk_size)
+
+    # Imports stamp many rows with the same updated_at, and rows arrive
+    # sorted by it, so reuse the last formatted value
+    last_stamp = last_text = None
+    for row in rows:
+        row = list(row)
+        row[2] = CATEGORY_NAMES.get(row[2], row[2])
+        row[9] = 'Active' if row[9] else 'Inactive'
+        if row[10] != last_stamp:
+            last_stamp = row[10]
+            last_text = last_stamp.strftime('%Y-%m-%d %H:%M')
+        row[10] = last_text
+        yield row
+
+
+def _blocks(rows, size=EXPORT_BLOCK_ROWS):
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+class _Echo:
+    """File-like object whose write() returns the value (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+    for block in _blocks(rows):
+        yield ''.join(writer.writerow(row) for row in block)
+
+
+def stream_ndjson(rows):
+    keys = [key for _, key, _ in EXPORT_COLUMNS]
+    for block in _blocks(rows):
+        yield ''.join(json.dumps(dict(zip(keys, row)), default=float) + '\n' for row in block)
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of text chunks into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def aiter_stream(stream):
+    """
+    Async iterator over a sync stream, one block at a time. The rows
+    cursor lives in the request's sync thread, so every block (and the
+    final close) is run there.
+    """
+    next_block = sync_to_async(next)
+    done = object()
+    try:
+        while (block := await next_block(stream, done)) is not done:
+            yield block
+    finally:
+        await sync_to_async(stream.close)()
+
+
+def stream_export(queryset, export_format='csv', asynchronous=False):
+    """
+    Return (iterator, content_type, extension) for an export format.
+    asynchronous=True returns an async iterator, for ASGI responses.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}'")
+    content_type, extension = EXPORT_FORMATS[export_format]
+
+    rows = export_rows(queryset)
+    if export_format == 'ndjson':
+        stream = stream_ndjson(rows)
+    elif export_format == 'csv.gz':
+        stream = gzip_stream(stream_csv(rows))
+    else:
+        stream = stream_csv(rows)
+    if asynchronous:
+        stream = aiter_stream(stream)
+    return stream, content_type, extension
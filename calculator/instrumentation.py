@@ -0,0 +1,347 @@
+"""
+Per-request timing and query instrumentation.
+
+RequestTimingMiddleware (calculator.middleware) opens a RequestStats for
+every request. ORM queries are timed by query_wrapper(), an execute
+wrapper on every connection, Nexus calls by nexus_cursor() and JSON
+encoding by the JsonResponse below; all of them report into the current
+request's stats through a context variable, so nothing has to be passed
+around. The context variable also follows async views into the
+sync_to_async threads that run their ORM queries.
+
+Only a sample of requests (REQUEST_TIMING_SAMPLE_RATE) get query, Nexus
+and serialization detail; every request still counts towards its
+endpoint's call count and latency. Aggregates are kept per worker and
+flushed to the cache every REQUEST_TIMING_FLUSH_INTERVAL seconds, where
+the admin performance page merges all workers. That needs a cache the
+workers share (settings.CACHES); with a per-process cache the page can
+only show the worker that answers, and says so.
+
+Sampled requests are also checked against QUERY_BUDGETS when
+QUERY_BUDGET_MODE is set (staging); the test suite checks the same
+budgets on small and large catalogs.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import JsonResponse as BaseJsonResponse
+
+
+SAMPLE_RATE    = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+FLUSH_INTERVAL = getattr(settings, 'REQUEST_TIMING_FLUSH_INTERVAL', 30)
+
+# '' (off), 'warn' (log and count) or 'raise' (fail the request)
+BUDGET_MODE = getattr(settings, 'QUERY_BUDGET_MODE', '')
+
+# A statement repeated this often in one request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+# Recent durations kept per endpoint for percentiles
+RECENT_DURATIONS = 200
+
+CACHE_WORKERS_KEY = 'perf:workers'
+CACHE_WORKER_KEY  = 'perf:worker:{}'
+CACHE_TIMEOUT     = 3600
+
+_current = ContextVar('request_stats', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# QUERY BUDGETS
+# ══════════════════════════════════════════════════════════════════════════════
+# Most queries one request to a view (by URL name) may run, session and
+# user lookups included. Budgets must not depend on catalog size: views
+# that need more queries as the catalog grows have an N+1 to fix.
+#
+# Uploads write in batches, so their budgets cover a file of
+# BUDGET_UPLOAD_ROWS rows (or a journal of that many entries); bigger
+# files legitimately take a few more batches.
+
+BUDGET_UPLOAD_ROWS = 1000
+
+QUERY_BUDGETS = {
+    # Public
+    'home':                         0,
+    'tank_search':                  2,
+    'get_models':                   2,
+    'get_stats':                    2,
+    'download_tank_template':       0,
+    'metrics':                      2,
+    'nexus_users':                  0,
+    'nexus_projects':               1,
+    'nexus_check':                  0,
+    'nexus_export':                 6,
+    'nexus_export_batch':           3,
+    'custom_login':                 9,
+    'custom_logout':                4,
+    # Admin
+    'admin_dashboard':              4,
+    'admin_performance':            2,
+    'admin_performance_reset':      2,
+    'admin_tank_list':              5,
+    'admin_tank_update':            8,
+    'admin_tank_toggle':            7,
+    'admin_tank_batch_update':      10,
+    'admin_tank_bulk_status':       3,
+    'admin_reprice':                5,
+    'admin_catalog_validate':       3,
+    'admin_tank_export':            4,
+    'admin_csv_upload':             2,
+    'admin_bulk_price':             2,
+    'admin_csv_preview':            31,
+    'admin_csv_confirm':            59,
+    'admin_bulk_price_update':      39,
+    'admin_import_job_status':      3,
+    'admin_import_job_cancel':      5,
+    'admin_write_journal_rollback': 18,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than QUERY_BUDGETS allows ('raise' mode)."""
+
+
+def over_budget(view, queries):
+    """The view's budget if `queries` exceeds it, else None."""
+    budget = QUERY_BUDGETS.get(view)
+    if budget is not None and queries > budget:
+        return budget
+    return None
+
+
+class RequestStats:
+    """Measurements for one request."""
+
+    def __init__(self, sampled):
+        self.sampled        = sampled
+        self.started        = time.perf_counter()
+        self.queries        = 0
+        self.query_time     = 0.0
+        self.nexus_calls    = 0
+        self.nexus_time     = 0.0
+        self.serialize_time = 0.0
+        self.statements     = Counter() if sampled else None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper hook, called through query_wrapper()."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries    += 1
+            self.query_time += time.perf_counter() - started
+            self.statements[normalize_sql(sql)] += 1
+
+    def repeated_statement(self):
+        """(count, sql) of the most repeated statement, or (0, '')."""
+        if not self.statements:
+            return 0, ''
+        sql, count = self.statements.most_common(1)[0]
+        return count, sql
+
+    def server_timing(self, total):
+        """Server-Timing header value, durations in milliseconds."""
+        parts = [f'total;dur={total * 1000:.1f}']
+        if self.sampled:
+            app = total - self.query_time - self.nexus_time - self.serialize_time
+            parts += [
+                f'db;dur={self.query_time * 1000:.1f};desc="{self.queries} queries"',
+                f'nexus;dur={self.nexus_time * 1000:.1f};desc="{self.nexus_calls} calls"',
+                f'serialize;dur={self.serialize_time * 1000:.1f}',
+                f'app;dur={max(app, 0) * 1000:.1f}',
+            ]
+        return ', '.join(parts)
+
+
+def start_request(sampled):
+    stats = RequestStats(sampled)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Permanent execute wrapper: times queries of sampled requests."""
+    stats = _current.get()
+    if stats is None or not stats.sampled:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if query_wrapper not in connection.execute_wrappers:
+        # First in the list: connection.execute_wrapper() blocks pop the last one
+        connection.execute_wrappers.insert(0, query_wrapper)
+
+
+def record_nexus(elapsed):
+    """Called by nexus_cursor() once per Nexus round trip."""
+    stats = _current.get()
+    if stats is not None and stats.sampled:
+        stats.nexus_calls += 1
+        stats.nexus_time  += elapsed
+
+
+_NUMBER  = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING  = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"IN \((?:\s*(?:%s|\?)\s*,?)+\)")
+
+
+def normalize_sql(sql):
+    """Statement shape with literals and IN lists collapsed, for N+1 counting."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class JsonResponse(BaseJsonResponse):
+    """django.http.JsonResponse that reports its encoding time."""
+
+    def __init__(self, *args, **kwargs):
+        started = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        stats = _current.get()
+        if stats is not None and stats.sampled:
+            stats.serialize_time += time.perf_counter() - started
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# AGGREGATION
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _empty_endpoint():
+    return {
+        'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+        'sampled': 0, 'queries': 0, 'max_queries': 0, 'query_ms': 0.0,
+        'nexus_calls': 0, 'nexus_ms': 0.0, 'serialize_ms': 0.0,
+        'max_repeated': 0, 'repeated_sql': '', 'over_budget': 0,
+    }
+
+
+class EndpointStats:
+    """Per-worker aggregates by view name."""
+
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self._endpoints = {}
+        self._recent    = {}
+        self._flushed   = time.monotonic()
+
+    def record(self, view, stats, total, status, exceeded=False):
+        with self._lock:
+            e = self._endpoints.setdefault(view, _empty_endpoint())
+            e['calls']    += 1
+            e['errors']   += status >= 500
+            e['total_ms'] += total * 1000
+            e['max_ms']    = max(e['max_ms'], total * 1000)
+            self._recent.setdefault(view, deque(maxlen=RECENT_DURATIONS)).append(total * 1000)
+            if stats.sampled:
+                repeated, sql = stats.repeated_statement()
+                e['sampled']      += 1
+                e['queries']      += stats.queries
+                e['max_queries']   = max(e['max_queries'], stats.queries)
+                e['query_ms']     += stats.query_time * 1000
+                e['nexus_calls']  += stats.nexus_calls
+                e['nexus_ms']     += stats.nexus_time * 1000
+                e['serialize_ms'] += stats.serialize_time * 1000
+                e['over_budget']  += exceeded
+                if repeated >= N_PLUS_ONE_THRESHOLD and repeated > e['max_repeated']:
+                    e['max_repeated'], e['repeated_sql'] = repeated, sql[:500]
+            flush = time.monotonic() - self._flushed >= FLUSH_INTERVAL
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: dict(e, recent_ms=list(self._recent.get(view, ())))
+                for view, e in self._endpoints.items()
+            }
+
+    def flush(self):
+        """Publish this worker's aggregates to the cache."""
+        with self._lock:
+            self._flushed = time.monotonic()
+        key = CACHE_WORKER_KEY.format(os.getpid())
+        cache.set(key, self.snapshot(), CACHE_TIMEOUT)
+        workers = cache.get(CACHE_WORKERS_KEY) or []
+        if key not in workers:
+            cache.set(CACHE_WORKERS_KEY, workers + [key], CACHE_TIMEOUT)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._recent.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def collected_stats():
+    """
+    Aggregates merged over every worker that flushed to the cache (and
+    this worker's live numbers). Returns {view: summary}, where summary
+    adds averages and p95 to the raw counters.
+    """
+    endpoint_stats.flush()
+    merged = {}
+    for key in cache.get(CACHE_WORKERS_KEY) or []:
+        for view, e in (cache.get(key) or {}).items():
+            m = merged.setdefault(view, dict(_empty_endpoint(), recent_ms=[]))
+            for field in ('calls', 'errors', 'total_ms', 'sampled', 'queries',
+                          'query_ms', 'nexus_calls', 'nexus_ms', 'serialize_ms', 'over_budget'):
+                m[field] += e.get(field, 0)
+            m['max_ms']      = max(m['max_ms'], e['max_ms'])
+            m['max_queries'] = max(m['max_queries'], e['max_queries'])
+            if e['max_repeated'] > m['max_repeated']:
+                m['max_repeated'], m['repeated_sql'] = e['max_repeated'], e['repeated_sql']
+            m['recent_ms'] += e['recent_ms']
+
+    for view, m in merged.items():
+        recent = sorted(m.pop('recent_ms'))
+        sampled = m['sampled'] or 1
+        m['avg_ms']           = round(m['total_ms'] / m['calls'], 1)
+        m['p95_ms']           = round(recent[int(len(recent) * 0.95)] if recent else 0, 1)
+        m['avg_queries']      = round(m['queries'] / sampled, 1)
+        m['avg_query_ms']     = round(m['query_ms'] / sampled, 1)
+        m['avg_nexus_ms']     = round(m['nexus_ms'] / sampled, 1)
+        m['avg_serialize_ms'] = round(m['serialize_ms'] / sampled, 1)
+        m['query_budget']     = QUERY_BUDGETS.get(view)
+        for field in ('total_ms', 'max_ms', 'query_ms', 'nexus_ms', 'serialize_ms'):
+            m[field] = round(m[field], 1)
+    return merged
+
+
+def stats_scope():
+    """
+    (workers, shared): how many workers have flushed aggregates, and
+    whether the cache is shared between processes at all.
+    """
+    shared = not isinstance(caches['default'], (LocMemCache, DummyCache))
+    return len(cache.get(CACHE_WORKERS_KEY) or []), shared
+
+
+def reset_stats():
+    """Forget the aggregates of every worker."""
+    endpoint_stats.reset()
+    for key in cache.get(CACHE_WORKERS_KEY) or []:
+        cache.delete(key)
+    cache.delete(CACHE_WORKERS_KEY)
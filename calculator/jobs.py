@@ -0,0 +1,157 @@
+"""
+Background runner for confirmed catalog imports.
+
+admin_csv_confirm hands the staged import to submit_import_job() and
+returns straight away. The job then runs in a worker thread (default),
+inline, or is left queued for the run_import_jobs management command,
+depending on settings.IMPORT_JOB_RUNNER. Progress is saved after every
+committed batch so any worker can answer the polling endpoint.
+
+Those progress saves double as a heartbeat: a RUNNING job whose
+updated_at is older than IMPORT_JOB_STALE_AFTER lost its worker (restart
+or crash) and is marked failed when its status is read or when
+run_import_jobs starts.
+"""
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .chunked_writes import WRITE_TIME_BUDGET, close_journal, start_journal
+from .csv_import import UPSERT_BATCH_SIZE
+from .models import ImportJob, WriteJournal
+from .staging import apply_catalog_import
+
+
+RUNNER_THREAD = 'thread'
+RUNNER_INLINE = 'inline'
+RUNNER_COMMAND = 'command'
+
+# Seconds without a progress save after which a RUNNING job is considered dead
+STALE_AFTER = getattr(settings, 'IMPORT_JOB_STALE_AFTER', 600)
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback when cancellation was requested."""
+
+
+def submit_import_job(pending, created_by=''):
+    """Create a job for a staged import and start it according to the runner setting."""
+    job = ImportJob.objects.create(
+        pending_import=pending,
+        created_by=created_by,
+        rows_total=pending.rows.count(),
+    )
+
+    runner = getattr(settings, 'IMPORT_JOB_RUNNER', RUNNER_THREAD)
+    if runner == RUNNER_INLINE:
+        run_import_job(job.pk)
+        job.refresh_from_db()
+    elif runner == RUNNER_THREAD:
+        thread = threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True)
+        thread.start()
+    # RUNNER_COMMAND: stays queued until `manage.py run_import_jobs` picks it up
+    return job
+
+
+def _run_in_thread(job_pk):
+    try:
+        run_import_job(job_pk)
+    finally:
+        connection.close()
+
+
+def _store_progress(job, result):
+    job.rows_processed = result['processed']
+    job.created_count = result['created']
+    job.updated_count = result['updated']
+    job.unchanged_count = result['unchanged']
+    messages = result['skipped'] + result['errors']
+    job.error_count = len(messages)
+    job.errors = messages[:ImportJob.MAX_STORED_ERRORS]
+    job.save(update_fields=['rows_processed', 'created_count', 'updated_count',
+                            'unchanged_count', 'error_count', 'errors', 'updated_at'])
+
+
+def run_import_job(job_pk, batch_size=UPSERT_BATCH_SIZE, time_budget=WRITE_TIME_BUDGET):
+    """
+    Run one queued job to completion.
+
+    Batches commit one by one; after each, progress is stored and the
+    cancel flag is checked. A cancelled or failed job keeps the batches
+    it already committed; its write journal can undo them.
+    """
+    claimed = ImportJob.objects.filter(pk=job_pk, status=ImportJob.STATUS_QUEUED).update(
+        status=ImportJob.STATUS_RUNNING, started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    job = ImportJob.objects.select_related('pending_import').get(pk=job_pk)
+    job.journal = start_journal('csv_import', job.created_by)
+    job.save(update_fields=['journal', 'updated_at'])
+
+    def on_batch(result):
+        _store_progress(job, result)
+        if ImportJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
+
+    try:
+        if job.pending_import is None:
+            raise ValueError('Staged import no longer exists')
+        apply_catalog_import(job.pending_import, batch_size=batch_size, on_batch=on_batch,
+                             time_budget=time_budget, journal=job.journal)
+        job.status = ImportJob.STATUS_SUCCEEDED
+    except JobCancelled:
+        job.status = ImportJob.STATUS_CANCELLED
+        job.message = f'Cancelled after {job.rows_processed} of {job.rows_total} rows'
+    except Exception as e:
+        traceback.print_exc()
+        job.status = ImportJob.STATUS_FAILED
+        job.message = str(e)
+
+    close_journal(job.journal, WriteJournal.STATUS_COMPLETE
+                  if job.status == ImportJob.STATUS_SUCCEEDED else WriteJournal.STATUS_FAILED)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+    return job
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STALE JOBS
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=STALE_AFTER)
+
+
+def is_stale(job):
+    """True if a RUNNING job has not saved progress within STALE_AFTER."""
+    return job.status == ImportJob.STATUS_RUNNING and job.updated_at < _stale_cutoff()
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Mark RUNNING jobs without a recent heartbeat as failed and close
+    their write journals, so the batches they committed can be undone.
+    Returns the number of jobs marked.
+    """
+    cutoff = _stale_cutoff()
+    if jobs is None:
+        jobs = ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING, updated_at__lt=cutoff)
+    failed = 0
+    for job in jobs:
+        now = timezone.now()
+        # Conditional so a job that saved progress in the meantime is left alone
+        marked = ImportJob.objects.filter(
+            pk=job.pk, status=ImportJob.STATUS_RUNNING, updated_at__lt=cutoff,
+        ).update(
+            status=ImportJob.STATUS_FAILED, finished_at=now, updated_at=now,
+            message=f'Worker stopped after {job.rows_processed} of {job.rows_total} rows',
+        )
+        if marked:
+            close_journal(job.journal, WriteJournal.STATUS_FAILED)
+            failed += 1
+    return failed
@@ -0,0 +1,118 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from calculator.benchmarks import (
+    DEFAULT_REPEAT, DEFAULT_SIZES, DEFAULT_UPLOAD_ROWS, compare_runs, run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = "Time every public and admin endpoint on synthetic catalogs (throwaway test database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=str,
+            default=",".join(str(s) for s in DEFAULT_SIZES),
+            help="Comma separated catalog sizes, e.g. 1000,10000,100000,1000000"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=DEFAULT_REPEAT,
+            help=f"Timed requests per endpoint after one warm-up (default {DEFAULT_REPEAT})"
+        )
+        parser.add_argument(
+            "--upload-rows",
+            type=int,
+            default=DEFAULT_UPLOAD_ROWS,
+            help=f"Rows in the CSV and price sheet uploads (default {DEFAULT_UPLOAD_ROWS})"
+        )
+        parser.add_argument(
+            "--nexus-latency",
+            type=float,
+            default=0,
+            help="Milliseconds the Nexus stub waits per query (default 0)"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=0,
+            help="Also fire this many simultaneous requests at the Nexus endpoints and "
+                 "compare with serving them one at a time (use with --nexus-latency)"
+        )
+        parser.add_argument(
+            "--only",
+            type=str,
+            default="",
+            help="Comma separated endpoint name prefixes to run, e.g. tank_search,admin_csv"
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Catalog generator seed (default 0)"
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Write the JSON report to this file instead of stdout"
+        )
+        parser.add_argument(
+            "--compare",
+            type=str,
+            help="Earlier JSON report; fail if any endpoint got slower than --max-slowdown"
+        )
+        parser.add_argument(
+            "--max-slowdown",
+            type=float,
+            default=1.25,
+            help="Allowed median slowdown ratio when comparing (default 1.25)"
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        only = [p.strip() for p in options["only"].split(",") if p.strip()]
+        # Progress goes to stderr when the report itself is printed
+        out = self.stdout if options["output"] else self.stderr
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = run_benchmarks(
+                sizes=sizes,
+                repeat=options["repeat"],
+                upload_rows=options["upload_rows"],
+                nexus_latency=options["nexus_latency"] / 1000,
+                only=only,
+                seed=options["seed"],
+                concurrency=options["concurrency"],
+                log=out.write,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if baseline is not None:
+            regressions = compare_runs(baseline, report, max_slowdown=options["max_slowdown"])
+            for r in regressions:
+                out.write(f"⚠️  {r['endpoint']} @ {r['size']:,}: "
+                          f"{r['baseline_ms']} ms → {r['current_ms']} ms ({r['ratio']}x)")
+            if regressions:
+                raise CommandError(f"{len(regressions)} endpoint regressions")
+            out.write(self.style.SUCCESS("✅ No regressions against baseline"))
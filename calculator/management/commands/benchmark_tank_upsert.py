@@ -0,0 +1,110 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from calculator.models import Tank
+from calculator.csv_import import UPSERT_BATCH_SIZE, upsert_tanks
+
+
+CATEGORIES = ['RCT', 'SST', 'SFM', 'GFS']
+
+
+class Command(BaseCommand):
+    help = "Benchmark the bulk tank upsert engine against per-row update_or_create"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=str,
+            default="1000,10000,100000",
+            help="Comma separated row counts to benchmark"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=UPSERT_BATCH_SIZE,
+            help=f"Rows per bulk upsert (default {UPSERT_BATCH_SIZE})"
+        )
+        parser.add_argument(
+            "--skip-legacy-above",
+            type=int,
+            default=None,
+            help="Skip the per-row path for row counts above this"
+        )
+
+    # ── Synthetic data ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _row(i, price_bump=0):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        diameter = 2.0 + (i % 40) * 0.5
+        height = 1.0 + (i % 12) * 0.4
+        capacity = round(3.1416 * (diameter / 2) ** 2 * height, 2)
+        return (
+            f"Row {i + 2}",
+            f"{category}BENCH{i}-{int(height * 10)}",
+            {
+                'diameter': diameter,
+                'height': height,
+                'net_capacity': capacity,
+                'gross_capacity': round(capacity * 1.08, 2),
+                'ideal_price': 100000.0 + i + price_bump,
+                'nrp': 90000.0 + i + price_bump,
+            },
+        )
+
+    def _workload(self, n):
+        """Half the rows already exist (half of those with new prices), half are new."""
+        seed = [self._row(i) for i in range(n // 2)]
+        rows = [self._row(i, price_bump=500 if i % 2 else 0) for i in range(n)]
+        return seed, rows
+
+    @staticmethod
+    def _seed(seed):
+        Tank.objects.bulk_create(
+            [Tank(model=model, category=Tank.extract_category_from_model(model), **data)
+             for _, model, data in seed],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+
+    # ── Paths under test ──────────────────────────────────────────────────────
+
+    @staticmethod
+    def _legacy(rows):
+        for _, model, data in rows:
+            Tank.objects.update_or_create(
+                model=model,
+                defaults=dict(data, category=Tank.extract_category_from_model(model)),
+            )
+
+    def _timed(self, seed, rows, fn):
+        """Run fn(rows) on a seeded catalog inside a transaction that is rolled back."""
+        with transaction.atomic():
+            self._seed(seed)
+            start = time.perf_counter()
+            fn(rows)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["rows"].split(",") if s.strip()]
+        batch_size = options["batch_size"]
+        skip_above = options["skip_legacy_above"]
+
+        self.stdout.write(f"{'rows':>10} {'per-row (s)':>14} {'bulk (s)':>10} {'speedup':>9} {'bulk rows/s':>12}")
+        self.stdout.write("-" * 59)
+
+        for n in sizes:
+            seed, rows = self._workload(n)
+
+            bulk = self._timed(seed, rows, lambda r: upsert_tanks(r, batch_size=batch_size))
+
+            if skip_above is not None and n > skip_above:
+                legacy_col, speedup_col = f"{'skipped':>14}", f"{'-':>9}"
+            else:
+                legacy = self._timed(seed, rows, self._legacy)
+                legacy_col, speedup_col = f"{legacy:>14.2f}", f"{legacy / bulk:>8.1f}x"
+
+            self.stdout.write(f"{n:>10} {legacy_col} {bulk:>10.2f} {speedup_col} {n / bulk:>12,.0f}")
+
+        self.stdout.write(self.style.SUCCESS("\n✅ Benchmark finished (all changes rolled back)"))
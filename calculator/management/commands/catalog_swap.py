@@ -0,0 +1,95 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from calculator.catalog_swap import (
+    CatalogSwapError, catalog_status, diff_shadow, load_shadow, promote_shadow,
+    rollback_swap, validate_shadow,
+)
+from calculator.csv_import import iter_csv_rows, parse_tank_row
+
+
+class Command(BaseCommand):
+    help = "Stage a full tank catalog in a shadow table and swap it in atomically"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["load", "diff", "promote", "rollback", "status"],
+            help="load a CSV into the shadow table, diff/promote it, or roll back the last swap"
+        )
+        parser.add_argument(
+            "--file",
+            type=str,
+            help="Path to tanks.csv (for load)"
+        )
+        parser.add_argument(
+            "--drop-missing",
+            action="store_true",
+            help="Leave out live tanks missing from the CSV instead of carrying them over inactive"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Promote even if validation reports problems"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"_{options['action']}")(options)
+        except CatalogSwapError as e:
+            raise CommandError(str(e))
+
+    # ── Actions ───────────────────────────────────────────────────────────────
+
+    def _load(self, options):
+        if not options["file"]:
+            raise CommandError("--file is required for load")
+        file_path = Path(options["file"])
+        if not file_path.exists():
+            raise CommandError(f"File not found: {file_path}")
+
+        errors = []
+
+        def parsed_rows(rows):
+            for row_num, row in rows:
+                try:
+                    yield f"Row {row_num}", row["tank_model"].strip(), parse_tank_row(row)
+                except (KeyError, ValueError, TypeError) as e:
+                    errors.append(f"Row {row_num}: Invalid data - {e}")
+
+        self.stdout.write("📂 Loading shadow catalog...")
+        with open(file_path, "rb") as csvfile:
+            report = load_shadow(parsed_rows(iter_csv_rows(csvfile)), file_name=file_path.name,
+                                 drop_missing=options["drop_missing"])
+
+        for message in report["skipped"] + errors:
+            self.stdout.write(self.style.WARNING(f"⚠️  {message}"))
+        self.stdout.write(f"📊 Rows read: {report['rows']}")
+        self.stdout.write(f"📦 Tanks in shadow: {report['loaded']}")
+        self.stdout.write(f"🔁 Duplicate models in file: {report['duplicates']}")
+        self.stdout.write(f"💤 Carried over inactive: {report['carried_over']}")
+        self._diff(options)
+
+    def _diff(self, options):
+        diff = diff_shadow()
+        self.stdout.write("\n🔍 SHADOW vs LIVE:")
+        for key, info in diff.items():
+            sample = ", ".join(info["sample"])
+            self.stdout.write(f"   {key:<12} {info['count']:>7}" + (f"   e.g. {sample}" if sample else ""))
+
+        problems = validate_shadow(diff)
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f"❌ {problem}"))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("✅ Shadow catalog is ready to promote"))
+
+    def _promote(self, options):
+        result = promote_shadow(force=options["force"])
+        self.stdout.write(self.style.SUCCESS(f"✅ New catalog is live (version {result['version']})"))
+
+    def _rollback(self, options):
+        result = rollback_swap()
+        self.stdout.write(self.style.SUCCESS(f"✅ Previous catalog restored (version {result['version']})"))
+
+    def _status(self, options):
+        for key, value in catalog_status().items():
+            self.stdout.write(f"   {key:<18} {value}")
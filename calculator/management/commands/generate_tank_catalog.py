@@ -0,0 +1,97 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from calculator.catalog import bump_catalog_version
+from calculator.catalog_generator import (
+    INSERT_BATCH_SIZE, generate_tanks, insert_tanks, split_count, write_csv,
+)
+from calculator.models import Tank
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic tank catalog as CSV or straight into the database"
+
+    def add_arguments(self, parser):
+        size = parser.add_mutually_exclusive_group(required=True)
+        size.add_argument(
+            "--count",
+            type=int,
+            help="Total tanks, spread evenly over the categories"
+        )
+        size.add_argument(
+            "--per-category",
+            type=int,
+            help="Tanks per category"
+        )
+        parser.add_argument(
+            "--categories",
+            type=str,
+            default="",
+            help="Comma separated categories (default: all)"
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed; the same seed always gives the same catalog (default 0)"
+        )
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            "--output",
+            type=str,
+            help="Write an importable CSV to this file ('-' for stdout)"
+        )
+        target.add_argument(
+            "--insert",
+            action="store_true",
+            help="Insert into the Tank table (existing models are left alone)"
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="With --insert: delete every existing tank first"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=INSERT_BATCH_SIZE,
+            help=f"Rows per committed insert (default {INSERT_BATCH_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        valid = [code for code, _ in Tank.CATEGORY_CHOICES]
+        categories = [c.strip().upper() for c in options["categories"].split(",") if c.strip()] or valid
+        unknown = set(categories) - set(valid)
+        if unknown:
+            raise CommandError(f"Unknown categories: {', '.join(sorted(unknown))}")
+        if options["replace"] and not options["insert"]:
+            raise CommandError("--replace only applies with --insert")
+
+        if options["count"] is not None:
+            per_category = split_count(options["count"], categories)
+        else:
+            per_category = options["per_category"]
+        rows = generate_tanks(per_category, categories, seed=options["seed"])
+
+        started = time.perf_counter()
+        if options["output"]:
+            if options["output"] == "-":
+                write_csv(rows, sys.stdout)
+                return
+            with open(options["output"], "w", newline="") as f:
+                count = write_csv(rows, f)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Wrote {count:,} tanks to {options['output']} in {time.perf_counter() - started:.1f}s"
+            ))
+            return
+
+        if options["replace"]:
+            deleted = Tank.objects.all().delete()[0]
+            self.stdout.write(f"🗑️  Deleted {deleted:,} existing tanks")
+        count = insert_tanks(rows, batch_size=options["batch_size"])
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Inserted {count:,} tanks in {time.perf_counter() - started:.1f}s "
+            f"({Tank.objects.count():,} in catalog)"
+        ))
@@ -1,6 +1,10 @@
 import csv
 from django.core.management.base import BaseCommand
 from calculator.models import Tank
+from calculator.chunked_writes import WRITE_TIME_BUDGET, close_journal, start_journal
+from calculator.csv_import import TANK_FIELDS, UPSERT_BATCH_SIZE, upsert_tanks
+from calculator.models import WriteJournal
+from calculator.pricing import fold_price_lists
 from pathlib import Path
 
 
@@ -19,6 +23,18 @@ class Command(BaseCommand):
             action="store_true",
             help="Clear existing data before import"
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=UPSERT_BATCH_SIZE,
+            help=f"Rows written per bulk upsert (default {UPSERT_BATCH_SIZE})"
+        )
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=WRITE_TIME_BUDGET,
+            help=f"Target seconds per committed batch; 0 keeps --batch-size fixed (default {WRITE_TIME_BUDGET})"
+        )
 
     def handle(self, *args, **options):
         file_path = Path(options["file"])
@@ -42,6 +58,7 @@ class Command(BaseCommand):
             'total': 0,
             'created': 0,
             'updated': 0,
+            'unchanged': 0,
             'skipped': 0,
             'errors': 0,
             'categories': {'RCT': 0, 'SST': 0, 'SFM': 0, 'GFS': 0}
@@ -49,57 +66,16 @@ class Command(BaseCommand):
 
         self.stdout.write("📂 Reading CSV file...")
 
-        with open(file_path, newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-
+        def parsed_rows(reader):
+            """Yield (label, model, data) for valid rows; report bad ones."""
             for row_num, row in enumerate(reader, start=2):  # Start at 2 (skip header)
                 stats['total'] += 1
 
                 try:
                     # Extract and validate data
                     model = row["tank_model"].strip()
-                    diameter = float(row["diameter"])
-                    height = float(row["height"])
-                    net_capacity = float(row["net_capacity"])
-                    gross_capacity = float(row["gross_capacity"])
-                    ideal_price = float(row["ideal_price"])
-                    nrp = float(row["nrp"])
-
-                    # Extract category from model name
-                    category = Tank.extract_category_from_model(model)
-
-                    if not category:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"⚠️  Row {row_num}: Could not extract category from '{model}'"
-                            )
-                        )
-                        stats['skipped'] += 1
-                        continue
-
-                    # Create or update tank
-                    tank, created = Tank.objects.update_or_create(
-                        model=model,
-                        defaults={
-                            'category': category,
-                            'diameter': diameter,
-                            'height': height,
-                            'net_capacity': net_capacity,
-                            'gross_capacity': gross_capacity,
-                            'ideal_price': ideal_price,
-                            'nrp': nrp,
-                        }
-                    )
-
-                    if created:
-                        stats['created'] += 1
-                        stats['categories'][category] = stats['categories'].get(category, 0) + 1
-                    else:
-                        stats['updated'] += 1
-
-                    # Progress indicator (every 100 rows)
-                    if stats['total'] % 100 == 0:
-                        self.stdout.write(f"📊 Processed {stats['total']} rows...")
+                    data = {field: float(row[field]) for field in TANK_FIELDS}
+                    yield f"Row {row_num}", model, data
 
                 except KeyError as e:
                     self.stdout.write(
@@ -109,7 +85,7 @@ class Command(BaseCommand):
                     )
                     stats['errors'] += 1
 
-                except ValueError as e:
+                except (ValueError, TypeError) as e:
                     self.stdout.write(
                         self.style.ERROR(
                             f"❌ Row {row_num}: Invalid data - {e}"
@@ -117,13 +93,46 @@ class Command(BaseCommand):
                     )
                     stats['errors'] += 1
 
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f"❌ Row {row_num}: Unexpected error - {e}"
-                        )
-                    )
-                    stats['errors'] += 1
+        def progress(result):
+            # Progress indicator (every batch)
+            self.stdout.write(f"📊 Processed {stats['total']} rows...")
+
+        with open(file_path, newline="", encoding="utf-8") as csvfile:
+            reader = csv.DictReader(csvfile)
+
+            # Create or update tanks in set-based batches, each committed
+            # on its own and journaled so the import can be undone.
+            # Effective price lists are folded first so they don't hide it.
+            fold_price_lists()
+            journal = start_journal('import_command')
+            try:
+                result = upsert_tanks(
+                    parsed_rows(reader),
+                    batch_size=options["batch_size"],
+                    on_batch=progress,
+                    time_budget=options["time_budget"],
+                    journal=journal,
+                )
+            except BaseException:
+                close_journal(journal, WriteJournal.STATUS_FAILED)
+                self.stdout.write(self.style.ERROR(
+                    f"❌ Import stopped; undo committed batches with: "
+                    f"manage.py rollback_write_journal {journal.journal_id}"
+                ))
+                raise
+            close_journal(journal)
+
+        for message in result['skipped']:
+            self.stdout.write(self.style.WARNING(f"⚠️  {message}"))
+        for message in result['errors']:
+            self.stdout.write(self.style.ERROR(f"❌ {message}"))
+
+        stats['created'] = result['created']
+        stats['updated'] = result['updated']
+        stats['unchanged'] = result['unchanged']
+        stats['skipped'] = len(result['skipped'])
+        stats['errors'] += len(result['errors'])
+        stats['categories'].update(result['created_by_category'])
 
         # Display results
         self.stdout.write("\n" + "="*60)
@@ -133,8 +142,10 @@ class Command(BaseCommand):
         self.stdout.write(f"📊 Total rows processed: {stats['total']}")
         self.stdout.write(f"✅ Created: {stats['created']}")
         self.stdout.write(f"🔄 Updated: {stats['updated']}")
+        self.stdout.write(f"⏸️  Unchanged: {stats['unchanged']}")
         self.stdout.write(f"⚠️  Skipped: {stats['skipped']}")
         self.stdout.write(f"❌ Errors: {stats['errors']}")
+        self.stdout.write(f"🧾 Batches committed: {result['batches']} (undo: rollback_write_journal {journal.journal_id})")
         
         self.stdout.write("\n📦 BREAKDOWN BY CATEGORY:")
         for category, count in stats['categories'].items():
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from calculator.models import PriceList
+from calculator.pricing import fold_price_lists
+
+
+class Command(BaseCommand):
+    help = "List scheduled price lists or fold effective ones into the tank catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fold",
+            action="store_true",
+            help="Copy effective price lists into Tank prices (run off-peak)"
+        )
+
+    def handle(self, *args, **options):
+        if options["fold"]:
+            folded = fold_price_lists()
+            for price_list, updated in folded:
+                self.stdout.write(f"✅ Folded {price_list} into {updated} tanks")
+            if not folded:
+                self.stdout.write("Nothing to fold")
+            return
+
+        for price_list in PriceList.objects.all()[:50]:
+            self.stdout.write(
+                f"{price_list.id:>5}  {price_list.effective_from:%Y-%m-%d %H:%M}  "
+                f"{price_list.status:<10} {price_list.entry_count:>7} tanks  {price_list.name}"
+            )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator.chunked_writes import rollback_journal
+from calculator.models import WriteJournal
+
+
+class Command(BaseCommand):
+    help = "Undo a chunked catalog import or bulk price update from its write journal"
+
+    def add_arguments(self, parser):
+        parser.add_argument("journal_id", nargs="?", help="Journal to roll back")
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="List recent write journals"
+        )
+
+    def handle(self, *args, **options):
+        if options["list"] or not options["journal_id"]:
+            for journal in WriteJournal.objects.all()[:20]:
+                self.stdout.write(
+                    f"{journal.journal_id}  {journal.created_at:%Y-%m-%d %H:%M}  "
+                    f"{journal.source:<15} {journal.status:<12} {journal.rows_written} rows"
+                )
+            return
+
+        journal = WriteJournal.objects.filter(journal_id=options["journal_id"]).first()
+        if journal is None:
+            raise CommandError(f"Journal not found: {options['journal_id']}")
+
+        try:
+            result = rollback_journal(journal)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rolled back: {result['deleted']} tanks deleted, {result['restored']} restored"
+        ))
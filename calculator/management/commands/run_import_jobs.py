@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand
+from calculator.csv_import import UPSERT_BATCH_SIZE
+from calculator.jobs import fail_stale_jobs, run_import_job
+from calculator.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Run queued catalog import jobs (use with IMPORT_JOB_RUNNER='command')"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--job",
+            type=str,
+            default=None,
+            help="Run only this job_id"
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting when the queue is empty"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds between queue polls with --watch"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=UPSERT_BATCH_SIZE,
+            help=f"Rows written per bulk upsert (default {UPSERT_BATCH_SIZE})"
+        )
+
+    def _run(self, job, batch_size):
+        self.stdout.write(f"▶️  Job {job.job_id}: {job.rows_total} rows")
+        job = run_import_job(job.pk, batch_size=batch_size)
+        if job is None:
+            self.stdout.write(self.style.WARNING("⚠️  Already claimed by another runner"))
+            return
+        style = self.style.SUCCESS if job.status == ImportJob.STATUS_SUCCEEDED else self.style.WARNING
+        self.stdout.write(style(
+            f"   {job.status}: {job.created_count} created, {job.updated_count} updated, "
+            f"{job.unchanged_count} unchanged, {job.error_count} errors "
+            f"({job.throughput} rows/s)"
+        ))
+
+    def handle(self, *args, **options):
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(self.style.WARNING(f"⚠️  Marked {stale} stalled job(s) as failed"))
+
+        queued = ImportJob.objects.filter(status=ImportJob.STATUS_QUEUED).order_by('created_at')
+        if options["job"]:
+            queued = queued.filter(job_id=options["job"])
+
+        while True:
+            job = queued.first()
+            if job is not None:
+                self._run(job, options["batch_size"])
+                continue
+            if not options["watch"] or options["job"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write("✅ No queued import jobs")
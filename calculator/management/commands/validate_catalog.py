@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from calculator.models import PendingImport
+from calculator.validation import MAX_FINDINGS_PER_CHECK, validate_catalog, validate_staged_import
+
+
+class Command(BaseCommand):
+    help = "Check the tank catalog (or a staged CSV upload) for inconsistent rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--import-id",
+            help="Check a staged catalog upload instead of the live catalog"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=MAX_FINDINGS_PER_CHECK,
+            help=f"Findings listed per check (default: {MAX_FINDINGS_PER_CHECK})"
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the full report as JSON"
+        )
+        parser.add_argument(
+            "--fail-on-error",
+            action="store_true",
+            help="Exit with an error when any error-level finding exists"
+        )
+
+    def handle(self, *args, **options):
+        if options["import_id"]:
+            pending = PendingImport.objects.filter(
+                import_id=options["import_id"], kind=PendingImport.KIND_CATALOG,
+            ).first()
+            if pending is None:
+                raise CommandError(f"No staged catalog import {options['import_id']}")
+            report = validate_staged_import(pending, limit=options["limit"])
+        else:
+            report = validate_catalog(limit=options["limit"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            self.stdout.write(
+                f"🔍 Checked {report['checked']} tanks in {report['elapsed_ms']} ms: "
+                f"{report['errors']} errors, {report['warnings']} warnings"
+            )
+            for name, count in report["counts"].items():
+                self.stdout.write(f"   {name:<24} {count}")
+            for finding in report["findings"]:
+                models = ", ".join(t["model"] for t in finding["tanks"][:3])
+                icon = "❌" if finding["severity"] == "error" else "⚠️"
+                self.stdout.write(f"{icon} [{finding['check']}] {models}: {finding['message']}")
+            if report["truncated"]:
+                self.stdout.write(f"   (showing at most {options['limit']} findings per check)")
+
+        if options["fail_on_error"] and not report["valid"]:
+            raise CommandError(f"{report['errors']} catalog errors found")
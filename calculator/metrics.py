@@ -0,0 +1,174 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py) puts
+prometheus_client in multiprocess mode: each worker writes its samples
+to mmap'd files in that directory and a scrape merges them, so any
+worker can answer for all of them. Without it (runserver, tests) the
+process' own registry is served.
+
+Recorded here:
+    tankmate_http_request_duration_seconds   latency histogram per URL name
+    tankmate_http_requests_total             requests per URL name and status
+    tankmate_http_response_size_bytes        response size histogram per URL name
+    tankmate_cache_requests_total            cache lookups by cache and hit/miss
+    tankmate_sqlite_lock_wait_seconds        time spent in BEGIN waiting for the write lock
+    tankmate_sqlite_lock_timeouts_total      "database is locked" errors
+    tankmate_nexus_connect_seconds           Nexus connect latency
+    tankmate_nexus_query_seconds             time a Nexus connection was in use
+    tankmate_nexus_failures_total            failed Nexus calls by reason
+    tankmate_single_flight_calls_total       coalesced calls by flight and role
+    tankmate_catalog_tanks                   catalog size per category and status
+
+Cache hit ratios are computed at query time, e.g.
+    sum by (cache) (rate(tankmate_cache_requests_total{result="hit"}[5m]))
+      / sum by (cache) (rate(tankmate_cache_requests_total[5m]))
+"""
+import os
+import time
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.db.models import Count
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import Tank
+
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS    = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LOCK_BUCKETS    = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+NEXUS_BUCKETS   = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Anything else is reported as OTHER, to keep label values bounded
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+CATALOG_METRICS_TIMEOUT = 3600
+
+
+REQUEST_LATENCY = Histogram(
+    'tankmate_http_request_duration_seconds', 'Request latency by URL name',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'tankmate_http_requests', 'Requests by URL name and status code',
+    ['view', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'tankmate_http_response_size_bytes', 'Response body size by URL name (streaming responses excluded)',
+    ['view'], buckets=SIZE_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'tankmate_cache_requests', 'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+SQLITE_LOCK_WAIT = Histogram(
+    'tankmate_sqlite_lock_wait_seconds', 'Time spent in BEGIN waiting for the SQLite write lock',
+    buckets=LOCK_BUCKETS,
+)
+SQLITE_LOCK_TIMEOUTS = Counter(
+    'tankmate_sqlite_lock_timeouts', 'Statements that failed with "database is locked"',
+)
+NEXUS_CONNECT = Histogram(
+    'tankmate_nexus_connect_seconds', 'Nexus connect latency', buckets=NEXUS_BUCKETS,
+)
+NEXUS_QUERY = Histogram(
+    'tankmate_nexus_query_seconds', 'Time a Nexus connection was in use', buckets=NEXUS_BUCKETS,
+)
+NEXUS_FAILURES = Counter(
+    'tankmate_nexus_failures', 'Failed Nexus calls by reason (breaker_open, connect, query)',
+    ['reason'],
+)
+SINGLE_FLIGHT = Counter(
+    'tankmate_single_flight_calls', 'Single-flight calls by flight and role (leader, coalesced, shared)',
+    ['flight', 'role'],
+)
+
+
+def observe_request(view, method, status, duration, response):
+    """Called by RequestTimingMiddleware for every request."""
+    method = method if method in HTTP_METHODS else 'OTHER'
+    REQUEST_LATENCY.labels(view, method).observe(duration)
+    REQUESTS.labels(view, method, str(status)).inc()
+    if not response.streaming:
+        RESPONSE_SIZE.labels(view).observe(len(response.content))
+    if status == 304:
+        cache_lookup('http_etag', True)
+    elif response.has_header('ETag'):
+        cache_lookup('http_etag', False)
+
+
+def cache_lookup(name, hit):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+# ── SQLite ────────────────────────────────────────────────────────────────────
+
+def sqlite_lock_wrapper(execute, sql, params, many, context):
+    """
+    Permanent execute wrapper for SQLite connections (installed by
+    install_sqlite_wrapper). With transaction_mode IMMEDIATE the write
+    lock is taken at BEGIN, so BEGIN's duration is the lock wait.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as e:
+        if 'locked' in str(e):
+            SQLITE_LOCK_TIMEOUTS.inc()
+        raise
+    finally:
+        if sql.startswith('BEGIN'):
+            SQLITE_LOCK_WAIT.observe(time.perf_counter() - started)
+
+
+def install_sqlite_wrapper(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if connection.vendor == 'sqlite' and sqlite_lock_wrapper not in connection.execute_wrappers:
+        # First in the list: connection.execute_wrapper() blocks pop the last one
+        connection.execute_wrappers.insert(0, sqlite_lock_wrapper)
+
+
+# ── Catalog ───────────────────────────────────────────────────────────────────
+
+class CatalogCollector:
+    """tankmate_catalog_tanks, recounted once per catalog version."""
+
+    def _family(self):
+        return GaugeMetricFamily('tankmate_catalog_tanks', 'Tanks in the catalog',
+                                 labels=['category', 'active'])
+
+    def describe(self):
+        yield self._family()
+
+    def collect(self):
+        from .catalog import catalog_version
+        key = f'catalog:{catalog_version()}:metrics:sizes'
+        counts = cache.get(key)
+        if counts is None:
+            counts = list(Tank.objects.order_by().values_list('category', 'is_active')
+                          .annotate(n=Count('id')))
+            cache.set(key, counts, CATALOG_METRICS_TIMEOUT)
+
+        gauge = self._family()
+        for category, active, n in counts:
+            gauge.add_metric([category, 'true' if active else 'false'], n)
+        yield gauge
+
+
+def render():
+    """(body, content_type) for a scrape."""
+    registry = CollectorRegistry()
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.MultiProcessCollector(registry)
+    registry.register(CatalogCollector())
+    body = generate_latest(registry)
+    if not MULTIPROCESS:
+        body = generate_latest(REGISTRY) + body
+    return body, CONTENT_TYPE_LATEST
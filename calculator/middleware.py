@@ -0,0 +1,79 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import (
+    BUDGET_MODE, SAMPLE_RATE, QueryBudgetExceeded, end_request, endpoint_stats,
+    logger, over_budget, start_request,
+)
+from .metrics import observe_request
+
+
+class RequestTimingMiddleware:
+    """
+    Time every request and add a Server-Timing header.
+
+    Sampled requests (REQUEST_TIMING_SAMPLE_RATE) also count and time
+    their ORM queries, Nexus calls and JSON serialization (see
+    calculator.instrumentation). Streaming responses are timed up to
+    their first byte only. Every request is also recorded in the
+    Prometheus metrics (calculator.metrics).
+
+    With QUERY_BUDGET_MODE set, sampled requests that run more queries
+    than their view's QUERY_BUDGETS entry are logged ('warn') or turned
+    into a QueryBudgetExceeded error ('raise').
+
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled      = getattr(settings, 'REQUEST_TIMING_ENABLED', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats, token = start_request(random.random() < SAMPLE_RATE)
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        stats, token = start_request(random.random() < SAMPLE_RATE)
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        total = time.perf_counter() - stats.started
+
+        response['Server-Timing'] = stats.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        budget = over_budget(view, stats.queries) if stats.sampled and BUDGET_MODE else None
+        endpoint_stats.record(view, stats, total, response.status_code, exceeded=budget is not None)
+        observe_request(view, request.method, response.status_code, total, response)
+
+        if budget is not None:
+            message = f"{view} ran {stats.queries} queries, budget is {budget}"
+            if BUDGET_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0003_alter_tank_category_nexusexportlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nexusexportlog',
+            name='tank_hashes',
+            field=models.JSONField(blank=True, help_text='Per-tank leaf hashes at export time, keyed by tank model', null=True),
+        ),
+        migrations.AlterField(
+            model_name='nexusexportlog',
+            name='export_hash',
+            field=models.CharField(blank=True, help_text='Merkle root of tank_hashes (legacy: whole-payload hash)', max_length=64, null=True),
+        ),
+    ]
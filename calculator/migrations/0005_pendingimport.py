@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:35
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0004_nexusexportlog_tank_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('import_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('kind', models.CharField(choices=[('catalog', 'Catalog CSV'), ('prices', 'Bulk price update')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied')], default='pending', max_length=10)),
+                ('created_by', models.CharField(blank=True, max_length=150)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('summary', models.JSONField(default=dict, help_text='Counts shown in the preview')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'pending_import',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingImportRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_num', models.IntegerField()),
+                ('tank_id', models.BigIntegerField(blank=True, null=True)),
+                ('model', models.CharField(max_length=50)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update')], max_length=10)),
+                ('diameter', models.FloatField(blank=True, null=True)),
+                ('height', models.FloatField(blank=True, null=True)),
+                ('net_capacity', models.FloatField(blank=True, null=True)),
+                ('gross_capacity', models.FloatField(blank=True, null=True)),
+                ('ideal_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('nrp', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('pending_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='calculator.pendingimport')),
+            ],
+            options={
+                'db_table': 'pending_import_row',
+                'ordering': ['pending_import', 'row_num'],
+                'indexes': [models.Index(fields=['pending_import', 'tank_id'], name='pending_imp_pending_a3ca50_idx')],
+            },
+        ),
+    ]
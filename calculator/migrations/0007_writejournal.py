@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:38
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WriteJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('source', models.CharField(choices=[('csv_import', 'Admin CSV import'), ('bulk_price', 'Bulk price update'), ('import_command', 'import_tank_csv command')], max_length=20)),
+                ('status', models.CharField(choices=[('open', 'In progress'), ('complete', 'Complete'), ('failed', 'Failed'), ('rolled_back', 'Rolled back')], default='open', max_length=12)),
+                ('created_by', models.CharField(blank=True, max_length=150)),
+                ('batches', models.IntegerField(default=0)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('rolled_back_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'write_journal',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='journal',
+            field=models.ForeignKey(blank=True, help_text='Undo record for the batches this job committed', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='calculator.writejournal'),
+        ),
+        migrations.CreateModel(
+            name='WriteJournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update')], max_length=10)),
+                ('tank_id', models.BigIntegerField(blank=True, null=True)),
+                ('model', models.CharField(max_length=50)),
+                ('diameter', models.FloatField(blank=True, null=True)),
+                ('height', models.FloatField(blank=True, null=True)),
+                ('net_capacity', models.FloatField(blank=True, null=True)),
+                ('gross_capacity', models.FloatField(blank=True, null=True)),
+                ('ideal_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('nrp', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='calculator.writejournal')),
+            ],
+            options={
+                'db_table': 'write_journal_entry',
+                'ordering': ['journal', 'id'],
+            },
+        ),
+    ]
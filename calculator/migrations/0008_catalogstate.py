@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0007_writejournal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+                ('shadow_file', models.CharField(blank=True, max_length=255)),
+                ('shadow_loaded_at', models.DateTimeField(blank=True, null=True)),
+                ('shadow_base', models.JSONField(blank=True, help_text='Live catalog fingerprint when the shadow was loaded', null=True)),
+                ('shadow_report', models.JSONField(blank=True, null=True)),
+                ('swapped_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog state',
+                'db_table': 'catalog_state',
+            },
+        ),
+    ]
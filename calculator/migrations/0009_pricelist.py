@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0008_catalogstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('effective_from', models.DateTimeField(db_index=True)),
+                ('created_by', models.CharField(blank=True, max_length=150)),
+                ('source_file', models.CharField(blank=True, max_length=255)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('folded_at', models.DateTimeField(blank=True, db_index=True, help_text='When the prices were copied into Tank', null=True)),
+            ],
+            options={
+                'db_table': 'price_list',
+                'ordering': ['-effective_from'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceListEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ideal_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('nrp', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('price_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='calculator.pricelist')),
+                ('tank', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='price_entries', to='calculator.tank')),
+            ],
+            options={
+                'db_table': 'price_list_entry',
+                'indexes': [models.Index(fields=['tank', 'price_list'], name='price_list__tank_id_dd616c_idx')],
+                'unique_together': {('price_list', 'tank')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0009_pricelist'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='writejournal',
+            name='source',
+            field=models.CharField(choices=[('csv_import', 'Admin CSV import'), ('bulk_price', 'Bulk price update'), ('import_command', 'import_tank_csv command'), ('reprice', 'Bulk repricing')], max_length=20),
+        ),
+    ]
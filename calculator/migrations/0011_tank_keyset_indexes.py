@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0010_writejournal_reprice_source'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tank',
+            index=models.Index(fields=['-updated_at', '-id'], name='calculator__updated_12bfa7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tank',
+            index=models.Index(fields=['category', '-updated_at', '-id'], name='calculator__categor_f2bf96_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.utils import timezone
 
@@ -82,6 +83,12 @@ class Tank(models.Model):
             models.Index(fields=['category', 'net_capacity']),
             models.Index(fields=['category', 'ideal_price']),
             models.Index(fields=['diameter', 'height']),
+            # Admin tank list: keyset pagination on (updated_at, id), with or
+            # without a category. The status filter is applied while walking
+            # the index (SQLite compares booleans as a bare column, which
+            # can't be used as an index key).
+            models.Index(fields=['-updated_at', '-id']),
+            models.Index(fields=['category', '-updated_at', '-id']),
         ]
         verbose_name = "Tank"
         verbose_name_plural = "Tanks"
@@ -214,7 +221,10 @@ class NexusExportLog(models.Model):
     tank_count = models.IntegerField(default=0)
     payload = models.JSONField()
     
-    export_hash = models.CharField(max_length=64, null=True, blank=True)
+    export_hash = models.CharField(max_length=64, null=True, blank=True,
+                                   help_text="Merkle root of tank_hashes (legacy: whole-payload hash)")
+    tank_hashes = models.JSONField(null=True, blank=True,
+                                   help_text="Per-tank leaf hashes at export time, keyed by tank model")
     
     # 🔐 Lock System
     is_modified = models.BooleanField(default=False, db_index=True, 
@@ -262,4 +272,339 @@ class NexusExportLog(models.Model):
     
     def can_reexport(self):
         """Check if this collection can be exported again from TankMate"""
-        return not self.is_modified
\ No newline at end of file
+        return not self.is_modified
+
+class PendingImport(models.Model):
+    """
+    A catalog CSV upload or bulk price change waiting for admin confirmation.
+
+    The staged rows live in PendingImportRow; the admin's session only
+    carries the import_id between preview and confirm.
+    """
+
+    KIND_CATALOG = 'catalog'
+    KIND_PRICES = 'prices'
+    KIND_CHOICES = [
+        (KIND_CATALOG, 'Catalog CSV'),
+        (KIND_PRICES, 'Bulk price update'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_APPLIED = 'applied'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_APPLIED, 'Applied'),
+    ]
+
+    import_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_by = models.CharField(max_length=150, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    summary = models.JSONField(default=dict, help_text="Counts shown in the preview")
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'pending_import'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.import_id} ({self.status})"
+
+
+class PendingImportRow(models.Model):
+    """
+    One staged tank change. Only new values are kept; price columns left
+    NULL mean "keep the current price".
+
+    tank_id is a plain column rather than a foreign key so staged rows
+    never hold references into the live catalog table.
+    """
+
+    ACTION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+    ]
+
+    pending_import = models.ForeignKey(PendingImport, on_delete=models.CASCADE, related_name='rows')
+    row_num = models.IntegerField()
+    tank_id = models.BigIntegerField(null=True, blank=True)
+    model = models.CharField(max_length=50)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+
+    diameter = models.FloatField(null=True, blank=True)
+    height = models.FloatField(null=True, blank=True)
+    net_capacity = models.FloatField(null=True, blank=True)
+    gross_capacity = models.FloatField(null=True, blank=True)
+    ideal_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    nrp = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        db_table = 'pending_import_row'
+        ordering = ['pending_import', 'row_num']
+        indexes = [
+            models.Index(fields=['pending_import', 'tank_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model}"
+
+
+class ImportJob(models.Model):
+    """
+    A confirmed import running outside the HTTP request.
+
+    The runner (worker thread or the run_import_jobs command) updates the
+    progress counters after every committed batch; the upload page polls
+    them. Setting cancel_requested stops the job after the current batch.
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = {STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED}
+
+    # Row-level errors kept on the job (the counter keeps counting past it)
+    MAX_STORED_ERRORS = 200
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    pending_import = models.ForeignKey(PendingImport, on_delete=models.SET_NULL,
+                                       null=True, blank=True, related_name='jobs')
+    journal = models.ForeignKey('WriteJournal', on_delete=models.SET_NULL,
+                                null=True, blank=True, related_name='jobs',
+                                help_text="Undo record for the batches this job committed")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=STATUS_QUEUED, db_index=True)
+    created_by = models.CharField(max_length=150, blank=True)
+
+    # Progress
+    rows_total = models.IntegerField(default=0)
+    rows_processed = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    unchanged_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+
+    cancel_requested = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'import_job'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import job {self.job_id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    @property
+    def throughput(self):
+        """Rows processed per second so far"""
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        seconds = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / seconds, 1) if seconds > 0 else 0
+
+    def to_dict(self):
+        return {
+            'job_id': str(self.job_id),
+            'status': self.status,
+            'finished': self.is_finished,
+            'rows_total': self.rows_total,
+            'rows_processed': self.rows_processed,
+            'percent': round(self.rows_processed * 100 / self.rows_total, 1) if self.rows_total else 0,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'unchanged': self.unchanged_count,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'throughput': self.throughput,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'journal_id': str(self.journal.journal_id) if self.journal_id else None,
+        }
+
+
+class WriteJournal(models.Model):
+    """
+    Compensation record for a bulk catalog write.
+
+    Chunked writes commit batch by batch, so a failed or unwanted import
+    can't simply be rolled back by the database. Every batch records the
+    previous state of the rows it touches (in the same transaction) as
+    WriteJournalEntry rows, which rollback_journal() replays in reverse.
+    """
+
+    SOURCE_CHOICES = [
+        ('csv_import', 'Admin CSV import'),
+        ('bulk_price', 'Bulk price update'),
+        ('import_command', 'import_tank_csv command'),
+        ('reprice', 'Bulk repricing'),
+    ]
+
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_ROLLED_BACK = 'rolled_back'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'In progress'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_ROLLED_BACK, 'Rolled back'),
+    ]
+
+    journal_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_by = models.CharField(max_length=150, blank=True)
+    batches = models.IntegerField(default=0)
+    rows_written = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    rolled_back_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'write_journal'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_source_display()} {self.journal_id} ({self.status})"
+
+
+class WriteJournalEntry(models.Model):
+    """
+    Previous state of one tank touched by a journaled write.
+
+    action='create' → the tank did not exist before (undo deletes it).
+    action='update' → the old values are stored; columns the write did
+    not touch are left NULL.
+    """
+
+    journal = models.ForeignKey(WriteJournal, on_delete=models.CASCADE, related_name='entries')
+    action = models.CharField(max_length=10, choices=[('create', 'Create'), ('update', 'Update')])
+    tank_id = models.BigIntegerField(null=True, blank=True)
+    model = models.CharField(max_length=50)
+
+    diameter = models.FloatField(null=True, blank=True)
+    height = models.FloatField(null=True, blank=True)
+    net_capacity = models.FloatField(null=True, blank=True)
+    gross_capacity = models.FloatField(null=True, blank=True)
+    ideal_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    nrp = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        db_table = 'write_journal_entry'
+        ordering = ['journal', 'id']
+
+    def __str__(self):
+        return f"{self.action} {self.model}"
+
+
+class CatalogState(models.Model):
+    """
+    Single row describing the live tank catalog.
+
+    `version` changes whenever the catalog is replaced as a whole, so
+    anything cached per catalog can key on it and is invalidated by one
+    increment. The shadow_* fields describe a staged catalog waiting to
+    be swapped in (see calculator.catalog_swap).
+    """
+
+    version = models.PositiveIntegerField(default=1)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    shadow_file = models.CharField(max_length=255, blank=True)
+    shadow_loaded_at = models.DateTimeField(null=True, blank=True)
+    shadow_base = models.JSONField(null=True, blank=True,
+                                   help_text="Live catalog fingerprint when the shadow was loaded")
+    shadow_report = models.JSONField(null=True, blank=True)
+
+    swapped_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'catalog_state'
+        verbose_name = "Catalog state"
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+    @classmethod
+    def load(cls):
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+
+class PriceList(models.Model):
+    """
+    A price revision that takes effect at `effective_from`.
+
+    Entries override Tank.ideal_price / Tank.nrp for the tanks they list
+    once the list is effective; nothing is written to Tank at activation.
+    Folding (calculator.pricing.fold_price_lists) copies the prices into
+    Tank and retires the list, in the background or just before the next
+    direct price write.
+    """
+
+    name = models.CharField(max_length=150)
+    effective_from = models.DateTimeField(db_index=True)
+    created_by = models.CharField(max_length=150, blank=True)
+    source_file = models.CharField(max_length=255, blank=True)
+    entry_count = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    folded_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                     help_text="When the prices were copied into Tank")
+
+    class Meta:
+        db_table = 'price_list'
+        ordering = ['-effective_from']
+
+    def __str__(self):
+        return f"{self.name} (from {self.effective_from:%Y-%m-%d %H:%M})"
+
+    @property
+    def status(self):
+        if self.folded_at:
+            return 'folded'
+        return 'active' if self.effective_from <= timezone.now() else 'scheduled'
+
+
+class PriceListEntry(models.Model):
+    """New prices for one tank in a price list. NULL keeps the current price."""
+
+    price_list = models.ForeignKey(PriceList, on_delete=models.CASCADE, related_name='entries')
+    tank = models.ForeignKey(Tank, on_delete=models.DO_NOTHING, db_constraint=False,
+                             related_name='price_entries')
+    ideal_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    nrp = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        db_table = 'price_list_entry'
+        unique_together = [('price_list', 'tank')]
+        indexes = [
+            models.Index(fields=['tank', 'price_list']),
+        ]
+
+    def __str__(self):
+        return f"{self.price_list_id}: {self.tank_id}"
@@ -0,0 +1,443 @@
+"""
+Nexus database access.
+
+Every connection to the external Nexus Postgres goes through this module,
+so one circuit breaker protects the web workers when Nexus is down:
+after a few consecutive connection failures we stop dialling out and
+fail fast instead of blocking each request for the full connect_timeout.
+
+Both paths use psycopg 3. Sync code (WSGI, background threads,
+management commands) opens a connection per nexus_cursor(). Async views
+use async_nexus_cursor(), which borrows connections from a pool owned by
+the ASGI worker's event loop, so a worker can wait on many Nexus queries
+at once without a thread per request. The pool is opened and closed by
+the ASGI lifespan (tankmate.asgi); on any other loop, e.g. one made by
+async_to_sync or the test client, each use opens its own connection.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from .instrumentation import record_nexus
+from .metrics import NEXUS_CONNECT, NEXUS_FAILURES, NEXUS_QUERY, cache_lookup
+from .singleflight import SingleFlight
+
+
+class NexusUnavailable(Exception):
+    """Raised instead of connecting while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    CLOSED    – calls go through; consecutive failures are counted.
+    OPEN      – calls are rejected immediately until reset_timeout passes.
+    HALF_OPEN – one probe call is let through; success closes the
+                circuit, failure opens it again for another reset_timeout.
+    """
+
+    CLOSED    = 'closed'
+    OPEN      = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout     = reset_timeout
+        self._lock             = threading.Lock()
+        self._state            = self.CLOSED
+        self._failures         = 0
+        self._opened_at        = 0.0
+        self._probe_in_flight  = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._reset_elapsed():
+                return self.HALF_OPEN
+            return self._state
+
+    def _reset_elapsed(self):
+        return time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted right now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._reset_elapsed():
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state           = self.CLOSED
+            self._failures        = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures       += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state     = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """
+        End a call that says nothing about the remote side (e.g. it was
+        cancelled): frees the half-open probe so the next call can probe.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+
+breaker = CircuitBreaker(
+    failure_threshold = getattr(settings, 'NEXUS_BREAKER_FAILURE_THRESHOLD', 3),
+    reset_timeout     = getattr(settings, 'NEXUS_BREAKER_RESET_TIMEOUT', 30),
+)
+
+# Identical Nexus reads in flight at the same time share one query,
+# across workers too with SINGLE_FLIGHT_SHARED (see calculator.singleflight)
+nexus_flight = SingleFlight('nexus', shared=True)
+
+
+def _is_connection_error(exc):
+    """Only connectivity problems should trip the breaker, not bad SQL."""
+    try:
+        import psycopg
+    except ImportError:
+        return False
+    return isinstance(exc, (psycopg.OperationalError, psycopg.InterfaceError))
+
+
+def _connect_params():
+    return {
+        'host':     os.environ.get('NEXUS_DB_HOST',     'localhost'),
+        'dbname':   os.environ.get('NEXUS_DB_NAME',     'STLPL'),
+        'user':     os.environ.get('NEXUS_DB_USER',     'server'),
+        'password': os.environ.get('NEXUS_DB_PASSWORD', ''),
+        'port':     int(os.environ.get('NEXUS_DB_PORT', 5432)),
+        'connect_timeout': 8,
+    }
+
+
+def _reject_if_open():
+    if not breaker.allow():
+        NEXUS_FAILURES.labels('breaker_open').inc()
+        raise NexusUnavailable('Nexus is temporarily unavailable')
+
+
+def _connect_failed(exc):
+    """
+    Report a connect attempt that didn't return a connection. Called for
+    BaseException too: a cancelled half-open probe must not hold the
+    probe slot forever.
+    """
+    if not isinstance(exc, Exception):
+        breaker.release()
+        return
+    NEXUS_FAILURES.labels('connect').inc()
+    if _is_connection_error(exc):
+        breaker.record_failure()
+    else:
+        breaker.release()
+
+
+def _query_failed(exc):
+    """A block raised after connecting: Nexus answered unless it's a connection error."""
+    if isinstance(exc, Exception):
+        NEXUS_FAILURES.labels('query').inc()
+    if _is_connection_error(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+# ── Nexus DB connection ───────────────────────────────────────────────────────
+def get_nexus_connection():
+    import psycopg
+    _reject_if_open()
+    started = time.perf_counter()
+    try:
+        conn = psycopg.connect(**_connect_params())
+    except BaseException as e:
+        _connect_failed(e)
+        raise
+    NEXUS_CONNECT.observe(time.perf_counter() - started)
+    return conn
+
+
+@contextmanager
+def nexus_cursor(commit=False):
+    """
+    Open a Nexus connection through the circuit breaker and yield a cursor.
+
+    Commits on success when commit=True, always closes the connection,
+    and reports the outcome to the breaker. The time spent, connecting
+    included, is recorded as one Nexus call of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        conn = get_nexus_connection()
+        connected = time.perf_counter()
+        try:
+            cur = conn.cursor()
+            try:
+                yield cur
+                if commit:
+                    conn.commit()
+            finally:
+                cur.close()
+        except BaseException as e:
+            _query_failed(e)
+            raise
+        else:
+            breaker.record_success()
+        finally:
+            conn.close()
+            NEXUS_QUERY.observe(time.perf_counter() - connected)
+    finally:
+        record_nexus(time.perf_counter() - started)
+
+
+# ── Async access (ASGI) ───────────────────────────────────────────────────────
+# A psycopg 3 pool belongs to the event loop that opened it. Only the
+# server's loop lives long enough to own one: short-lived loops would
+# each leave an open pool behind.
+_async_pool = None
+_async_pool_loop = None
+
+
+async def open_async_pool():
+    """Open the Nexus pool for the running loop (ASGI lifespan startup)."""
+    global _async_pool, _async_pool_loop
+    from psycopg_pool import AsyncConnectionPool
+    await close_async_pool()
+    pool = AsyncConnectionPool(
+        kwargs   = dict(_connect_params(), autocommit=True),
+        min_size = getattr(settings, 'NEXUS_POOL_MIN_SIZE', 1),
+        max_size = getattr(settings, 'NEXUS_POOL_MAX_SIZE', 10),
+        timeout  = getattr(settings, 'NEXUS_POOL_TIMEOUT', 8),
+        open     = False,
+    )
+    await pool.open(wait=False)
+    _async_pool, _async_pool_loop = pool, asyncio.get_running_loop()
+    return pool
+
+
+async def close_async_pool():
+    """Close the Nexus pool (ASGI lifespan shutdown)."""
+    global _async_pool, _async_pool_loop
+    pool, _async_pool, _async_pool_loop = _async_pool, None, None
+    if pool is not None:
+        await pool.close()
+
+
+def get_async_pool():
+    """The Nexus pool if the running loop owns it, else None."""
+    if _async_pool is not None and _async_pool_loop is asyncio.get_running_loop():
+        return _async_pool
+    return None
+
+
+async def _aconnect():
+    import psycopg
+    return await psycopg.AsyncConnection.connect(**_connect_params(), autocommit=True)
+
+
+@asynccontextmanager
+async def async_nexus_cursor(commit=False):
+    """
+    nexus_cursor() for async views: a cursor on a pooled psycopg 3
+    connection, behind the same circuit breaker and recorded the same
+    way. Statements autocommit; commit=True runs the block in one
+    transaction. The connection goes back to the pool afterwards, or is
+    closed when the running loop has no pool.
+    """
+    started = time.perf_counter()
+    try:
+        _reject_if_open()
+        pool = get_async_pool()
+        try:
+            conn = await (pool.getconn() if pool is not None else _aconnect())
+        except BaseException as e:
+            _connect_failed(e)
+            raise
+        connected = time.perf_counter()
+        NEXUS_CONNECT.observe(connected - started)
+        try:
+            async with conn.cursor() as cur:
+                if commit:
+                    async with conn.transaction():
+                        yield cur
+                else:
+                    yield cur
+        except BaseException as e:
+            _query_failed(e)
+            raise
+        else:
+            breaker.record_success()
+        finally:
+            if pool is not None:
+                await pool.putconn(conn)
+            else:
+                await conn.close()
+            NEXUS_QUERY.observe(time.perf_counter() - connected)
+    finally:
+        record_nexus(time.perf_counter() - started)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SALESPERSON DIRECTORY
+# ══════════════════════════════════════════════════════════════════════════════
+
+class SalespersonDirectory:
+    """
+    In-memory copy of the distinct salesperson names in nexus.pricing_logs.
+
+    The DISTINCT scan over pricing_logs only runs on first use and then at
+    most once per TTL, in a background thread, while requests keep being
+    served from memory (stale-while-revalidate). A failed refresh is
+    retried after retry_after seconds. Names seen in new exports are
+    merged in immediately via add().
+    """
+
+    def __init__(self, ttl=300, retry_after=30):
+        self.ttl          = ttl
+        self.retry_after  = retry_after
+        self._lock        = threading.Lock()
+        self._names       = None
+        self._etag        = None
+        self._refresh_at  = 0.0
+        self._refreshing  = False
+        self._last_failed = False
+
+    def _set_names(self, names):
+        names = sorted(set(names))
+        digest = hashlib.md5('\n'.join(names).encode('utf-8')).hexdigest()
+        self._names = names
+        self._etag  = f'"{digest}"'
+
+    _SQL = """
+        SELECT DISTINCT sales_person
+        FROM   nexus.pricing_logs
+        WHERE  sales_person IS NOT NULL
+          AND  sales_person <> ''
+    """
+
+    def _fetch(self):
+        with nexus_cursor() as cur:
+            cur.execute(self._SQL)
+            return [r[0] for r in cur.fetchall()]
+
+    async def _afetch(self):
+        async with async_nexus_cursor() as cur:
+            await cur.execute(self._SQL)
+            return [r[0] for r in await cur.fetchall()]
+
+    def _store(self, names):
+        with self._lock:
+            if names is None:
+                # Back off, or every request while Nexus is down starts a refresh
+                self._refresh_at  = time.monotonic() + self.retry_after
+                self._last_failed = True
+            else:
+                self._set_names(names)
+                self._refresh_at  = time.monotonic() + self.ttl
+                self._last_failed = False
+            self._refreshing = False
+
+    def refresh(self):
+        """Reload from Nexus synchronously. Raises if Nexus is unavailable."""
+        try:
+            names = nexus_flight.do('directory', self._fetch)
+        except Exception:
+            self._store(None)
+            raise
+        self._store(names)
+
+    async def arefresh(self):
+        """refresh() for async callers."""
+        try:
+            names = await nexus_flight.ado('directory', self._afetch)
+        except Exception:
+            self._store(None)
+            raise
+        self._store(names)
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+
+    def _claim_refresh(self):
+        """(loaded, start_refresh); claims the background refresh if due."""
+        with self._lock:
+            loaded  = self._names is not None
+            expired = time.monotonic() >= self._refresh_at
+            start_refresh = loaded and expired and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        cache_lookup('nexus_users', loaded)
+        return loaded, start_refresh
+
+    def _current(self):
+        with self._lock:
+            etag = self._etag
+            if self._last_failed:
+                # Clients revalidating fresh names must learn they went stale
+                etag = f'{etag[:-1]}-stale"'
+            return list(self._names), etag, self._last_failed
+
+    def get(self):
+        """
+        Return (names, etag, stale).
+
+        Loads synchronously the first time; afterwards an expired entry
+        is returned as-is while a single background refresh runs.
+        """
+        loaded, start_refresh = self._claim_refresh()
+        if not loaded:
+            self.refresh()
+        elif start_refresh:
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+        return self._current()
+
+    async def aget(self):
+        """get() for async views; the background refresh still uses a thread."""
+        loaded, start_refresh = self._claim_refresh()
+        if not loaded:
+            await self.arefresh()
+        elif start_refresh:
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+        return self._current()
+
+    def add(self, name):
+        """Merge a salesperson seen in a new export without rescanning Nexus."""
+        if not name:
+            return
+        with self._lock:
+            if self._names is not None and name not in self._names:
+                self._set_names(self._names + [name])
+
+    def clear(self):
+        with self._lock:
+            self._names      = None
+            self._etag       = None
+            self._refresh_at = 0.0
+
+
+salesperson_directory = SalespersonDirectory(
+    ttl         = getattr(settings, 'NEXUS_USERS_TTL', 300),
+    retry_after = getattr(settings, 'NEXUS_USERS_RETRY_AFTER', 30),
+)
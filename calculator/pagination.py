@@ -0,0 +1,85 @@
+"""
+Keyset pagination for the admin tank list.
+
+Pages are addressed by the (updated_at, id) of the last row shown instead
+of an OFFSET, so page 400 costs the same index range scan as page 1.
+"""
+import base64
+import math
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+ORDERING = ('-updated_at', '-id')
+
+
+def encode_cursor(tank):
+    raw = f"{tank.updated_at.isoformat()}|{tank.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (updated_at, id), or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        stamp, tank_id = raw.rsplit('|', 1)
+        updated_at = parse_datetime(stamp)
+        return (updated_at, int(tank_id)) if updated_at else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors needed to move around it."""
+
+    def __init__(self, object_list, has_next, has_previous, number, count, per_page):
+        self.object_list  = object_list
+        self.has_next     = has_next
+        self.has_previous = has_previous
+        self.number       = number
+        self.count        = count
+        self.num_pages    = max(1, math.ceil(count / per_page)) if count is not None else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous else None
+
+
+def keyset_page(queryset, after=None, before=None, per_page=25, number=1, count=None):
+    """
+    Fetch the page following cursor `after` or preceding cursor `before`
+    (first page if neither), newest updated_at first.
+    One query of per_page + 1 rows; the extra row tells if there is more.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        updated_at, tank_id = before
+        rows = list(queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=tank_id)
+        ).order_by('updated_at', 'id')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, True, has_previous, max(1, number), count, per_page)
+
+    if after:
+        updated_at, tank_id = after
+        queryset = queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=tank_id)
+        )
+    rows = list(queryset.order_by(*ORDERING)[:per_page + 1])
+    return KeysetPage(rows[:per_page], len(rows) > per_page, bool(after),
+                      number if after else 1, count, per_page)
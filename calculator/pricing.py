@@ -0,0 +1,167 @@
+"""
+Effective-dated price lists.
+
+Scheduling a price revision creates a PriceList with one PriceListEntry
+per tank. When effective_from passes, the list takes effect by itself:
+reads resolve the effective lists with one indexed query and overlay
+their entries on Tank prices, so activation costs nothing and causes
+no write storm on Tank.
+
+fold_price_lists() later copies effective prices into Tank in
+committed batches and marks the lists folded; this changes nothing
+that readers see. Every direct price write (admin edits, bulk price
+updates, catalog imports, reprices) folds first, so the write lands on
+top of the lists instead of staying hidden behind an older one.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .chunked_writes import WRITE_TIME_BUDGET, WriteBudget
+from .csv_import import UPSERT_BATCH_SIZE
+from .models import PendingImportRow, PriceList, PriceListEntry, Tank
+
+
+def _effective_lists(now):
+    return (PriceList.objects
+            .filter(effective_from__lte=now or timezone.now(), folded_at__isnull=True)
+            .order_by('-effective_from', '-id')
+            .values_list('id', flat=True))
+
+
+def effective_price_list_ids(now=None):
+    """Ids of effective, unfolded price lists, newest first."""
+    return list(_effective_lists(now))
+
+
+async def aeffective_price_list_ids(now=None):
+    return [pk async for pk in _effective_lists(now)]
+
+
+def _entry_price(list_ids, field):
+    """Newest effective entry's value of `field` for the outer tank."""
+    entries = PriceListEntry.objects.filter(
+        tank_id=OuterRef('pk'), **{f'{field}__isnull': False},
+    )
+    if len(list_ids) == 1:
+        entries = entries.filter(price_list_id=list_ids[0])
+    else:
+        entries = (entries.filter(price_list_id__in=list_ids)
+                          .order_by('-price_list__effective_from', '-price_list_id'))
+    return Subquery(entries.values(field)[:1])
+
+
+def with_effective_prices(queryset, now=None):
+    """
+    Annotate effective_ideal_price / effective_nrp: the price from the
+    newest effective list that covers the tank, else the Tank's own.
+    """
+    return _annotate_effective_prices(queryset, effective_price_list_ids(now))
+
+
+async def awith_effective_prices(queryset, now=None):
+    """with_effective_prices() for async views."""
+    return _annotate_effective_prices(queryset, await aeffective_price_list_ids(now))
+
+
+def _annotate_effective_prices(queryset, list_ids):
+    if not list_ids:
+        return queryset.annotate(effective_ideal_price=F('ideal_price'), effective_nrp=F('nrp'))
+    return queryset.annotate(
+        effective_ideal_price=Coalesce(_entry_price(list_ids, 'ideal_price'), F('ideal_price')),
+        effective_nrp=Coalesce(_entry_price(list_ids, 'nrp'), F('nrp')),
+    )
+
+
+def effective_prices(tank):
+    """(ideal_price, nrp) for a tank loaded through with_effective_prices()."""
+    return (
+        getattr(tank, 'effective_ideal_price', tank.ideal_price),
+        getattr(tank, 'effective_nrp', tank.nrp),
+    )
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SCHEDULING
+# ══════════════════════════════════════════════════════════════════════════════
+
+def schedule_price_import(pending, effective_from, name='', created_by='',
+                          batch_size=UPSERT_BATCH_SIZE):
+    """
+    Turn staged price rows into a PriceList effective at effective_from.
+    A tank staged twice keeps its last row. Returns the PriceList.
+    """
+    with transaction.atomic():
+        price_list = PriceList.objects.create(
+            name=name or f"Price list {effective_from:%Y-%m-%d %H:%M}",
+            effective_from=effective_from,
+            created_by=created_by,
+            source_file=pending.file_name,
+        )
+        last_id = 0
+        while True:
+            rows = list(PendingImportRow.objects
+                        .filter(pending_import=pending, id__gt=last_id)
+                        .order_by('id')
+                        .values_list('id', 'tank_id', 'ideal_price', 'nrp')[:batch_size])
+            if not rows:
+                break
+            PriceListEntry.objects.bulk_create(
+                [PriceListEntry(price_list=price_list, tank_id=tank_id,
+                                ideal_price=ideal_price, nrp=nrp)
+                 for _, tank_id, ideal_price, nrp in rows],
+                update_conflicts=True,
+                unique_fields=['price_list', 'tank'],
+                update_fields=['ideal_price', 'nrp'],
+            )
+            last_id = rows[-1][0]
+
+        price_list.entry_count = price_list.entries.count()
+        price_list.save(update_fields=['entry_count'])
+        pending.status = pending.STATUS_APPLIED
+        pending.applied_at = timezone.now()
+        pending.save(update_fields=['status', 'applied_at'])
+        pending.rows.all().delete()
+    return price_list
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FOLDING
+# ══════════════════════════════════════════════════════════════════════════════
+
+def fold_price_lists(now=None, batch_size=UPSERT_BATCH_SIZE, time_budget=WRITE_TIME_BUDGET):
+    """
+    Copy the prices of effective lists into Tank, oldest list first, in
+    committed batches, then mark each list folded.
+    Returns [(price_list, tanks_updated)].
+    """
+    now = now or timezone.now()
+    folded = []
+    for price_list in (PriceList.objects
+                       .filter(effective_from__lte=now, folded_at__isnull=True)
+                       .order_by('effective_from', 'id')):
+        entry = PriceListEntry.objects.filter(price_list=price_list, tank_id=OuterRef('pk'))
+        budget = WriteBudget(batch_size, time_budget)
+        updated = 0
+        last_id = 0
+        while True:
+            rows = list(price_list.entries.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'tank_id')[:budget.size])
+            if not rows:
+                break
+            started = time.perf_counter()
+            updated += Tank.objects.filter(id__in=[tank_id for _, tank_id in rows]).update(
+                ideal_price=Coalesce(Subquery(entry.values('ideal_price')[:1]), F('ideal_price')),
+                nrp=Coalesce(Subquery(entry.values('nrp')[:1]), F('nrp')),
+                updated_at=timezone.now(),
+            )
+            budget.record(len(rows), time.perf_counter() - started)
+            last_id = rows[-1][0]
+
+        price_list.folded_at = timezone.now()
+        price_list.save(update_fields=['folded_at'])
+        folded.append((price_list, updated))
+    return folded
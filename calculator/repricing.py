@@ -0,0 +1,158 @@
+"""
+Declarative bulk repricing.
+
+A repricing rule such as "+4.5% on all active RCT", "NRP = 0.92 × ideal
+for SST" or "round ideal price to the nearest ₹500" becomes an SQL
+expression over each row's current prices. Previews run as one aggregate
+query. Applying the rule is one UPDATE … SET price = <expression>, so
+the number of tanks it touches doesn't matter. Whatever the rule and its
+rounding, NRP never ends up above the ideal price: a new NRP is capped
+at the ideal price and a new ideal price is kept at or above the NRP.
+
+Rule format (JSON):
+    {"field": "ideal_price" | "nrp",
+     "operation": "percent" | "ratio" | "round",
+     "value": 4.5,               # percent change, or ratio factor
+     "source": "ideal_price",    # ratio: price the factor applies to
+     "round_to": 500}            # optional for percent/ratio, required for round
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least, Round
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .chunked_writes import close_journal, journal_prices, start_journal
+from .models import WriteJournal
+from .pricing import effective_price_list_ids, fold_price_lists, with_effective_prices
+
+
+PRICE_FIELDS = ('ideal_price', 'nrp')
+OPERATIONS = ('percent', 'ratio', 'round')
+
+PRICE_OUTPUT = DecimalField(max_digits=12, decimal_places=2)
+
+PREVIEW_SAMPLE_SIZE = 10
+
+
+def _decimal(value, name):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number")
+
+
+def parse_rule(data):
+    """Validate a repricing rule; raises ValueError with a readable message."""
+    field = data.get('field')
+    operation = data.get('operation')
+    if field not in PRICE_FIELDS:
+        raise ValueError(f"'field' must be one of: {', '.join(PRICE_FIELDS)}")
+    if operation not in OPERATIONS:
+        raise ValueError(f"'operation' must be one of: {', '.join(OPERATIONS)}")
+
+    rule = {'field': field, 'operation': operation, 'value': None,
+            'source': field, 'round_to': None}
+
+    if operation in ('percent', 'ratio'):
+        if data.get('value') in (None, ''):
+            raise ValueError("'value' is required")
+        rule['value'] = _decimal(data['value'], 'value')
+    if operation == 'percent' and rule['value'] <= -100:
+        raise ValueError('A percentage change must be above -100')
+    if operation == 'ratio':
+        rule['source'] = data.get('source', 'ideal_price')
+        if rule['source'] not in PRICE_FIELDS:
+            raise ValueError(f"'source' must be one of: {', '.join(PRICE_FIELDS)}")
+        if rule['value'] <= 0:
+            raise ValueError('A ratio must be positive')
+
+    if data.get('round_to') not in (None, ''):
+        rule['round_to'] = _decimal(data['round_to'], 'round_to')
+        if rule['round_to'] <= 0:
+            raise ValueError("'round_to' must be positive")
+    elif operation == 'round':
+        raise ValueError("'round_to' is required")
+
+    return rule
+
+
+def price_expression(rule, prefix=''):
+    """
+    The new price as an expression over the row's prices. prefix selects
+    annotated prices (e.g. 'effective_') instead of the stored columns.
+    """
+    if rule['operation'] == 'percent':
+        expression = F(prefix + rule['field']) * Value(1 + rule['value'] / 100)
+    elif rule['operation'] == 'ratio':
+        expression = F(prefix + rule['source']) * Value(rule['value'])
+    else:
+        expression = F(prefix + rule['field'])
+
+    if rule['round_to']:
+        step = Value(rule['round_to'])
+        expression = Round(expression / step, output_field=PRICE_OUTPUT) * step
+    expression = Round(expression, 2, output_field=PRICE_OUTPUT)
+
+    # Rounding can push NRP past the ideal price (or ideal below NRP)
+    if rule['field'] == 'nrp':
+        return Least(expression, F(prefix + 'ideal_price'), output_field=PRICE_OUTPUT)
+    return Greatest(expression, F(prefix + 'nrp'), output_field=PRICE_OUTPUT)
+
+
+def preview_reprice(queryset, rule, sample_size=PREVIEW_SAMPLE_SIZE):
+    """
+    Counts and deltas for applying a rule to queryset, computed against
+    the prices customers currently see (effective price lists included).
+    """
+    queryset = with_effective_prices(queryset.order_by())
+    old = F(f"effective_{rule['field']}")
+    new = price_expression(rule, prefix='effective_')
+
+    stats = queryset.aggregate(
+        tanks=Count('id'),
+        unchanged=Count('id', filter=Exact(new, old)),
+        old_total=Sum(old),
+        new_total=Sum(new, output_field=PRICE_OUTPUT),
+        min_delta=Min(new - old, output_field=PRICE_OUTPUT),
+        max_delta=Max(new - old, output_field=PRICE_OUTPUT),
+    )
+    stats['changed'] = stats['tanks'] - stats['unchanged']
+    stats['total_delta'] = (stats['new_total'] or 0) - (stats['old_total'] or 0)
+
+    sample = queryset.annotate(new_price=new).order_by('category', 'model')[:sample_size]
+    stats['sample'] = [
+        {'model': tank.model,
+         'old': float(getattr(tank, f"effective_{rule['field']}")),
+         'new': float(tank.new_price)}
+        for tank in sample
+    ]
+    for key in ('old_total', 'new_total', 'min_delta', 'max_delta', 'total_delta'):
+        stats[key] = round(float(stats[key] or 0), 2)
+    return stats
+
+
+def apply_reprice(queryset, rule, created_by=''):
+    """
+    Apply a rule with one UPDATE. Effective price lists are folded into
+    Tank first so the rule starts from the prices customers see. The old
+    prices are journaled (one INSERT … SELECT) for rollback_journal(), and
+    closing the journal bumps the catalog version.
+
+    Returns (updated_count, journal).
+    """
+    with transaction.atomic():
+        if effective_price_list_ids():
+            fold_price_lists()
+
+        journal = start_journal('reprice', created_by)
+        journal_prices(journal, queryset)
+        updated = queryset.order_by().update(**{
+            rule['field']: price_expression(rule),
+            'updated_at': timezone.now(),
+        })
+        WriteJournal.objects.filter(pk=journal.pk).update(batches=1, rows_written=updated)
+        close_journal(journal)
+    return updated, journal
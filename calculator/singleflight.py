@@ -0,0 +1,163 @@
+"""
+Single-flight request coalescing.
+
+When many requests need the same result at the same moment (stats,
+the salesperson directory and popular searches at the start of a sales
+meeting), the first caller computes it and the worker's other concurrent
+callers with the same key wait for that computation and share its
+result or exception. Nothing is kept once the call finishes: this is a
+guard against identical work in flight, not a cache.
+
+Flights created with shared=True also coalesce across workers when
+SINGLE_FLIGHT_SHARED is on and the cache is shared between them: the
+worker holding a cache lock computes and publishes the result, the
+others poll for it, and compute it themselves if the lock holder fails
+or does not finish within SINGLE_FLIGHT_LOCK_TIMEOUT seconds.
+
+Shared results are read-only; callers copy them before making changes.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import SINGLE_FLIGHT
+
+
+SHARED       = getattr(settings, 'SINGLE_FLIGHT_SHARED', False)
+LOCK_TIMEOUT = getattr(settings, 'SINGLE_FLIGHT_LOCK_TIMEOUT', 10)
+
+# Seconds between checks for another worker's result
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+        self.error  = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key. do() is for threads, ado() for
+    coroutines on one event loop; the two do not wait on each other.
+    """
+
+    def __init__(self, name, shared=False):
+        self.name   = name
+        self.shared = shared
+        self._lock  = threading.Lock()
+        self._calls = {}
+        self._tasks = weakref.WeakKeyDictionary()   # event loop → {key: task}
+
+    def _count(self, role):
+        SINGLE_FLIGHT.labels(self.name, role).inc()
+
+    def _cache_keys(self, key):
+        digest = hashlib.md5(str(key).encode('utf-8')).hexdigest()
+        return f'flight:{self.name}:{digest}', f'flight:{self.name}:{digest}:{{}}'
+
+    # ── Threads ───────────────────────────────────────────────────────────────
+
+    def do(self, key, fn):
+        """fn() once for every thread asking for `key` at the same time."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count('coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count('leader')
+        try:
+            call.result = self._shared(key, fn) if self.shared and SHARED else fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _shared(self, key, fn):
+        lock_key, result_key = self._cache_keys(key)
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            try:
+                result = fn()
+                cache.set(result_key.format(token), result, LOCK_TIMEOUT)
+                return result
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        holder = cache.get(lock_key)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while holder is not None and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            # Lock first: a holder publishes its result before releasing
+            released = cache.get(lock_key) != holder
+            result = cache.get(result_key.format(holder), _MISSING)
+            if result is not _MISSING:
+                self._count('shared')
+                return result
+            if released:
+                break
+        return fn()
+
+    # ── Coroutines ────────────────────────────────────────────────────────────
+
+    async def ado(self, key, fn):
+        """await fn() once for every coroutine asking for `key` at the same time."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is None:
+            self._count('leader')
+            task = tasks[key] = loop.create_task(
+                self._ashared(key, fn) if self.shared and SHARED else fn())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        else:
+            self._count('coalesced')
+        # A cancelled request must not cancel the computation the others wait on
+        return await asyncio.shield(task)
+
+    async def _ashared(self, key, fn):
+        lock_key, result_key = self._cache_keys(key)
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key, token, LOCK_TIMEOUT):
+            try:
+                result = await fn()
+                await cache.aset(result_key.format(token), result, LOCK_TIMEOUT)
+                return result
+            finally:
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+
+        holder = await cache.aget(lock_key)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while holder is not None and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            released = await cache.aget(lock_key) != holder
+            result = await cache.aget(result_key.format(holder), _MISSING)
+            if result is not _MISSING:
+                self._count('shared')
+                return result
+            if released:
+                break
+        return await fn()
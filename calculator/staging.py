@@ -0,0 +1,188 @@
+"""
+Server-side staging for admin imports.
+
+Previewing a catalog CSV or a bulk price sheet writes the proposed
+changes into PendingImport / PendingImportRow and stores only the
+import_id in the session. Confirming applies the staged rows with
+set-based statements instead of walking a list kept in the session.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .chunked_writes import WRITE_TIME_BUDGET, WriteBudget, price_entries, record_batch
+from .csv_import import TANK_FIELDS, UPSERT_BATCH_SIZE, upsert_tanks
+from .models import PendingImport, PendingImportRow, Tank
+from .pricing import fold_price_lists
+
+
+# Session keys holding the pending import_id for each admin flow
+SESSION_KEYS = {
+    PendingImport.KIND_CATALOG: 'csv_import_id',
+    PendingImport.KIND_PRICES: 'bulk_price_import_id',
+}
+
+# Unconfirmed imports older than this are deleted on the next preview
+PENDING_IMPORT_MAX_AGE = timedelta(days=1)
+
+STAGE_BATCH_SIZE = 1000
+
+
+def start_import(request, kind, file_name=''):
+    """
+    Create a new PendingImport for this admin session, replacing any
+    earlier unconfirmed import of the same kind. Commits on its own.
+    """
+    with transaction.atomic():
+        discard_import(request, kind)
+        PendingImport.objects.filter(
+            status=PendingImport.STATUS_PENDING,
+            created_at__lt=timezone.now() - PENDING_IMPORT_MAX_AGE,
+        ).delete()
+
+        pending = PendingImport.objects.create(
+            kind=kind,
+            created_by=request.user.get_username() if request.user.is_authenticated else '',
+            file_name=file_name,
+        )
+    request.session[SESSION_KEYS[kind]] = str(pending.import_id)
+    return pending
+
+
+def get_import(request, kind):
+    """Return the session's pending import of this kind, or None."""
+    import_id = request.session.get(SESSION_KEYS[kind])
+    if not import_id:
+        return None
+    return PendingImport.objects.filter(
+        import_id=import_id, kind=kind, status=PendingImport.STATUS_PENDING,
+    ).first()
+
+
+def discard_import(request, kind):
+    """Forget the session's pending import and delete its staged rows."""
+    import_id = request.session.pop(SESSION_KEYS[kind], None)
+    if import_id:
+        PendingImport.objects.filter(
+            import_id=import_id, status=PendingImport.STATUS_PENDING,
+        ).delete()
+
+
+def stage_rows(pending, rows):
+    """
+    Bulk-insert staged rows (dicts of PendingImportRow fields) in one
+    short transaction, so previews hold the write lock per chunk only.
+    """
+    with transaction.atomic(savepoint=False):
+        PendingImportRow.objects.bulk_create(
+            [PendingImportRow(pending_import=pending, **row) for row in rows],
+            batch_size=STAGE_BATCH_SIZE,
+        )
+
+
+def finish_import(pending, summary):
+    pending.summary = summary
+    pending.save(update_fields=['summary'])
+
+
+def release_import(request, kind):
+    """Drop the import_id from the session once it has been handed off."""
+    request.session.pop(SESSION_KEYS[kind], None)
+
+
+def _mark_applied(pending):
+    pending.status = PendingImport.STATUS_APPLIED
+    pending.applied_at = timezone.now()
+    pending.save(update_fields=['status', 'applied_at'])
+    pending.rows.all().delete()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# APPLY
+# ══════════════════════════════════════════════════════════════════════════════
+
+def staged_catalog_rows(pending, chunk_size=UPSERT_BATCH_SIZE):
+    """
+    Stream (label, model, data) tuples for upsert_tanks from staging.
+
+    Reads by primary-key ranges (rows are staged in file order) rather
+    than one open cursor, so batches can commit in between.
+    """
+    last_id = 0
+    while True:
+        rows = list(pending.rows.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'model', *TANK_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        for row_id, model, *values in rows:
+            data = {field: float(value) for field, value in zip(TANK_FIELDS, values)}
+            yield model, model, data
+        last_id = rows[-1][0]
+
+
+def apply_catalog_import(pending, batch_size=UPSERT_BATCH_SIZE, on_batch=None,
+                         time_budget=WRITE_TIME_BUDGET, journal=None):
+    """
+    Upsert a staged catalog CSV into Tank. Each batch commits on its own
+    unless called inside an outer transaction.
+    """
+    # Imported prices must not end up hidden behind an effective price list
+    fold_price_lists()
+    result = upsert_tanks(staged_catalog_rows(pending, batch_size),
+                          batch_size=batch_size, on_batch=on_batch,
+                          time_budget=time_budget, journal=journal)
+    _mark_applied(pending)
+    return result
+
+
+def apply_price_import(pending, batch_size=UPSERT_BATCH_SIZE,
+                       time_budget=WRITE_TIME_BUDGET, journal=None):
+    """
+    Apply staged price changes with UPDATE … FROM staging (expressed as
+    correlated subqueries), one committed statement per batch of staged
+    rows. NULL staged prices keep the current value. With a journal the
+    old prices of each batch are recorded in the same transaction.
+
+    Returns (updated_count, missing_count) where missing tanks were
+    deleted between preview and confirm.
+    """
+    staged = (PendingImportRow.objects
+              .filter(pending_import=pending, tank_id=OuterRef('pk'))
+              .order_by('-row_num'))
+    staged_count = pending.rows.values('tank_id').distinct().count()
+    # Effective lists first, so NULL staged prices keep what customers see
+    fold_price_lists()
+
+    budget = WriteBudget(batch_size, time_budget)
+    updated = 0
+    last_id = 0
+    seen = set()
+    while True:
+        rows = list(pending.rows.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'tank_id')[:budget.size])
+        if not rows:
+            break
+        started = time.perf_counter()
+        # A tank staged twice is written once, with its last staged row
+        tank_ids = {tank_id for _, tank_id in rows} - seen
+        seen |= tank_ids
+
+        with transaction.atomic():
+            entries = price_entries(journal, tank_ids) if journal is not None else []
+            count = Tank.objects.filter(id__in=tank_ids).update(
+                ideal_price=Coalesce(Subquery(staged.values('ideal_price')[:1]), F('ideal_price')),
+                nrp=Coalesce(Subquery(staged.values('nrp')[:1]), F('nrp')),
+                updated_at=timezone.now(),
+            )
+            record_batch(journal, entries, count)
+        updated += count
+
+        budget.record(len(rows), time.perf_counter() - started)
+        last_id = rows[-1][0]
+
+    _mark_applied(pending)
+    return updated, staged_count - updated
@@ -1,3 +1,1359 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import threading
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import (
+    AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils import timezone
+
+from tankmate.asgi import application
+
+from . import nexus, urls, views
+from .admin import TankAdmin
+from .benchmarks import STUB_SALES_PEOPLE, NexusStub, compare_runs, run_benchmarks
+from .client_index import ClientNameIndex
+from .exports import EXPORT_BLOCK_ROWS, EXPORT_COLUMNS
+from .csv_import import TANK_FIELDS, classify, existing_tanks, upsert_tanks
+from .instrumentation import (
+    BUDGET_UPLOAD_ROWS, CACHE_WORKER_KEY, CACHE_WORKERS_KEY, QUERY_BUDGETS, QueryBudgetExceeded,
+    endpoint_stats,
+)
+from .catalog import bump_catalog_version, cached_count
+from . import catalog_swap
+from .chunked_writes import close_journal, rollback_journal, start_journal
+from .jobs import fail_stale_jobs
+from .models import (
+    CatalogState, ImportJob, NexusExportLog, PendingImport, PendingImportRow, PriceList,
+    PriceListEntry, Tank, WriteJournal,
+)
+from .singleflight import SingleFlight
+from .validation import CatalogColumns, validate_catalog, validate_columns, validate_staged_import
+from .pagination import keyset_page
+from .pricing import with_effective_prices
+from .repricing import parse_rule
+from .staging import apply_catalog_import, discard_import
+
+
+# Tests get a private cache instead of the file cache a running server shares
+_test_cache = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+def setUpModule():
+    _test_cache.enable()
+
+
+def tearDownModule():
+    _test_cache.disable()
+
+
+def make_tank(model, **fields):
+    """A catalog tank with plausible defaults for every required column."""
+    values = dict(category=Tank.extract_category_from_model(model) or 'RCT', diameter=3.0,
+                  height=2.0, net_capacity=14.0, gross_capacity=15.0, ideal_price=1000, nrp=900)
+    values.update(fields)
+    return Tank.objects.create(model=model, **values)
+
+
+def tank_row(diameter=3.0, height=2.0, net=14.0, gross=15.0, ideal=1000.0, nrp=900.0):
+    """Parsed CSV row data, as upsert_tanks() receives it."""
+    return dict(zip(TANK_FIELDS, (diameter, height, net, gross, ideal, nrp)))
+
+
+def catalog_csv(*rows):
+    """An uploaded catalog CSV; each row is (model, *TANK_FIELDS values)."""
+    lines = ['tank_model,' + ','.join(TANK_FIELDS)]
+    lines += [','.join(str(value) for value in row) for row in rows]
+    return SimpleUploadedFile('catalog.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+
+class AdminTestCase(TestCase):
+    """A TestCase whose client is logged in to the admin dashboard."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', None)
+        self.client.force_login(user)
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+
+class EndpointBenchmarkTests(TestCase):
+    """Keeps the benchmark suite runnable as endpoints change."""
+
+    def test_every_endpoint_responds(self):
+        report = run_benchmarks(sizes=[40], repeat=1, upload_rows=10)
+        endpoints = report['sizes']['40']['endpoints']
+        self.assertIn('tank_search:capacity', endpoints)
+        self.assertIn('admin_csv_confirm', endpoints)
+        for name, result in endpoints.items():
+            self.assertTrue(all(status < 400 for status in result['status']), name)
+
+    def test_async_views_overlap_nexus_waits(self):
+        report = run_benchmarks(sizes=[40], repeat=1, upload_rows=10, nexus_latency=0.05,
+                                only=['nexus_projects', 'nexus_export'], concurrency=10)
+        for name, result in report['sizes']['40']['concurrency'].items():
+            self.assertEqual(result['status'], [200], name)
+            # 10 waits of 50 ms in sequence vs overlapping on one event loop
+            self.assertGreater(result['speedup'], 3, name)
+
+    def test_compare_runs_flags_slowdowns(self):
+        def run(median):
+            return {'sizes': {'1000': {'endpoints': {'get_category_stats': {'median_ms': median}}}}}
+
+        self.assertEqual(compare_runs(run(10.0), run(12.0)), [])
+        self.assertEqual(compare_runs(run(0.5), run(1.5)), [])
+        regressions = compare_runs(run(10.0), run(20.0))
+        self.assertEqual(regressions[0]['endpoint'], 'get_category_stats')
+        self.assertEqual(regressions[0]['ratio'], 2.0)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint runs within its QUERY_BUDGETS entry, and runs no more
+    queries against a large catalog than against a small one.
+    """
+
+    # Uploads reuse existing tanks, so even the small catalog must hold a full upload
+    SMALL = BUDGET_UPLOAD_ROWS
+    LARGE = BUDGET_UPLOAD_ROWS * 5
+
+    @classmethod
+    def setUpTestData(cls):
+        report = run_benchmarks(sizes=[cls.SMALL, cls.LARGE], repeat=1, upload_rows=BUDGET_UPLOAD_ROWS)
+        cls.small = report['sizes'][str(cls.SMALL)]['endpoints']
+        cls.large = report['sizes'][str(cls.LARGE)]['endpoints']
+
+    def test_every_url_has_a_budget(self):
+        missing = [p.name for p in urls.urlpatterns if p.name not in QUERY_BUDGETS]
+        self.assertEqual(missing, [])
+
+    def test_endpoints_within_budget(self):
+        for size, endpoints in ((self.SMALL, self.small), (self.LARGE, self.large)):
+            for name, result in endpoints.items():
+                with self.subTest(endpoint=name, size=size):
+                    self.assertLessEqual(result['queries'], QUERY_BUDGETS[result['view']])
+
+    def test_queries_do_not_grow_with_catalog(self):
+        for name, result in self.large.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(result['queries'], self.small[name]['queries'])
+
+    @mock.patch('calculator.middleware.SAMPLE_RATE', 1.0)
+    def test_middleware_enforces_budget(self):
+        client = Client()
+        with mock.patch('calculator.middleware.BUDGET_MODE', 'raise'), \
+             mock.patch.dict(QUERY_BUDGETS, {'get_stats': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                client.get('/api/stats/')
+        with mock.patch('calculator.middleware.BUDGET_MODE', 'warn'), \
+             mock.patch.dict(QUERY_BUDGETS, {'get_stats': 0}), \
+             self.assertLogs('calculator.instrumentation', 'WARNING'):
+            self.assertEqual(client.get('/api/stats/').status_code, 200)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        # Catalog sizes are cached per catalog version, which restarts with every test
+        cache.clear()
+
+    def test_scrape_reports_requests_and_catalog(self):
+        Tank.objects.create(model='RCT10-20', category='RCT', diameter=1.0, height=2.0,
+                            net_capacity=1.5, gross_capacity=1.6, ideal_price=1000, nrp=900)
+        client = Client()
+        client.get('/api/stats/')
+        body = client.get('/metrics').content.decode()
+        self.assertIn('tankmate_http_request_duration_seconds_count{method="GET",view="get_stats"}', body)
+        self.assertIn('tankmate_catalog_tanks{active="true",category="RCT"} 1.0', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        client = Client()
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_coroutines_share_one_call(self):
+        flight, calls = SingleFlight('test'), []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'count': len(calls)}
+
+        async def burst():
+            return await asyncio.gather(*(flight.ado('key', compute) for _ in range(10)))
+
+        results = asyncio.run(burst())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'count': 1}] * 10)
+        asyncio.run(burst())
+        self.assertEqual(len(calls), 2)   # nothing is cached afterwards
+
+    def test_threads_share_one_call_and_its_error(self):
+        flight, calls, errors = SingleFlight('test'), [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            raise ValueError('Nexus down')
+
+        def request():
+            try:
+                flight.do('key', compute)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 5)
+
+    def test_shared_flight_waits_for_other_worker(self):
+        # Two instances with one name stand in for two workers sharing the cache
+        first, second = SingleFlight('nexus-test', shared=True), SingleFlight('nexus-test', shared=True)
+        results = {}
+
+        def slow():
+            time.sleep(0.3)
+            return ['Asha Rao']
+
+        with mock.patch('calculator.singleflight.SHARED', True):
+            thread = threading.Thread(target=lambda: results.setdefault('first', first.do('users', slow)))
+            thread.start()
+            time.sleep(0.1)
+            results['second'] = second.do('users', lambda: ['not shared'])
+            thread.join()
+        self.assertEqual(results, {'first': ['Asha Rao'], 'second': ['Asha Rao']})
+
+
+class NexusExportDiffTests(TestCase):
+    """Per-tank leaf hashes and the Merkle root detect what changed in Nexus."""
+
+    def payload(self, *costs):
+        return [views.map_tank_to_nexus({'model': f'RCT{n}', 'height': 2, 'diameter': 3,
+                                         'ideal_price': cost})
+                for n, cost in enumerate(costs)]
+
+    def log(self, payload):
+        leaves = views._compute_tank_hashes(payload)
+        return NexusExportLog(log_id='1', tank_hashes=leaves, export_hash=views._merkle_root(leaves))
+
+    def test_identical_payloads_have_equal_roots(self):
+        first, second = self.payload(100, 200, 300), self.payload(100, 200, 300)
+        for tank in second:
+            tank['id'] = 'regenerated'   # ids are not part of a leaf
+        self.assertEqual(views._merkle_root(views._compute_tank_hashes(first)),
+                         views._merkle_root(views._compute_tank_hashes(list(reversed(second)))))
+        self.assertIsNone(views._diff_payload(self.log(first), second))
+
+    def test_changed_tank_is_reported(self):
+        exported, current = self.payload(100, 200, 300), self.payload(100, 200, 300)
+        current[1]['tankCost'] = 250
+        self.assertNotEqual(views._merkle_root(views._compute_tank_hashes(exported)),
+                            views._merkle_root(views._compute_tank_hashes(current)))
+        changes = views._diff_payload(self.log(exported), current)
+        self.assertEqual(changes, {'added': [], 'removed': [], 'edited': ['RCT1']})
+        self.assertEqual(views._lock_reason(changes, current), '1 tank edited in Nexus')
+
+    def test_added_removed_and_accessories(self):
+        exported = self.payload(100, 200)
+        current = self.payload(100, 200, 300)[::2]    # RCT1 removed, RCT2 added
+        changes = views._diff_payload(self.log(exported), current)
+        self.assertEqual(changes, {'added': ['RCT2'], 'removed': ['RCT1'], 'edited': []})
+        self.assertEqual(views._lock_reason(changes, current), '1 tank added, 1 tank removed in Nexus')
+
+        current = self.payload(100, 200)
+        current[0]['accessoriesList'] = [{'name': 'Ladder'}]
+        changes = views._diff_payload(self.log(exported), current)
+        self.assertEqual(changes['edited'], ['RCT0'])
+        self.assertEqual(views._lock_reason(changes, current), 'Accessories were added in Nexus')
+
+    def test_projects_match_local_logs_by_nexus_log_id(self):
+        # Nexus returns integer log ids; the local mirror stores them as text
+        stub, client = NexusStub(logs_per_person=0), Client()
+        person = STUB_SALES_PEOPLE[0]
+        with stub.installed():
+            response = client.post('/api/nexus/export/', json.dumps({
+                'client_name': 'Acme', 'sales_person': person,
+                'tanks': [{'model': 'RCT1', 'ideal_price': 100}, {'model': 'RCT2', 'ideal_price': 200}],
+            }), content_type='application/json')
+            log_id = response.json()['log_id']
+            self.assertTrue(NexusExportLog.objects.filter(log_id=str(log_id)).exists())
+
+            project = client.get('/api/nexus/projects/', {'sales_person': person}).json()['projects'][0]
+            self.assertFalse(project['is_locked'])
+
+            stub.logs[-1][4][1]['tankCost'] = 250
+            project = client.get('/api/nexus/projects/', {'sales_person': person}).json()['projects'][0]
+        self.assertTrue(project['is_locked'])
+        self.assertEqual(project['changes']['edited'], ['RCT2'])
+        self.assertTrue(NexusExportLog.objects.get(log_id=str(log_id)).is_modified)
+
+
+class NexusBatchExportTests(TestCase):
+
+    def test_batch_reports_each_collection(self):
+        stub, person = NexusStub(logs_per_person=0), STUB_SALES_PEOPLE[0]
+        collections = [
+            {'client_name': 'Acme', 'sales_person': person, 'tanks': [{'model': 'RCT1'}]},
+            {'client_name': '', 'sales_person': person, 'tanks': [{'model': 'RCT2'}]},
+            {'client_name': 'Globex', 'sales_person': person, 'tanks': [{'model': 'RCT3'}]},
+        ]
+        with stub.installed():
+            response = Client().post('/api/nexus/export/batch/', json.dumps({'collections': collections}),
+                                     content_type='application/json')
+        body = response.json()
+        self.assertEqual((body['exported'], body['failed']), (2, 1))
+        self.assertEqual([r['success'] for r in body['results']], [True, False, True])
+        self.assertEqual([log[1] for log in stub.logs], ['Acme', 'Globex'])
+        self.assertEqual(
+            sorted(NexusExportLog.objects.values_list('log_id', flat=True)),
+            sorted(str(log[0]) for log in stub.logs),
+        )
+
+
+class ClientNameIndexTests(TestCase):
+    """The typeahead finds at least what LOWER(client_name) LIKE '%q%' found."""
+
+    NAMES = ['Acme Industries', 'Acme Industires', 'Green Farms', 'City Water Works',
+             'Delta Agro', 'Macro Utilities', 'Aqua Farms 12']
+
+    def setUp(self):
+        for n, name in enumerate(self.NAMES):
+            NexusExportLog.objects.create(log_id=str(n), client_name=name, sales_person='Asha Rao',
+                                          tank_count=1, payload=[])
+        self.index = ClientNameIndex()
+        self.index.bucket('Asha Rao', loader=lambda: [
+            views._client_entry(*row) for row in NexusExportLog.objects.values_list(
+                'log_id', 'client_name', 'created_at', 'tank_count', 'is_modified')
+        ])
+
+    def like(self, q):
+        return set(NexusExportLog.objects.filter(client_name__icontains=q).values_list('log_id', flat=True))
+
+    def search(self, q):
+        return {m['log_id'] for m in self.index.search('asha rao', q, limit=len(self.NAMES))}
+
+    def test_short_queries_match_like_search(self):
+        for q in ('cm', 'AC', 'ro', 'e', '12', 'zz'):
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), self.like(q))
+
+    def test_long_queries_include_like_matches_and_typos(self):
+        for q in ('acme', 'farms', 'water w', 'utilit'):
+            with self.subTest(q=q):
+                self.assertLessEqual(self.like(q), self.search(q))
+        # Fuzzy: a misspelling still finds both Acme collections
+        self.assertEqual(self.search('acme industrie'), {'0', '1'})
+
+
+class UpsertEngineTests(TestCase):
+    """upsert_tanks(): set-based create / update / unchanged classification."""
+
+    def setUp(self):
+        make_tank('RCT1-2')
+        make_tank('RCT2-2')
+
+    def test_counts_and_written_values(self):
+        result = upsert_tanks([
+            ('Row 2', 'RCT1-2', tank_row()),                     # identical
+            ('Row 3', 'RCT2-2', tank_row(ideal=1250.0)),         # price change
+            ('Row 4', 'SST3-2', tank_row(diameter=4.0)),         # new
+            ('Row 5', 'XYZ4-2', tank_row()),                     # no category
+        ])
+        self.assertEqual((result['created'], result['updated'], result['unchanged'], result['processed']),
+                         (1, 1, 1, 4))
+        self.assertEqual(len(result['skipped']), 1)
+        self.assertIn("Row 5", result['skipped'][0])
+        self.assertEqual(result['created_by_category'], {'SST': 1})
+        self.assertEqual(float(Tank.objects.get(model='RCT2-2').ideal_price), 1250.0)
+        self.assertEqual(Tank.objects.get(model='SST3-2').category, 'SST')
+        self.assertFalse(Tank.objects.filter(model='XYZ4-2').exists())
+
+    def test_prices_compared_to_the_paisa(self):
+        self.assertEqual(classify(existing_tanks(['RCT1-2'])['RCT1-2'], tank_row(ideal=1000.001)), 'unchanged')
+        self.assertEqual(classify(existing_tanks(['RCT1-2'])['RCT1-2'], tank_row(ideal=1000.01)), 'update')
+        self.assertEqual(classify(None, tank_row()), 'create')
+
+    def test_duplicate_model_in_one_file_keeps_last_row(self):
+        for batch_size in (1000, 1):   # same batch, and split across batches
+            with self.subTest(batch_size=batch_size):
+                Tank.objects.filter(model='RCT9-2').delete()
+                result = upsert_tanks([
+                    ('Row 2', 'RCT9-2', tank_row(ideal=100.0)),
+                    ('Row 3', 'RCT9-2', tank_row(ideal=300.0)),
+                ], batch_size=batch_size, time_budget=0)
+                self.assertEqual(Tank.objects.filter(model='RCT9-2').count(), 1)
+                self.assertEqual(float(Tank.objects.get(model='RCT9-2').ideal_price), 300.0)
+                self.assertEqual(result['created'], 1)
+                self.assertEqual(result['errors'], [])
+
+    def test_duplicate_reverting_to_catalog_values_writes_nothing(self):
+        result = upsert_tanks([
+            ('Row 2', 'RCT1-2', tank_row(ideal=5000.0)),
+            ('Row 3', 'RCT1-2', tank_row()),          # back to the current values
+        ])
+        self.assertEqual((result['updated'], result['unchanged']), (0, 1))
+        self.assertEqual(float(Tank.objects.get(model='RCT1-2').ideal_price), 1000.0)
+
+
+class CatalogStagingTests(AdminTestCase):
+    """Catalog CSV preview stages rows server-side; confirm applies them."""
+
+    def setUp(self):
+        super().setUp()
+        make_tank('RCT1-2')
+        make_tank('RCT2-2')
+
+    def preview(self):
+        return self.client.post('/admin-dashboard/csv/preview/', {'csv_file': catalog_csv(
+            ('RCT1-2', 3.0, 2.0, 14.0, 15.0, 1000, 900),      # unchanged
+            ('RCT2-2', 3.0, 2.0, 14.0, 15.0, 1100, 900),      # update
+            ('SST3-2', 4.0, 2.0, 24.0, 25.0, 2000, 1800),     # create
+            ('', 1, 1, 1, 1, 1, 1),                           # missing model
+        )}).json()
+
+    @override_settings(IMPORT_JOB_RUNNER='inline')
+    def test_preview_counts_then_apply(self):
+        body = self.preview()
+        summary = body['summary']
+        self.assertEqual((summary['to_create'], summary['to_update'], summary['unchanged'], summary['errors']),
+                         (1, 1, 1, 1))
+        pending = PendingImport.objects.get(import_id=body['import_id'])
+        self.assertEqual(sorted(pending.rows.values_list('model', 'action')),
+                         [('RCT2-2', 'update'), ('SST3-2', 'create')])
+        # Nothing is written before confirm
+        self.assertFalse(Tank.objects.filter(model='SST3-2').exists())
+        self.assertEqual(float(Tank.objects.get(model='RCT2-2').ideal_price), 1000.0)
+
+        job = self.client.post('/admin-dashboard/csv/confirm/').json()['job']
+        self.assertEqual((job['status'], job['created'], job['updated']), ('succeeded', 1, 1))
+        self.assertEqual(float(Tank.objects.get(model='RCT2-2').ideal_price), 1100.0)
+        self.assertEqual(Tank.objects.get(model='SST3-2').category, 'SST')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, PendingImport.STATUS_APPLIED)
+        self.assertFalse(pending.rows.exists())
+
+    def test_discard_leaves_catalog_untouched(self):
+        before = list(Tank.objects.order_by('model').values_list('model', 'ideal_price', 'updated_at'))
+        body = self.preview()
+        session = self.client.session
+        discard_import(SimpleNamespace(session=session), PendingImport.KIND_CATALOG)
+        session.save()
+
+        self.assertFalse(PendingImport.objects.filter(import_id=body['import_id']).exists())
+        self.assertFalse(PendingImportRow.objects.exists())
+        self.assertEqual(self.client.post('/admin-dashboard/csv/confirm/').status_code, 400)
+        self.assertEqual(list(Tank.objects.order_by('model').values_list('model', 'ideal_price', 'updated_at')),
+                         before)
+
+    def test_preview_validates_outside_a_transaction(self):
+        # TestCase wraps each test in atomic blocks of its own; the preview must add none
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def validate(pending):
+            seen.append((len(connection.atomic_blocks), pending.rows.count()))
+            return validate_staged_import(pending)
+
+        with mock.patch('calculator.admin_views.validate_staged_import', validate), \
+             mock.patch('calculator.admin_views.LOOKUP_CHUNK_SIZE', 1):
+            self.assertTrue(self.preview()['success'])
+        self.assertEqual(seen, [(depth, 2)])
+
+    def test_new_preview_replaces_the_previous_one(self):
+        first = self.preview()['import_id']
+        second = self.preview()['import_id']
+        self.assertFalse(PendingImport.objects.filter(import_id=first).exists())
+        self.assertEqual(PendingImport.objects.get(import_id=second).rows.count(), 2)
+
+
+class StaleImportJobTests(AdminTestCase):
+    """A RUNNING job whose worker died is failed instead of polling forever."""
+
+    def running_job(self, idle_seconds):
+        job = ImportJob.objects.create(status=ImportJob.STATUS_RUNNING, rows_total=10, rows_processed=4,
+                                       started_at=timezone.now(), journal=start_journal('csv_import'))
+        # updated_at is auto_now; backdate the last heartbeat directly
+        ImportJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=idle_seconds))
+        return job
+
+    def status(self, job):
+        return self.client.get(f'/admin-dashboard/jobs/{job.job_id}/').json()['job']
+
+    def test_status_read_fails_a_stalled_job(self):
+        live, dead = self.running_job(5), self.running_job(3600)
+        self.assertEqual(self.status(live)['status'], 'running')
+
+        body = self.status(dead)
+        self.assertEqual((body['status'], body['finished']), ('failed', True))
+        self.assertEqual(body['message'], 'Worker stopped after 4 of 10 rows')
+        dead.journal.refresh_from_db()
+        self.assertEqual(dead.journal.status, WriteJournal.STATUS_FAILED)
+
+    def test_sweep_marks_only_stale_jobs(self):
+        live, dead = self.running_job(5), self.running_job(3600)
+        self.assertEqual(fail_stale_jobs(), 1)
+        self.assertEqual(fail_stale_jobs(), 0)
+        statuses = dict(ImportJob.objects.values_list('pk', 'status'))
+        self.assertEqual((statuses[live.pk], statuses[dead.pk]), ('running', 'failed'))
+
+
+class WriteJournalRollbackTests(TestCase):
+    """A failed chunked import keeps its committed batches; the journal undoes them."""
+
+    def test_failure_in_second_chunk_is_rolled_back(self):
+        make_tank('RCT1-2', ideal_price=1000, nrp=900)
+        make_tank('RCT3-2', ideal_price=3000, nrp=2700)
+
+        def rows():
+            yield 'Row 2', 'RCT1-2', tank_row(ideal=1500.0, nrp=1400.0)   # chunk 1: update
+            yield 'Row 3', 'RCT2-2', tank_row()                           # chunk 1: create
+            yield 'Row 4', 'RCT3-2', tank_row(ideal=3500.0)               # chunk 2
+            raise OSError('upload connection reset')
+
+        journal = start_journal('csv_import')
+        with self.assertRaises(OSError):
+            upsert_tanks(rows(), batch_size=2, time_budget=0, journal=journal)
+        close_journal(journal, WriteJournal.STATUS_FAILED)
+
+        # Chunk 1 committed, chunk 2 never did
+        self.assertEqual(float(Tank.objects.get(model='RCT1-2').ideal_price), 1500.0)
+        self.assertTrue(Tank.objects.filter(model='RCT2-2').exists())
+        self.assertEqual(float(Tank.objects.get(model='RCT3-2').ideal_price), 3000.0)
+        journal.refresh_from_db()
+        self.assertEqual((journal.batches, journal.rows_written), (1, 2))
+
+        self.assertEqual(rollback_journal(journal), {'deleted': 1, 'restored': 1})
+        restored = Tank.objects.get(model='RCT1-2')
+        self.assertEqual((float(restored.ideal_price), float(restored.nrp)), (1000.0, 900.0))
+        self.assertFalse(Tank.objects.filter(model='RCT2-2').exists())
+        self.assertEqual(float(Tank.objects.get(model='RCT3-2').ideal_price), 3000.0)
+        with self.assertRaises(ValueError):
+            rollback_journal(journal)
+
+
+class EffectivePriceListTests(AdminTestCase):
+    """Effective price lists show everywhere, and never hide a later direct edit."""
+
+    def setUp(self):
+        super().setUp()
+        self.tank = make_tank('RCT1-2', ideal_price=1000, nrp=900)
+        self.price_list = PriceList.objects.create(name='Revision', entry_count=1,
+                                                   effective_from=timezone.now() - timedelta(days=1))
+        PriceListEntry.objects.create(price_list=self.price_list, tank=self.tank, ideal_price=1200, nrp=1100)
+
+    def searched(self):
+        result = Client().get('/api/search/', {'model': 'RCT1-2'}).json()['results'][0]
+        return result['ideal_price'], result['nrp']
+
+    def test_list_and_stats_match_search(self):
+        self.assertEqual(self.searched(), (1200.0, 1100.0))
+        stats = Client().get('/api/stats/').json()['stats']['RCT']
+        self.assertEqual((stats['min_price'], stats['max_price']), (1200.0, 1200.0))
+        self.assertContains(self.client.get('/admin-dashboard/tanks/'), '₹1200.00')
+
+    def test_direct_edit_after_effective_list_wins(self):
+        response = self.client.post('/admin-dashboard/tank/update/',
+                                    {'tank_id': self.tank.id, 'field': 'ideal_price', 'value': '1500'})
+        self.assertTrue(response.json()['success'])
+        # The edited price shows; the list's NRP was folded in, not lost
+        self.assertEqual(self.searched(), (1500.0, 1100.0))
+        self.price_list.refresh_from_db()
+        self.assertEqual(self.price_list.status, 'folded')
+
+    def test_batch_edit_after_effective_list_wins(self):
+        self.post_json('/admin-dashboard/tank/batch/',
+                       {'edits': [{'tank_id': self.tank.id, 'field': 'nrp', 'value': '950'}]})
+        self.assertEqual(self.searched(), (1200.0, 950.0))
+
+    def test_bulk_price_update_after_effective_list_wins(self):
+        response = self.post_json('/admin-dashboard/bulk-price/update/', {'changes': [
+            {'tank_id': self.tank.id, 'model': 'RCT1-2', 'new_ideal_price': 1300, 'new_nrp': None},
+        ]})
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(self.searched(), (1300.0, 1100.0))
+
+    def test_catalog_import_after_effective_list_wins(self):
+        pending = PendingImport.objects.create(kind=PendingImport.KIND_CATALOG)
+        PendingImportRow.objects.create(pending_import=pending, row_num=2, tank_id=self.tank.id,
+                                        model='RCT1-2', action='update', **tank_row(ideal=1400.0, nrp=1300.0))
+        self.assertEqual(apply_catalog_import(pending)['updated'], 1)
+        self.assertEqual(self.searched(), (1400.0, 1300.0))
+
+
+class CatalogSwapTests(TransactionTestCase):
+    """Blue/green catalog swaps. Table renames need real transactions."""
+
+    def tearDown(self):
+        with connection.schema_editor() as editor:
+            for table in (catalog_swap.SHADOW_TABLE, catalog_swap.PREVIOUS_TABLE):
+                if catalog_swap._table_exists(table):
+                    editor.delete_model(catalog_swap._table_model(table))
+
+    def load(self, *rows, **kwargs):
+        """Load (model, row data) pairs into the shadow catalog."""
+        return catalog_swap.load_shadow([(model, model, data) for model, data in rows], **kwargs)
+
+    def test_promote_replaces_effective_price_list(self):
+        tank = make_tank('RCT1-2', ideal_price=1000, nrp=900)
+        price_list = PriceList.objects.create(name='Revision', entry_count=1,
+                                              effective_from=timezone.now() - timedelta(days=1))
+        PriceListEntry.objects.create(price_list=price_list, tank=tank, ideal_price=1200, nrp=1100)
+
+        self.load(('RCT1-2', tank_row(ideal=1500.0, nrp=1400.0)))
+        catalog_swap.promote_shadow()
+
+        tank = with_effective_prices(Tank.objects.filter(model='RCT1-2')).get()
+        self.assertEqual((tank.effective_ideal_price, tank.effective_nrp), (1500, 1400))
+        price_list.refresh_from_db()
+        self.assertEqual(price_list.status, 'folded')
+
+    def test_list_effective_after_load_makes_shadow_stale(self):
+        tank = make_tank('RCT1-2', ideal_price=1000, nrp=900)
+        self.load(('RCT1-2', tank_row(ideal=1500.0, nrp=1400.0)))
+        price_list = PriceList.objects.create(name='Revision', entry_count=1,
+                                              effective_from=timezone.now() - timedelta(days=1))
+        PriceListEntry.objects.create(price_list=price_list, tank=tank, ideal_price=1200, nrp=1100)
+
+        with self.assertRaisesMessage(catalog_swap.CatalogSwapError, 'reload it'):
+            catalog_swap.promote_shadow()
+        self.assertEqual(Tank.objects.get(model='RCT1-2').ideal_price, 1200)
+
+    def live_indexes(self, table=catalog_swap.LIVE_TABLE):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return {tuple(info['columns']) for info in constraints.values()
+                if info['index'] and not info['unique'] and not info['primary_key']}
+
+    def test_load_diff_promote_and_rollback(self):
+        for model in ('RCT1-2', 'RCT2-2', 'RCT3-2'):
+            make_tank(model)
+        version = CatalogState.load().version
+        report = self.load(('RCT1-2', tank_row(ideal=1500.0)), ('RCT2-2', tank_row()),
+                           ('RCT4-2', tank_row(ideal=2000.0)))
+        self.assertEqual((report['loaded'], report['carried_over']), (4, 1))
+
+        diff = catalog_swap.diff_shadow()
+        self.assertEqual({key: info['sample'] for key, info in diff.items()}, {
+            'added': ['RCT4-2'], 'removed': [], 'changed': ['RCT1-2'],
+            'deactivated': ['RCT3-2'], 'unchanged': ['RCT2-2'],
+        })
+        self.assertEqual(catalog_swap.validate_shadow(diff), [])
+
+        catalog_swap.promote_shadow()
+        self.assertEqual(dict(Tank.objects.values_list('model', 'ideal_price')),
+                         {'RCT1-2': 1500, 'RCT2-2': 1000, 'RCT3-2': 1000, 'RCT4-2': 2000})
+        self.assertFalse(Tank.objects.get(model='RCT3-2').is_active)
+        self.assertEqual(CatalogState.load().version, version + 1)
+        self.assertFalse(catalog_swap.catalog_status()['shadow_loaded'])
+
+        catalog_swap.rollback_swap()
+        self.assertEqual(dict(Tank.objects.values_list('model', 'ideal_price')),
+                         {'RCT1-2': 1000, 'RCT2-2': 1000, 'RCT3-2': 1000})
+        self.assertTrue(Tank.objects.get(model='RCT3-2').is_active)
+        self.assertEqual(CatalogState.load().version, version + 2)
+        self.assertTrue(catalog_swap.catalog_status()['previous_available'])
+
+    def test_keeps_tank_ids_and_is_active(self):
+        kept = make_tank('RCT1-2')
+        hidden = make_tank('RCT2-2', is_active=False)
+        self.load(('RCT1-2', tank_row(ideal=1500.0)), ('RCT2-2', tank_row()),
+                  ('RCT3-2', tank_row()))
+        catalog_swap.promote_shadow()
+
+        tanks = {tank.model: tank for tank in Tank.objects.all()}
+        self.assertEqual((tanks['RCT1-2'].id, tanks['RCT1-2'].created_at), (kept.id, kept.created_at))
+        self.assertEqual(tanks['RCT2-2'].id, hidden.id)
+        self.assertFalse(tanks['RCT2-2'].is_active)
+        self.assertGreater(tanks['RCT3-2'].id, hidden.id)
+
+    def test_validation_refuses_stale_or_shrunken_shadow(self):
+        for model in ('RCT1-2', 'RCT2-2', 'RCT3-2'):
+            make_tank(model)
+        self.load(('RCT1-2', tank_row()), drop_missing=True)
+        problems = catalog_swap.validate_shadow()
+        self.assertEqual(problems, ['Shadow catalog drops 2 of 3 live tanks'])
+        with self.assertRaises(catalog_swap.CatalogSwapError):
+            catalog_swap.promote_shadow()
+
+        self.load(('RCT1-2', tank_row()), ('RCT2-2', tank_row()), ('RCT3-2', tank_row()))
+        Tank.objects.filter(model='RCT2-2').update(ideal_price=1100)
+        self.assertEqual(catalog_swap.validate_shadow(),
+                         ['Live catalog changed after the shadow was loaded; reload it'])
+        with self.assertRaises(catalog_swap.CatalogSwapError):
+            catalog_swap.promote_shadow()
+        self.assertEqual(Tank.objects.get(model='RCT2-2').ideal_price, 1100)
+
+    def test_indexes_stay_on_the_live_table(self):
+        make_tank('RCT1-2')
+        indexes = self.live_indexes()
+        self.assertTrue(indexes)
+        for price in (1500.0, 1600.0):
+            self.load(('RCT1-2', tank_row(ideal=price)))
+            catalog_swap.promote_shadow()
+            self.assertEqual(self.live_indexes(), indexes)
+            self.assertEqual(self.live_indexes(catalog_swap.PREVIOUS_TABLE), set())
+        catalog_swap.rollback_swap()
+        self.assertEqual(self.live_indexes(), indexes)
+        self.assertEqual(Tank.objects.get().ideal_price, 1500)
+
+
+class RepriceTests(AdminTestCase):
+    """Bulk repricing: the preview predicts exactly what apply writes."""
+
+    def setUp(self):
+        super().setUp()
+        make_tank('RCT1-2', ideal_price=1000, nrp=900)
+        make_tank('RCT2-2', ideal_price=1400, nrp=1300)
+        make_tank('SST1-2', ideal_price=2000, nrp=1800)
+
+    def reprice(self, rule, apply=False, **filters):
+        return self.post_json('/admin-dashboard/reprice/',
+                              {'filters': filters, 'rule': rule, 'apply': apply}).json()
+
+    def prices(self):
+        return {model: (float(ideal), float(nrp))
+                for model, ideal, nrp in Tank.objects.values_list('model', 'ideal_price', 'nrp')}
+
+    def test_preview_writes_nothing_and_matches_apply(self):
+        rule = {'field': 'ideal_price', 'operation': 'percent', 'value': 4.5}
+        before = self.prices()
+        preview = self.reprice(rule, category='RCT')['preview']
+        self.assertEqual(self.prices(), before)
+        self.assertEqual((preview['tanks'], preview['changed']), (2, 2))
+        self.assertEqual(preview['total_delta'], 108.0)
+        predicted = {row['model']: row['new'] for row in preview['sample']}
+
+        body = self.reprice(rule, apply=True, category='RCT')
+        self.assertEqual(body['updated'], 2)
+        after = self.prices()
+        self.assertEqual({model: after[model][0] for model in predicted}, predicted)
+        self.assertEqual(after['SST1-2'], before['SST1-2'])
+
+    def test_rounding_never_puts_nrp_above_ideal(self):
+        # 0.95 × 1400 = 1330 rounds to 1500, above the 1400 ideal price
+        self.reprice({'field': 'nrp', 'operation': 'ratio', 'value': 0.95, 'round_to': 500}, apply=True)
+        self.assertEqual(self.prices()['RCT2-2'], (1400.0, 1400.0))
+        # Rounding 1400 down to 1000 would leave the ideal price below its 1300 NRP
+        self.post_json('/admin-dashboard/tank/batch/', {'edits': [
+            {'tank_id': Tank.objects.get(model='RCT2-2').id, 'field': 'nrp', 'value': '1300'}]})
+        preview = self.reprice({'field': 'ideal_price', 'operation': 'round', 'round_to': 1000},
+                               apply=True)['preview']
+        self.assertIn({'model': 'RCT2-2', 'old': 1400.0, 'new': 1300.0}, preview['sample'])
+        for model, (ideal, nrp) in self.prices().items():
+            self.assertLessEqual(nrp, ideal, model)
+
+    def test_invalid_rules_are_rejected(self):
+        for rule in ({'field': 'cost', 'operation': 'percent', 'value': 1},
+                     {'field': 'nrp', 'operation': 'percent', 'value': -100},
+                     {'field': 'nrp', 'operation': 'round'}):
+            with self.subTest(rule=rule), self.assertRaises(ValueError):
+                parse_rule(rule)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for n in range(7):
+            make_tank(f'RCT{n}-2')
+        # A bulk write stamps many rows with the same updated_at
+        self.stamp = timezone.now().replace(microsecond=123456)
+        Tank.objects.filter(model__in=['RCT1-2', 'RCT2-2', 'RCT3-2', 'RCT4-2', 'RCT5-2']).update(
+            updated_at=self.stamp)
+        Tank.objects.filter(model='RCT6-2').update(updated_at=self.stamp + timedelta(seconds=1))
+        Tank.objects.filter(model='RCT0-2').update(updated_at=self.stamp - timedelta(seconds=1))
+
+    def walk(self, per_page):
+        pages, page = [], keyset_page(Tank.objects.all(), per_page=per_page)
+        while True:
+            pages.append([tank.model for tank in page])
+            if not page.has_next:
+                return pages
+            page = keyset_page(Tank.objects.all(), after=page.next_cursor, per_page=per_page)
+
+    def test_pages_are_stable_across_ties(self):
+        expected = ['RCT6-2', 'RCT5-2', 'RCT4-2', 'RCT3-2', 'RCT2-2', 'RCT1-2', 'RCT0-2']
+        for per_page in (1, 2, 3):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(sum(self.walk(per_page), []), expected)
+
+    def test_previous_returns_the_same_rows(self):
+        first = keyset_page(Tank.objects.all(), per_page=3)
+        second = keyset_page(Tank.objects.all(), after=first.next_cursor, per_page=3)
+        back = keyset_page(Tank.objects.all(), before=second.previous_cursor, per_page=3)
+        self.assertEqual([t.pk for t in back], [t.pk for t in first])
+        self.assertFalse(back.has_previous)
+
+    def test_malformed_cursor_starts_over(self):
+        page = keyset_page(Tank.objects.all(), after='not-a-cursor', per_page=3)
+        self.assertEqual(page.number, 1)
+        self.assertEqual(list(page)[0].model, 'RCT6-2')
+
+    def test_cached_count_follows_catalog_version(self):
+        params = {'category': 'RCT'}
+        self.assertEqual(cached_count(Tank.objects.filter(category='RCT'), 'test', params), 7)
+        make_tank('RCT9-2')
+        # Same catalog version: the cached count is served
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_count(Tank.objects.filter(category='RCT'), 'test', params), 7)
+        bump_catalog_version()
+        self.assertEqual(cached_count(Tank.objects.filter(category='RCT'), 'test', params), 8)
+        self.assertEqual(cached_count(Tank.objects.filter(category='SST'), 'test', {'category': 'SST'}), 0)
+
+
+class TankBatchUpdateTests(AdminTestCase):
+    """Batch cell edits: per-cell results, optionally all-or-nothing."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = make_tank('RCT1-2', ideal_price=1000, is_active=True)
+        self.second = make_tank('RCT2-2', ideal_price=2000, is_active=True)
+
+    def batch(self, **body):
+        return self.post_json('/admin-dashboard/tank/batch/', body)
+
+    def edits(self):
+        return [
+            {'tank_id': self.first.id, 'field': 'ideal_price', 'value': '1100'},
+            {'tank_id': self.second.id, 'field': 'height', 'value': 'tall'},
+            {'tank_id': 999999, 'field': 'nrp', 'value': '10'},
+            {'tank_id': self.second.id, 'field': 'model', 'value': 'RCT3-2'},
+        ]
+
+    def test_partial_failure_applies_valid_cells(self):
+        response = self.batch(edits=self.edits(), toggles=[{'tank_id': self.second.id}])
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body['success'], body['applied'], body['failed'], body['updated_tanks']),
+                         (False, 2, 3, 2))
+        self.assertEqual([r.get('error') for r in body['results']],
+                         [None, 'Invalid value: tall', 'Tank not found', 'Invalid field', None])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(float(self.first.ideal_price), 1100.0)
+        self.assertFalse(self.second.is_active)
+        self.assertEqual((self.second.height, self.second.model), (2.0, 'RCT2-2'))
+
+    def test_all_or_nothing_writes_nothing_on_any_failure(self):
+        response = self.batch(edits=self.edits(), all_or_nothing=True)
+        body = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(body['error'], '3 invalid edits')
+        self.assertEqual(body['results'][0], {'tank_id': self.first.id, 'field': 'ideal_price', 'success': False,
+                                              'value': '1100', 'error': 'Not applied: other edits failed'})
+        self.first.refresh_from_db()
+        self.assertEqual(float(self.first.ideal_price), 1000.0)
+
+    def test_all_or_nothing_applies_a_valid_batch(self):
+        body = self.batch(all_or_nothing=True, edits=[
+            {'tank_id': self.first.id, 'field': 'ideal_price', 'value': '1100'},
+            {'tank_id': self.second.id, 'field': 'diameter', 'value': '4.5'},
+        ], toggles=[{'tank_id': self.first.id, 'is_active': False}]).json()
+        self.assertEqual((body['success'], body['applied'], body['updated_tanks']), (True, 3, 2))
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((float(self.first.ideal_price), self.first.is_active), (1100.0, False))
+        self.assertEqual(self.second.diameter, 4.5)
+
+    def test_empty_and_oversized_batches_are_rejected(self):
+        self.assertEqual(self.batch(edits=[]).status_code, 400)
+        with mock.patch('calculator.admin_views.TANK_BATCH_LIMIT', 1):
+            self.assertEqual(self.batch(edits=self.edits()[:2]).status_code, 400)
+
+
+class TankBulkStatusTests(AdminTestCase):
+    """Activate / deactivate everything matching the tank list filters."""
+
+    def setUp(self):
+        super().setUp()
+        make_tank('RCT1-2', net_capacity=10.0)
+        make_tank('RCT2-2', net_capacity=20.0)
+        make_tank('RCT3-2', net_capacity=30.0, is_active=False)
+        make_tank('SST1-2', net_capacity=20.0)
+
+    def bulk_status(self, filters, is_active, apply=False):
+        return self.post_json('/admin-dashboard/tank/bulk-status/',
+                              {'filters': filters, 'is_active': is_active, 'apply': apply})
+
+    def active(self):
+        return set(Tank.objects.filter(is_active=True).values_list('model', flat=True))
+
+    def test_preview_counts_filtered_selection_only(self):
+        body = self.bulk_status({'category': 'rct', 'min_capacity': '15'}, False).json()
+        self.assertEqual((body['applied'], body['preview']), (False, {'matched': 2, 'changed': 1}))
+        self.assertEqual(self.active(), {'RCT1-2', 'RCT2-2', 'SST1-2'})
+
+    def test_apply_updates_only_matching_tanks_needing_change(self):
+        untouched = Tank.objects.get(model='RCT3-2').updated_at
+        body = self.bulk_status({'category': 'RCT', 'min_capacity': '15'}, False, apply=True).json()
+        self.assertEqual((body['updated'], body['message']), (1, '1 tanks deactivated'))
+        self.assertEqual(self.active(), {'RCT1-2', 'SST1-2'})
+        # Already inactive: not rewritten
+        self.assertEqual(Tank.objects.get(model='RCT3-2').updated_at, untouched)
+
+        body = self.bulk_status({'status': 'inactive', 'search': 'rct'}, True, apply=True).json()
+        self.assertEqual((body['preview'], body['updated']), ({'matched': 2, 'changed': 2}, 2))
+        self.assertEqual(self.active(), {'RCT1-2', 'RCT2-2', 'RCT3-2', 'SST1-2'})
+
+    def test_bad_requests_are_rejected(self):
+        self.assertEqual(self.bulk_status({'min_capacity': 'big'}, False).status_code, 400)
+        self.assertEqual(self.bulk_status({}, 'no').status_code, 400)
+        self.assertEqual(self.active(), {'RCT1-2', 'RCT2-2', 'SST1-2'})
+
+
+class CatalogValidationTests(TestCase):
+    """Each consistency check flags a bad tank and passes a good one."""
+
+    GOOD = dict(diameter=3.0, height=2.0, net_capacity=14.0, gross_capacity=15.0, ideal_price=1000.0, nrp=900.0)
+
+    def counts(self, *tanks):
+        columns = CatalogColumns()
+        for n, (model, fields) in enumerate(tanks):
+            values = dict(self.GOOD, **fields)
+            category = values.pop('category', model[:3])
+            columns.append(n, None, model, category, [values[f] for f in CatalogColumns.FLOAT_COLUMNS])
+        return validate_columns(columns)['counts']
+
+    def assertFlags(self, check, *tanks):
+        self.assertEqual(self.counts(*tanks)[check], 1)
+
+    def assertPasses(self, check, *tanks):
+        self.assertEqual(self.counts(*tanks)[check], 0)
+
+    def test_good_tank_passes_every_check(self):
+        self.assertEqual(set(self.counts(('RCT1-2', {})).values()), {0})
+
+    def test_gross_below_net(self):
+        self.assertFlags('gross_below_net', ('RCT1-2', {'gross_capacity': 13.9}))
+        self.assertPasses('gross_below_net', ('RCT1-2', {'gross_capacity': 14.0}))
+
+    def test_nrp_above_ideal(self):
+        self.assertFlags('nrp_above_ideal', ('RCT1-2', {'nrp': 1000.01}))
+        self.assertPasses('nrp_above_ideal', ('RCT1-2', {'nrp': 1000.0}))
+
+    def test_capacity_off_volume(self):
+        self.assertFlags('capacity_off_volume', ('RCT1-2', {'net_capacity': 140.0, 'gross_capacity': 150.0}))
+        self.assertFlags('capacity_off_volume', ('RCT1-2', {'height': 0.0}))
+        self.assertPasses('capacity_off_volume', ('RCT1-2', {'net_capacity': 12.0}))
+
+    def test_category_mismatch(self):
+        self.assertFlags('category_mismatch', ('RCT1-2', {'category': 'SST'}))
+        self.assertFlags('category_mismatch', ('XYZ1-2', {}))
+        self.assertPasses('category_mismatch', ('rct1-2', {'category': 'RCT'}))
+
+    def test_conflicting_duplicates(self):
+        self.assertFlags('conflicting_duplicates', ('RCT1-2', {}), ('RCT1-3', {'ideal_price': 1100.0}))
+        self.assertFlags('conflicting_duplicates',
+                         ('SST1-2(ETP)', {}), ('SST1-3(ETP)', {'ideal_price': 1100.0}))
+        # Same price, different dimensions, or a different variant of the same shell
+        self.assertPasses('conflicting_duplicates', ('RCT1-2', {}), ('RCT1-3', {}))
+        self.assertPasses('conflicting_duplicates', ('RCT1-2', {}), ('RCT1-3', {'height': 2.001, 'ideal_price': 1.0}))
+        self.assertPasses('conflicting_duplicates', ('SST1-2', {}), ('SST1-2(ETP)', {'ideal_price': 1100.0}),
+                          ('SST1-2(BioD)', {'ideal_price': 1200.0}))
+
+    def test_catalog_variants_are_not_duplicates(self):
+        make_tank('SST25-24', diameter=2.5, height=2.4, net_capacity=11.0, gross_capacity=12.0)
+        make_tank('SST25-24(ETP)', diameter=2.5, height=2.4, net_capacity=11.0, gross_capacity=12.0,
+                  ideal_price=1500)
+        make_tank('SST25-24(BioD)', diameter=2.5, height=2.4, net_capacity=11.0, gross_capacity=12.0,
+                  ideal_price=1700)
+        report = validate_catalog()
+        self.assertEqual((report['valid'], report['warnings'], report['findings']), (True, 0, []))
+
+
+class PerformanceStatsTests(AdminTestCase):
+    """The performance page merges workers through a cache they share."""
+
+    def setUp(self):
+        super().setUp()
+        endpoint_stats.reset()
+        self.client.get('/api/stats/')
+
+    def other_worker(self, store, calls):
+        """Publish another process's aggregates the way EndpointStats.flush() does."""
+        key = CACHE_WORKER_KEY.format('other')
+        snapshot = {'get_stats': dict(endpoint_stats.snapshot()['get_stats'], calls=calls, recent_ms=[5.0])}
+        store.set(key, snapshot)
+        store.set(CACHE_WORKERS_KEY, (store.get(CACHE_WORKERS_KEY) or []) + [key])
+
+    def test_file_cache_merges_workers(self):
+        with tempfile.TemporaryDirectory() as directory, \
+             override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': directory}}):
+            # A separate cache instance on the same directory stands in for another process
+            self.other_worker(FileBasedCache(directory, {}), calls=10)
+            body = self.client.get('/admin-dashboard/performance/', {'format': 'json'}).json()
+            self.assertEqual((body['shared'], body['workers']), (True, 2))
+            self.assertEqual(body['endpoints']['get_stats']['calls'], 11)
+            self.assertContains(self.client.get('/admin-dashboard/performance/'), 'merged from 2 workers')
+
+    def test_process_local_cache_is_labelled(self):
+        body = self.client.get('/admin-dashboard/performance/', {'format': 'json'}).json()
+        self.assertEqual(body['shared'], False)
+        self.assertContains(self.client.get('/admin-dashboard/performance/'), 'this worker only')
+
+
+class _FakeAsyncCursor:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        pass
+
+
+class _FakeAsyncConnection:
+    def __init__(self):
+        self.closed = False
+
+    def cursor(self):
+        return _FakeAsyncCursor()
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakePool:
+    def __init__(self, **kwargs):
+        self.closed = True
+
+    async def open(self, wait=True):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class NexusAsyncPoolTests(TestCase):
+    """Only the ASGI server's loop owns a pool; short-lived loops don't leak one."""
+
+    def setUp(self):
+        nexus.breaker.record_success()
+
+    @mock.patch('psycopg_pool.AsyncConnectionPool', side_effect=AssertionError('no pool expected'))
+    def test_requests_on_fresh_loops_open_no_pool(self, _):
+        connections = []
+
+        async def connect(**kwargs):
+            connections.append(_FakeAsyncConnection())
+            return connections[-1]
+
+        async def query():
+            async with nexus.async_nexus_cursor() as cur:
+                await cur.execute('SELECT 1')
+
+        with mock.patch('psycopg.AsyncConnection.connect', connect):
+            # async_to_sync runs each call on a new event loop, like the test client
+            async_to_sync(query)()
+            async_to_sync(query)()
+        self.assertIsNone(nexus._async_pool)
+        self.assertEqual([conn.closed for conn in connections], [True, True])
+
+    @mock.patch('psycopg_pool.AsyncConnectionPool', _FakePool)
+    def test_lifespan_opens_and_closes_the_worker_pool(self):
+        seen = {}
+
+        async def serve():
+            messages = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message['type'])
+
+            server = asyncio.create_task(application({'type': 'lifespan'}, messages.get, send))
+            await messages.put({'type': 'lifespan.startup'})
+            while not sent:
+                await asyncio.sleep(0)
+            seen['pool'] = nexus.get_async_pool()
+            # Another loop (a thread running async_to_sync) must not borrow it
+            other = threading.Thread(target=lambda: seen.update(other=asyncio.run(self._pool())))
+            other.start()
+            other.join()
+            await messages.put({'type': 'lifespan.shutdown'})
+            await server
+            return sent
+
+        sent = asyncio.run(serve())
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertIsInstance(seen['pool'], _FakePool)
+        self.assertIsNone(seen['other'])
+        self.assertTrue(seen['pool'].closed)
+        self.assertIsNone(nexus._async_pool)
+
+    @staticmethod
+    async def _pool():
+        return nexus.get_async_pool()
+
+
+class NexusCircuitBreakerTests(TestCase):
+    """The breaker fails fast while Nexus is down and always frees its probe."""
+
+    def setUp(self):
+        # reset_timeout=0: an open circuit is half-open again at once
+        patcher = mock.patch.object(nexus, 'breaker', nexus.CircuitBreaker(failure_threshold=2, reset_timeout=0))
+        self.breaker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opens_after_threshold_and_lets_one_probe_through(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertFalse(self.breaker.allow())      # one probe at a time
+
+        self.breaker.record_failure()               # failed probe re-opens
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow() and self.breaker.allow())
+
+    def test_open_circuit_fails_fast(self):
+        self.breaker.reset_timeout = 60
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with mock.patch('psycopg.connect', side_effect=AssertionError('must not dial out')):
+            with self.assertRaises(nexus.NexusUnavailable):
+                with nexus.nexus_cursor():
+                    pass
+
+    def test_cancelled_probe_frees_the_circuit(self):
+        async def hang(**kwargs):
+            await asyncio.Event().wait()
+
+        async def connected(**kwargs):
+            return _FakeAsyncConnection()
+
+        async def probe():
+            async with nexus.async_nexus_cursor() as cur:
+                await asyncio.Event().wait()
+
+        async def cancel_probe():
+            task = asyncio.create_task(probe())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        # Cancelled while connecting: nothing learned, the next call probes
+        with mock.patch('psycopg.AsyncConnection.connect', hang):
+            asyncio.run(cancel_probe())
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertFalse(self.breaker._probe_in_flight)
+
+        # Cancelled after connecting: Nexus answered, the circuit closes
+        with mock.patch('psycopg.AsyncConnection.connect', connected):
+            asyncio.run(cancel_probe())
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_connect_error_that_is_not_connectivity_frees_the_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with mock.patch('psycopg.connect', side_effect=TypeError('bad option')):
+            with self.assertRaises(TypeError):
+                nexus.get_nexus_connection()
+        self.assertTrue(self.breaker.allow())
+
+    def open_circuit(self):
+        self.breaker.reset_timeout = 60
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+    def test_projects_fall_back_to_last_known_good_list(self):
+        stub, person = NexusStub(logs_per_person=2), STUB_SALES_PEOPLE[0]
+        with stub.installed():
+            fresh = Client().get('/api/nexus/projects/', {'sales_person': person}).json()
+        self.open_circuit()
+
+        response = Client().get('/api/nexus/projects/', {'sales_person': person})
+        self.assertEqual(response.json(), {'projects': fresh['projects'], 'stale': True})
+        response = Client().get('/api/nexus/projects/', {'sales_person': 'Nobody'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_project_fallback_expires(self):
+        stub, person = NexusStub(logs_per_person=2), STUB_SALES_PEOPLE[1]
+        with stub.installed(), mock.patch.object(views, 'NEXUS_PROJECTS_FALLBACK_TTL', 0):
+            self.assertEqual(Client().get('/api/nexus/projects/', {'sales_person': person}).status_code, 200)
+        self.open_circuit()
+        self.assertEqual(Client().get('/api/nexus/projects/', {'sales_person': person}).status_code, 503)
+
+    def test_users_are_served_stale_when_nexus_is_down(self):
+        import psycopg
+        stub = NexusStub(logs_per_person=1)
+        with stub.installed():
+            fresh = Client().get('/api/nexus/users/').json()
+            self.assertNotIn('stale', fresh)
+            with mock.patch.object(stub, 'query', side_effect=psycopg.OperationalError('down')):
+                with self.assertRaises(psycopg.OperationalError):
+                    nexus.salesperson_directory.refresh()
+            stale = Client().get('/api/nexus/users/').json()
+        self.assertEqual(stale, {'users': fresh['users'], 'stale': True})
+
+    def test_users_fall_back_to_local_exports(self):
+        nexus.salesperson_directory.clear()
+        NexusExportLog.objects.create(log_id='1', sales_person='Asha', client_name='Acme', payload=[])
+        self.open_circuit()
+        response = Client().get('/api/nexus/users/')
+        self.assertEqual(response.json(), {'users': [{'name': 'Asha'}], 'stale': True})
+
+
+class TankExportTests(AdminTestCase):
+    """The catalog export streams under WSGI and ASGI alike."""
+
+    def setUp(self):
+        super().setUp()
+        for n in range(5):
+            make_tank(f'RCT{n + 1}-2', ideal_price=1000 + n, nrp=900 + n)
+
+    async def test_asgi_export_streams_blocks_without_buffering(self):
+        await Tank.objects.abulk_create(
+            Tank(model=f'RCT{n}-3', category='RCT', diameter=3.0, height=3.0, net_capacity=20.0,
+                 gross_capacity=21.0, ideal_price=1000, nrp=900)
+            for n in range(100, 100 + 2 * EXPORT_BLOCK_ROWS))
+        client = AsyncClient()
+        await client.aforce_login(await get_user_model().objects.aget(username='admin'))
+        with warnings.catch_warnings():
+            # Django warns when it must buffer a sync iterator to serve ASGI
+            warnings.simplefilter('error')
+            response = await client.get('/admin-dashboard/tanks/export/', {'format': 'csv'})
+            self.assertTrue(response.is_async)
+            blocks = [block async for block in response.streaming_content]
+        self.assertEqual(len(blocks), 1 + 3)    # header, then two full blocks and one of 5 rows
+        lines = b''.join(blocks).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['ID', 'Model'])
+        self.assertEqual(len(lines), 1 + await Tank.objects.acount())
+
+    def export(self, **params):
+        response = self.client.get('/admin-dashboard/tanks/export/', params)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export(self):
+        response, body = self.export(format='csv', type='all')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="all_tanks.csv"')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], [header for header, _, _ in EXPORT_COLUMNS])
+        self.assertEqual(len(rows), 6)
+        # Newest first, with display values
+        self.assertEqual(rows[1][1:3] + rows[1][7:10],
+                         ['RCT5-2', 'Rhino Commercial Tank', '1004.00', '904.00', 'Active'])
+
+    def test_gzip_export_is_the_csv_compressed(self):
+        response, body = self.export(format='csv.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(body), self.export(format='csv')[1])
+
+    def test_ndjson_export(self):
+        response, body = self.export(format='ndjson', type='RCT')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual({key: records[0][key] for key in ('model', 'ideal_price', 'nrp', 'status')},
+                         {'model': 'RCT5-2', 'ideal_price': 1004.0, 'nrp': 904.0, 'status': 'Active'})
+
+    def test_export_uses_effective_prices(self):
+        tank = Tank.objects.get(model='RCT1-2')
+        price_list = PriceList.objects.create(name='Revision', entry_count=1,
+                                              effective_from=timezone.now() - timedelta(days=1))
+        PriceListEntry.objects.create(price_list=price_list, tank=tank, ideal_price=1200, nrp=1100)
+        records = [json.loads(line) for line in self.export(format='ndjson')[1].decode().splitlines()]
+        prices = {record['model']: (record['ideal_price'], record['nrp']) for record in records}
+        self.assertEqual(prices['RCT1-2'], (1200.0, 1100.0))
+        self.assertEqual(prices['RCT2-2'], (1001.0, 901.0))
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/admin-dashboard/tanks/export/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class SalespersonDirectoryTests(TestCase):
+    """The directory serves stale names while Nexus is down, without hammering it."""
+
+    def test_failed_refresh_backs_off(self):
+        directory = nexus.SalespersonDirectory(ttl=0, retry_after=60)
+        directory._store(['Asha'])
+        directory._store(None)              # the background refresh failed
+        with mock.patch('calculator.nexus.threading.Thread') as thread:
+            for _ in range(3):
+                self.assertEqual(directory.get()[::2], (['Asha'], True))
+            thread.assert_not_called()
+
+            directory._refresh_at = 0.0     # retry_after has passed
+            directory.get()
+            directory.get()
+        thread.assert_called_once()
+
+    def test_etag_changes_when_names_go_stale(self):
+        stub = NexusStub(logs_per_person=1)
+        client = Client()
+        with stub.installed():
+            fresh = client.get('/api/nexus/users/')
+            nexus.salesperson_directory._store(None)
+            stale = client.get('/api/nexus/users/', HTTP_IF_NONE_MATCH=fresh['ETag'])
+            self.assertEqual(stale.status_code, 200)
+            self.assertTrue(stale.json()['stale'])
+            self.assertEqual(client.get('/api/nexus/users/', HTTP_IF_NONE_MATCH=stale['ETag']).status_code, 304)
+
+            nexus.salesperson_directory.refresh()
+            recovered = client.get('/api/nexus/users/', HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertEqual(recovered.status_code, 200)
+        self.assertNotIn('stale', recovered.json())
+        self.assertEqual(recovered['ETag'], fresh['ETag'])
+
+
+
+class TankAdminTests(TestCase):
+    """Django admin writes bump the catalog version like every other write path."""
+
+    def test_add_change_and_delete_bump_the_version(self):
+        # admin.site isn't mounted in tankmate.urls, so call the ModelAdmin directly
+        model_admin, request = TankAdmin(Tank, admin.site), RequestFactory().post('/')
+        version = CatalogState.load().version
+
+        tank = Tank(model='RCT1-2', category='RCT', diameter=3.0, height=2.0, net_capacity=14.0,
+                    gross_capacity=15.0, ideal_price=1000, nrp=900)
+        model_admin.save_model(request, tank, None, change=False)
+        tank.ideal_price = 1100
+        model_admin.save_model(request, tank, None, change=True)
+        model_admin.delete_model(request, tank)
+        make_tank('RCT2-2')
+        model_admin.delete_queryset(request, Tank.objects.all())
+
+        self.assertFalse(Tank.objects.exists())
+        self.assertEqual(CatalogState.load().version, version + 4)
@@ -12,6 +12,7 @@ urlpatterns = [
     path("api/search/",   views.tank_search,         name="tank_search"),
     path("api/models/",   views.get_models_for_type, name="get_models"),
     path("api/stats/",    views.get_category_stats,  name="get_stats"),
+    path("metrics",       views.metrics,             name="metrics"),
     path("api/nexus/projects/",  views.get_nexus_projects,    name="nexus_projects"),
     path("api/nexus/check/",     views.check_nexus_duplicate,  name="nexus_check"),
     
@@ -19,16 +20,26 @@ urlpatterns = [
     # ── Nexus integration ─────────────────────────────────────────────────
     path("api/nexus/users/",  views.get_nexus_users,  name="nexus_users"),
     path("api/nexus/export/", views.export_to_nexus,  name="nexus_export"),
+    path("api/nexus/export/batch/", views.export_to_nexus_batch, name="nexus_export_batch"),
 
     # ── Admin routes ───────────────────────────────────────────────────────
     path("admin-dashboard/",                  admin_views.admin_dashboard,       name="admin_dashboard"),
     path("admin-dashboard/tanks/",            admin_views.admin_tank_list,       name="admin_tank_list"),
     path("admin-dashboard/tank/update/",      admin_views.admin_tank_update,     name="admin_tank_update"),
     path("admin-dashboard/tank/toggle/",      admin_views.admin_tank_toggle,     name="admin_tank_toggle"),
+    path("admin-dashboard/tank/batch/",       admin_views.admin_tank_batch_update, name="admin_tank_batch_update"),
+    path("admin-dashboard/tank/bulk-status/", admin_views.admin_tank_bulk_status, name="admin_tank_bulk_status"),
+    path("admin-dashboard/catalog/validate/", admin_views.admin_catalog_validate, name="admin_catalog_validate"),
+    path("admin-dashboard/performance/",      admin_views.admin_performance,     name="admin_performance"),
+    path("admin-dashboard/performance/reset/",admin_views.admin_performance_reset,name="admin_performance_reset"),
     path("admin-dashboard/csv/upload/",       admin_views.admin_csv_upload,      name="admin_csv_upload"),
     path('download-template/',                download_tank_template,            name='download_tank_template'),
     path("admin-dashboard/csv/preview/",      admin_views.admin_csv_preview,     name="admin_csv_preview"),
     path("admin-dashboard/csv/confirm/",      admin_views.admin_csv_confirm,     name="admin_csv_confirm"),
+    path("admin-dashboard/jobs/<uuid:job_id>/",        admin_views.admin_import_job_status, name="admin_import_job_status"),
+    path("admin-dashboard/jobs/<uuid:job_id>/cancel/", admin_views.admin_import_job_cancel, name="admin_import_job_cancel"),
+    path("admin-dashboard/journal/<uuid:journal_id>/rollback/", admin_views.admin_write_journal_rollback, name="admin_write_journal_rollback"),
+    path("admin-dashboard/reprice/",          admin_views.admin_reprice,         name="admin_reprice"),
     path("admin-dashboard/tanks/export/",     admin_views.admin_tank_export,     name="admin_tank_export"),
     path("admin-dashboard/bulk-price/",       admin_views.admin_bulk_price,      name="admin_bulk_price"),
     path("admin-dashboard/bulk-price/update/",admin_views.admin_bulk_price_update,name="admin_bulk_price_update"),
@@ -1,6 +1,6 @@
-from django.http import JsonResponse, HttpResponse
+from django.http import HttpResponse
 from django.shortcuts import render, redirect
-from django.db.models import Q
+from django.db.models import Count, Max, Min, Q
 from django.db.models.functions import Cast
 from django.db.models import FloatField
 import csv
@@ -8,28 +8,45 @@ import json
 import os
 import time
 import hashlib
+import threading
 from django.contrib import messages
+from django.utils import timezone
 from .models import Tank
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.http import require_POST,require_GET
 from django.views.decorators.csrf import csrf_exempt
-
-# ── Nexus DB connection ───────────────────────────────────────────────────────
-def get_nexus_connection():
-    import psycopg2
-    return psycopg2.connect(
-        host     = os.environ.get('NEXUS_DB_HOST',     'localhost'),
-        dbname   = os.environ.get('NEXUS_DB_NAME',     'STLPL'),
-        user     = os.environ.get('NEXUS_DB_USER',     'server'),
-        password = os.environ.get('NEXUS_DB_PASSWORD', ''),
-        port     = int(os.environ.get('NEXUS_DB_PORT', 5432)),
-        connect_timeout = 8,
-    )
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection
+from django.utils.http import parse_etags
+from .nexus import (
+    NexusUnavailable, async_nexus_cursor, nexus_cursor, nexus_flight, salesperson_directory,
+)
+from .client_index import ClientNameIndex
+from .pricing import awith_effective_prices, effective_prices
+from .instrumentation import JsonResponse
+from .metrics import cache_lookup, render as render_metrics
+from .singleflight import SingleFlight
+
+
+# Last-known-good project lists, served with "stale": true while the
+# circuit breaker is open or Nexus errors out. They expire, so entries
+# for salespeople who stop using My Projects don't pile up.
+NEXUS_PROJECTS_CACHE_KEY = 'nexus:projects:{}'
+NEXUS_PROJECTS_FALLBACK_TTL = getattr(settings, 'NEXUS_PROJECTS_FALLBACK_TTL', 24 * 60 * 60)
+
+# Concurrent identical requests in a worker share one computation
+stats_flight  = SingleFlight('stats')
+search_flight = SingleFlight('search')
+
+# Query parameters tank_search reads; anything else (cache busters) is ignored
+SEARCH_PARAMS = ('category', 'capacity', 'model', 'diameter', 'height',
+                 'min_price', 'max_price', 'sort_by')
 
 
 def _parse_payload(raw):
     """
-    psycopg2 returns JSONB columns as a Python list/dict already.
+    psycopg returns JSONB columns as a Python list/dict already.
     TEXT columns come back as a string. Handle both.
     """
     if raw is None:
@@ -71,83 +88,225 @@ def map_tank_to_nexus(tank):
 # NEXUS API ENDPOINTS
 # ══════════════════════════════════════════════════════════════════════════════
 
-def get_nexus_users(request):
+async def get_nexus_users(request):
     """
     Returns distinct salesperson names from Nexus.
+
+    Served from the in-memory salesperson directory (refreshed in the
+    background every NEXUS_USERS_TTL seconds) with an ETag, so repeat
+    loads of the export modal are a 304 and never scan pricing_logs.
     """
     try:
-        conn = get_nexus_connection()
-        cur  = conn.cursor()
-        cur.execute("""
-            SELECT DISTINCT sales_person
-            FROM   nexus.pricing_logs
-            WHERE  sales_person IS NOT NULL
-              AND  sales_person <> ''
-            ORDER  BY sales_person
-        """)
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        return JsonResponse({"users": [{"name": r[0]} for r in rows]})
+        names, etag, stale = await salesperson_directory.aget()
     except Exception as e:
-        return JsonResponse({"error": str(e), "users": []}, status=500)
+        # Nexus unreachable and nothing loaded yet: fall back to the
+        # salespeople we have exported for ourselves.
+        from .models import NexusExportLog
+        names = [
+            name async for name in NexusExportLog.objects.order_by('sales_person')
+            .values_list('sales_person', flat=True).distinct()
+        ]
+        if names:
+            return JsonResponse({"users": [{"name": n} for n in names], "stale": True})
+        status = 503 if isinstance(e, NexusUnavailable) else 500
+        return JsonResponse({"error": str(e), "users": []}, status=status)
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponse(status=304)
+    else:
+        data = {"users": [{"name": n} for n in names]}
+        if stale:
+            data["stale"] = True
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _nexus_log_url(log_id):
+    NEXUS_BASE_URL = os.environ.get('NEXUS_BASE_URL', 'https://nexus.shubhamtanks.org')
+    return f"{NEXUS_BASE_URL}/log/{log_id}"
+
+
+def _prepare_export(body):
+    """
+    Validate one collection from a request body and build its Nexus payload.
+    Raises ValueError with a user-facing message if the collection is invalid.
+    """
+    if not isinstance(body, dict):
+        raise ValueError('Collection must be an object')
+    client_name  = (body.get('client_name')  or '').strip()
+    sales_person = (body.get('sales_person') or '').strip()
+    tanks        = body.get('tanks', [])
+
+    if not client_name:
+        raise ValueError('client_name is required')
+    if not sales_person:
+        raise ValueError('sales_person is required')
+    if not tanks:
+        raise ValueError('No tanks in collection')
+
+    nexus_payload = [map_tank_to_nexus(t) for t in tanks]
+
+    # ── Compute per-tank leaf hashes + Merkle root of the export ────────────
+    tank_hashes = _compute_tank_hashes(nexus_payload)
+    return {
+        'client_name':  client_name,
+        'sales_person': sales_person,
+        'payload':      nexus_payload,
+        'tank_hashes':  tank_hashes,
+        'export_hash':  _merkle_root(tank_hashes),
+    }
+
+
+# Local NexusExportLog fields written on (re-)export
+EXPORT_LOG_FIELDS = ['client_name', 'sales_person', 'tank_count', 'payload',
+                     'export_hash', 'tank_hashes', 'is_modified']
+
+
+def _export_log(log_id, export):
+    """Unsaved NexusExportLog for an export written to Nexus."""
+    from .models import NexusExportLog
+    return NexusExportLog(
+        log_id       = log_id,
+        client_name  = export['client_name'],
+        sales_person = export['sales_person'],
+        tank_count   = len(export['payload']),
+        payload      = export['payload'],
+        export_hash  = export['export_hash'],      # ← THE KEY FIELD (Merkle root)
+        tank_hashes  = export['tank_hashes'],
+        is_modified  = False,
+    )
 
 
 @csrf_exempt
-def export_to_nexus(request):
+async def export_to_nexus(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=405)
     try:
-        body         = json.loads(request.body)
-        client_name  = body.get('client_name',  '').strip()
-        sales_person = body.get('sales_person', '').strip()
-        tanks        = body.get('tanks', [])
-
-        if not client_name:
-            return JsonResponse({'error': 'client_name is required'}, status=400)
-        if not sales_person:
-            return JsonResponse({'error': 'sales_person is required'}, status=400)
-        if not tanks:
-            return JsonResponse({'error': 'No tanks in collection'}, status=400)
-
-        nexus_payload = [map_tank_to_nexus(t) for t in tanks]
-
-        # ── Compute hash of what we're about to export ──────────────────────
-        export_hash = _compute_payload_hash(nexus_payload)
+        body = json.loads(request.body)
+        try:
+            export = _prepare_export(body)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
         # ── Write to Nexus DB ────────────────────────────────────────────────
-        conn = get_nexus_connection()
-        cur  = conn.cursor()
-        cur.execute("""
-            INSERT INTO nexus.pricing_logs (client_name, sales_person, payload)
-            VALUES (%s, %s, %s::jsonb)
-            RETURNING log_id
-        """, (client_name, sales_person, json.dumps(nexus_payload)))
-        log_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        async with async_nexus_cursor(commit=True) as cur:
+            await cur.execute("""
+                INSERT INTO nexus.pricing_logs (client_name, sales_person, payload)
+                VALUES (%s, %s, %s::jsonb)
+                RETURNING log_id
+            """, (export['client_name'], export['sales_person'], json.dumps(export['payload'])))
+            log_id = (await cur.fetchone())[0]
 
         # ── Save export log with hash in TankMate's local DB ─────────────────
         # This is the record we'll check against on import
         from .models import NexusExportLog
-        NexusExportLog.objects.update_or_create(
+        log = _export_log(log_id, export)
+        await NexusExportLog.objects.aupdate_or_create(
             log_id=log_id,
-            defaults={
-                'client_name':  client_name,
-                'sales_person': sales_person,
-                'tank_count':   len(nexus_payload),
-                'payload':      nexus_payload,
-                'export_hash':  export_hash,      # ← THE KEY FIELD
-                'is_modified':  False,
-            }
+            defaults={f: getattr(log, f) for f in EXPORT_LOG_FIELDS},
         )
+        salesperson_directory.add(export['sales_person'])
+        client_index.add(export['sales_person'], _client_entry(
+            log_id, export['client_name'], log.created_at or timezone.now(),
+            log.tank_count, False))
 
-        NEXUS_BASE_URL = os.environ.get('NEXUS_BASE_URL', 'https://nexus.shubhamtanks.org')
         return JsonResponse({
             'success':      True,
             'log_id':       log_id,
-            'redirect_url': f"{NEXUS_BASE_URL}/log/{log_id}",
+            'redirect_url': _nexus_log_url(log_id),
+        })
+    except NexusUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+# Upper bound on collections per batch export request
+NEXUS_EXPORT_BATCH_LIMIT = 100
+
+
+@csrf_exempt
+def export_to_nexus_batch(request):
+    """
+    Export many collections to Nexus in a single transaction.
+
+    Body: {"collections": [{"client_name", "sales_person", "tanks"}, ...]}
+
+    Valid collections are written with one pipelined executemany of
+    INSERT ... RETURNING and logged locally with one bulk_create. Results are reported per
+    collection, in request order; invalid collections fail on their own
+    without blocking the rest.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+    try:
+        body        = json.loads(request.body)
+        collections = body.get('collections', [])
+        if not isinstance(collections, list) or not collections:
+            return JsonResponse({'error': 'collections is required'}, status=400)
+        if len(collections) > NEXUS_EXPORT_BATCH_LIMIT:
+            return JsonResponse(
+                {'error': f'At most {NEXUS_EXPORT_BATCH_LIMIT} collections per batch'}, status=400)
+
+        results  = [None] * len(collections)
+        prepared = []
+        for index, collection in enumerate(collections):
+            try:
+                prepared.append((index, _prepare_export(collection)))
+            except ValueError as e:
+                results[index] = {'index': index, 'success': False, 'error': str(e)}
+
+        if prepared:
+            rows = [(e['client_name'], e['sales_person'], json.dumps(e['payload']))
+                    for _, e in prepared]
+            try:
+                with nexus_cursor(commit=True) as cur:
+                    cur.executemany("""
+                        INSERT INTO nexus.pricing_logs (client_name, sales_person, payload)
+                        VALUES (%s, %s, %s::jsonb)
+                        RETURNING log_id
+                    """, rows, returning=True)
+                    # One result set per row, in row order
+                    returned = [cur.fetchone()]
+                    while cur.nextset():
+                        returned.append(cur.fetchone())
+            except Exception as e:
+                # One transaction: nothing was written to Nexus
+                for index, _ in prepared:
+                    results[index] = {'index': index, 'success': False, 'error': str(e)}
+                status = 503 if isinstance(e, NexusUnavailable) else 500
+                return JsonResponse({'success': False, 'results': results}, status=status)
+
+            from .models import NexusExportLog
+            logs = [_export_log(row[0], export) for row, (_, export) in zip(returned, prepared)]
+            NexusExportLog.objects.bulk_create(
+                logs,
+                update_conflicts=True,
+                unique_fields=['log_id'],
+                update_fields=EXPORT_LOG_FIELDS,
+            )
+            for log in logs:
+                salesperson_directory.add(log.sales_person)
+                client_index.add(log.sales_person, _client_entry(
+                    log.log_id, log.client_name, log.created_at, log.tank_count, False))
+
+            for log, (index, _) in zip(logs, prepared):
+                results[index] = {
+                    'index':        index,
+                    'success':      True,
+                    'log_id':       log.log_id,
+                    'client_name':  log.client_name,
+                    'redirect_url': _nexus_log_url(log.log_id),
+                }
+
+        return JsonResponse({
+            'success':  all(r['success'] for r in results),
+            'exported': sum(1 for r in results if r['success']),
+            'failed':   sum(1 for r in results if not r['success']),
+            'results':  results,
         })
     except Exception as e:
         import traceback; traceback.print_exc()
@@ -189,15 +348,37 @@ def home(request):
     return render(request, "calculator/home.html")
 
 
-def tank_search(request):
-    category       = request.GET.get("category")
-    capacity_value = request.GET.get("capacity")
-    model_value    = request.GET.get("model")
-    diameter_value = request.GET.get("diameter")
-    height_value   = request.GET.get("height")
-    min_price      = request.GET.get("min_price")
-    max_price      = request.GET.get("max_price")
-    sort_by        = request.GET.get("sort_by", "capacity")
+def _search_params(request):
+    """Known search parameters, trimmed, without empty values."""
+    params = {}
+    for name in SEARCH_PARAMS:
+        value = request.GET.get(name, '').strip()
+        if value:
+            params[name] = value.upper() if name == 'category' else value
+    return params
+
+
+async def tank_search(request):
+    """
+    Tank search. Concurrent requests with the same normalized parameters
+    (search_flight) wait for one search and share its result.
+    """
+    params = _search_params(request)
+    key = '&'.join(f'{name}={value}' for name, value in sorted(params.items()))
+    data, status = await search_flight.ado(key, lambda: _search(params))
+    return JsonResponse(data, status=status)
+
+
+async def _search(params):
+    """(data, status) of a search."""
+    category       = params.get("category")
+    capacity_value = params.get("capacity")
+    model_value    = params.get("model")
+    diameter_value = params.get("diameter")
+    height_value   = params.get("height")
+    min_price      = params.get("min_price")
+    max_price      = params.get("max_price")
+    sort_by        = params.get("sort_by", "capacity")
 
     results = []
     search_info = {"category": category or "all", "search_type": None}
@@ -206,10 +387,11 @@ def tank_search(request):
         base_query = Tank.objects.filter(category=category.upper(), is_active=True)
     else:
         base_query = Tank.objects.filter(is_active=True)
+    base_query = await awith_effective_prices(base_query)
 
     if model_value and model_value.strip():
         tanks = base_query.filter(model__icontains=model_value.strip())
-        for tank in tanks:
+        async for tank in tanks:
             results.append(format_tank_result(tank))
         search_info["search_type"] = "model"
         search_info["query"] = model_value.strip()
@@ -226,7 +408,7 @@ def tank_search(request):
                 height__lte=target_height + tolerance,
             )
             dimension_results = []
-            for tank in tanks:
+            async for tank in tanks:
                 diameter_diff = abs(tank.diameter - target_diameter)
                 height_diff   = abs(tank.height - target_height)
                 dimension_results.append({
@@ -245,7 +427,7 @@ def tank_search(request):
                                  "diameter": target_diameter,
                                  "height": target_height})
         except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid dimension values"}, status=400)
+            return {"error": "Invalid dimension values"}, 400
 
     elif capacity_value:
         try:
@@ -256,7 +438,7 @@ def tank_search(request):
                 net_capacity__lte=target_capacity * (1 + tolerance),
             )
             capacity_results = sorted(
-                [{"tank": t, "diff": abs(t.net_capacity - target_capacity)} for t in tanks],
+                [{"tank": t, "diff": abs(t.net_capacity - target_capacity)} async for t in tanks],
                 key=lambda x: x["diff"]
             )[:20]
             for item in capacity_results:
@@ -271,7 +453,7 @@ def tank_search(request):
                 results.append(result)
             search_info.update({"search_type": "capacity", "capacity_kl": target_capacity})
         except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid capacity value"}, status=400)
+            return {"error": "Invalid capacity value"}, 400
 
     elif diameter_value:
         try:
@@ -281,11 +463,11 @@ def tank_search(request):
                 diameter__gte=target_diameter - tolerance,
                 diameter__lte=target_diameter + tolerance,
             ).order_by('diameter', 'net_capacity')[:20]
-            for tank in tanks:
+            async for tank in tanks:
                 results.append(format_tank_result(tank))
             search_info.update({"search_type": "diameter", "diameter": target_diameter})
         except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid diameter value"}, status=400)
+            return {"error": "Invalid diameter value"}, 400
 
     elif height_value:
         try:
@@ -295,15 +477,15 @@ def tank_search(request):
                 height__gte=target_height - tolerance,
                 height__lte=target_height + tolerance,
             ).order_by('height', 'net_capacity')[:20]
-            for tank in tanks:
+            async for tank in tanks:
                 results.append(format_tank_result(tank))
             search_info.update({"search_type": "height", "height": target_height})
         except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid height value"}, status=400)
+            return {"error": "Invalid height value"}, 400
 
     else:
         tanks = base_query.order_by('net_capacity')[:50]
-        for tank in tanks:
+        async for tank in tanks:
             results.append(format_tank_result(tank))
         search_info["search_type"] = "browse"
 
@@ -320,7 +502,7 @@ def tank_search(request):
             results = filtered
             search_info["price_filtered"] = True
         except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid price values"}, status=400)
+            return {"error": "Invalid price values"}, 400
 
     if sort_by == "price_asc":
         results.sort(key=lambda x: float(x["ideal_price"]))
@@ -332,10 +514,11 @@ def tank_search(request):
         results.sort(key=lambda x: x["net_capacity"])
         search_info["sorted_by"] = "capacity_low_to_high"
 
-    return JsonResponse({"results": results, "search_info": search_info, "count": len(results)})
+    return {"results": results, "search_info": search_info, "count": len(results)}, 200
 
 
 def format_tank_result(tank):
+    ideal_price, nrp = effective_prices(tank)
     return {
         "category":               tank.category,
         "category_name":          tank.get_category_display_name(),
@@ -346,23 +529,24 @@ def format_tank_result(tank):
         "gross_capacity":         tank.gross_capacity,
         "capacity_display":       tank.get_capacity_display(),
         "gross_capacity_display": tank.get_gross_capacity_display(),
-        "ideal_price":            float(tank.ideal_price),
-        "nrp":                    float(tank.nrp),
-        "price_display":          tank.get_price_display(),
-        "nrp_display":            tank.get_nrp_display(),
+        "ideal_price":            float(ideal_price),
+        "nrp":                    float(nrp),
+        "price_display":          f"₹{ideal_price:,.0f}",
+        "nrp_display":            f"₹{nrp:,.0f}",
         "dimensions_display":     tank.get_dimensions_display(),
-        "price_per_kl":           round(tank.price_per_kl, 2) if tank.price_per_kl else 0,
+        "price_per_kl":           round(float(ideal_price) / tank.net_capacity, 2) if tank.net_capacity > 0 else 0,
     }
 
 
-def get_models_for_type(request):
+async def get_models_for_type(request):
     category = request.GET.get("category")
     query    = request.GET.get("q", "").strip()
     if len(query) < 2:
         return JsonResponse({"models": [], "count": 0})
 
     tanks = Tank.objects.filter(category=category.upper()) if category else Tank.objects.all()
-    tanks = tanks.filter(Q(model__icontains=query)).order_by('diameter', 'height')[:50]
+    tanks = await awith_effective_prices(tanks.filter(Q(model__icontains=query)))
+    tanks = tanks.order_by('diameter', 'height')[:50]
 
     models = [{
         "model":         tank.model,
@@ -371,36 +555,68 @@ def get_models_for_type(request):
         "diameter":      tank.diameter,
         "height":        tank.height,
         "net_capacity":  tank.net_capacity,
-        "price":         float(tank.ideal_price),
-    } for tank in tanks]
+        "price":         float(effective_prices(tank)[0]),
+    } async for tank in tanks]
 
     return JsonResponse({"models": models, "count": len(models)})
 
 
-def get_category_stats(request):
+async def get_category_stats(request):
+    """
+    Count and capacity/price ranges per category, from one grouped query
+    that concurrent requests share (stats_flight).
+    """
+    return JsonResponse({"stats": await stats_flight.ado('stats', _category_stats)})
+
+
+async def _category_stats():
+    # Price ranges use the prices search shows, effective price lists included
+    tanks = await awith_effective_prices(Tank.objects.order_by())
+    ranges = {
+        row['category']: row
+        async for row in tanks.values('category').annotate(
+            count=Count('id'),
+            min_capacity=Min('net_capacity'),         max_capacity=Max('net_capacity'),
+            min_price=Min('effective_ideal_price'),   max_price=Max('effective_ideal_price'),
+        )
+    }
+
     stats = {}
     for category_code, category_name in Tank.CATEGORY_CHOICES:
-        tanks = Tank.objects.filter(category=category_code)
-        count = tanks.count()
-        if count > 0:
+        row = ranges.get(category_code)
+        if row:
             stats[category_code] = {
                 "name":         category_name,
-                "count":        count,
-                "min_capacity": tanks.order_by('net_capacity').first().net_capacity,
-                "max_capacity": tanks.order_by('-net_capacity').first().net_capacity,
-                "min_price":    float(tanks.order_by('ideal_price').first().ideal_price),
-                "max_price":    float(tanks.order_by('-ideal_price').first().ideal_price),
+                "count":        row['count'],
+                "min_capacity": row['min_capacity'],
+                "max_capacity": row['max_capacity'],
+                "min_price":    float(row['min_price']),
+                "max_price":    float(row['max_price']),
             }
-    all_tanks = Tank.objects.all()
+    rows = list(ranges.values())
     stats["ALL"] = {
         "name":         "Universal Search",
-        "count":        all_tanks.count(),
-        "min_capacity": all_tanks.order_by('net_capacity').first().net_capacity if all_tanks.exists() else 0,
-        "max_capacity": all_tanks.order_by('-net_capacity').first().net_capacity if all_tanks.exists() else 0,
-        "min_price":    float(all_tanks.order_by('ideal_price').first().ideal_price) if all_tanks.exists() else 0,
-        "max_price":    float(all_tanks.order_by('-ideal_price').first().ideal_price) if all_tanks.exists() else 0,
+        "count":        sum(row['count'] for row in rows),
+        "min_capacity": min((row['min_capacity'] for row in rows), default=0),
+        "max_capacity": max((row['max_capacity'] for row in rows), default=0),
+        "min_price":    float(min((row['min_price'] for row in rows), default=0)),
+        "max_price":    float(max((row['max_price'] for row in rows), default=0)),
     }
-    return JsonResponse({"stats": stats})
+    return stats
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint (see calculator.metrics). When
+    METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    import hmac
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
 
 
 def download_tank_template(request):
@@ -412,61 +628,105 @@ def download_tank_template(request):
     return response
 
 
-def check_nexus_duplicate(request):
+# ── Client-name typeahead index ─────────────────────────────────────────────
+
+client_index = ClientNameIndex(ttl=getattr(settings, 'NEXUS_CLIENT_INDEX_TTL', 300))
+
+
+def _client_entry(log_id, client_name, created_at, tank_count, is_locked):
+    return {
+        'log_id':      log_id,
+        'client_name': client_name,
+        'created_at':  created_at,
+        'tank_count':  tank_count,
+        'is_locked':   is_locked,
+    }
+
+
+async def _alocal_client_entries(sales_person):
+    """Seed a salesperson's index bucket from TankMate's own export log."""
+    from .models import NexusExportLog
+    logs = (NexusExportLog.objects
+            .filter(sales_person__iexact=sales_person)
+            .values_list('log_id', 'client_name', 'created_at', 'tank_count', 'is_modified'))
+    return [_client_entry(*row) async for row in logs]
+
+
+def _sync_client_index(sales_person):
+    """
+    Merge every Nexus pricing_logs row for a salesperson into the index.
+    Runs in a background thread (and closes that thread's DB connection),
+    at most once per NEXUS_CLIENT_INDEX_TTL per worker and salesperson.
+    """
+    if not client_index.begin_sync(sales_person):
+        return
+    entries = None
+    try:
+        with nexus_cursor() as cur:
+            cur.execute("""
+                SELECT log_id, client_name, created_at, payload
+                FROM   nexus.pricing_logs
+                WHERE  LOWER(sales_person) = LOWER(%s)
+            """, (sales_person,))
+            rows = cur.fetchall()
+
+        from .models import NexusExportLog
+        local_logs = {
+            log.log_id: log
+            for log in NexusExportLog.objects.filter(sales_person__iexact=sales_person)
+        }
+        entries = []
+        for log_id, client_name, created_at, raw_payload in rows:
+            payload = _parse_payload(raw_payload)
+            changes = _diff_payload(_local_export_log(local_logs, log_id), payload)
+            entries.append(_client_entry(log_id, client_name, created_at,
+                                         len(payload), changes is not None))
+    except Exception:
+        pass
+    finally:
+        client_index.finish_sync(sales_person, entries)
+        connection.close()
+
+
+async def check_nexus_duplicate(request):
+    """
+    Typeahead for possible duplicate collections while naming an export.
+
+    Answered from the in-memory client-name index, never from Nexus
+    directly; the salesperson's Nexus rows are synced into the index in
+    the background (first use, then every NEXUS_CLIENT_INDEX_TTL seconds).
+    """
     sales_person = request.GET.get('sales_person', '').strip()
     q            = request.GET.get('q', '').strip()
 
     if not sales_person or len(q) < 2:
         return JsonResponse({'matches': []})
 
-    try:
-        conn = get_nexus_connection()
-        cur  = conn.cursor()
-        cur.execute("""
-            SELECT log_id, client_name, created_at, payload
-            FROM   nexus.pricing_logs
-            WHERE  LOWER(sales_person) = LOWER(%s)
-              AND  LOWER(client_name)  LIKE LOWER(%s)
-            ORDER  BY created_at DESC
-            LIMIT  6
-        """, (sales_person, f'%{q}%'))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        return JsonResponse({'matches': [], 'error': str(e)}, status=500)
-
-    from .models import NexusExportLog
-    local_logs = {
-        log.log_id: log
-        for log in NexusExportLog.objects.filter(
-            sales_person__iexact=sales_person,
-            log_id__in=[r[0] for r in rows]
-        )
-    }
+    if not client_index.has_bucket(sales_person):
+        entries = await _alocal_client_entries(sales_person)
+        client_index.bucket(sales_person, loader=lambda: entries)
+    if client_index.needs_sync(sales_person):
+        threading.Thread(target=_sync_client_index, args=(sales_person,), daemon=True).start()
 
     matches = []
-    for log_id, client_name, created_at, raw_payload in rows:
-        payload     = _parse_payload(raw_payload)
-        local_log   = local_logs.get(log_id)
-        export_hash = local_log.export_hash if local_log else None
-        is_modified = _payload_is_modified(export_hash, payload)
-
+    for entry in client_index.search(sales_person, q):
+        created_at = entry['created_at']
         matches.append({
-            'log_id':      log_id,
-            'client_name': client_name,
-            'tank_count':  len(payload),
+            'log_id':      entry['log_id'],
+            'client_name': entry['client_name'],
+            'tank_count':  entry['tank_count'],
             'created_at':  created_at.strftime('%d %b %Y') if created_at else '',
-            'is_locked':   is_modified,
-            'can_import':  not is_modified,
+            'is_locked':   entry['is_locked'],
+            'can_import':  not entry['is_locked'],
+            'score':       entry['score'],
         })
 
-    return JsonResponse({'matches': matches})
+    return JsonResponse({'matches': matches, 'synced': client_index.is_synced(sales_person)})
 
 ## ── ALSO ADD THIS to get_nexus_projects if not already present ──────
 ## (used by "My Projects" modal - same pattern but no search filter)
 
-def get_nexus_projects(request):
+async def get_nexus_projects(request):
     """
     Returns all past projects for a salesperson.
     For each project, checks if Nexus payload has been modified
@@ -476,29 +736,38 @@ def get_nexus_projects(request):
     if not sales_person:
         return JsonResponse({'error': 'sales_person required', 'projects': []}, status=400)
 
+    cache_key = NEXUS_PROJECTS_CACHE_KEY.format(hashlib.md5(sales_person.lower().encode('utf-8')).hexdigest())
+
+    async def fetch():
+        async with async_nexus_cursor() as cur:
+            await cur.execute("""
+                SELECT log_id, client_name, created_at, payload
+                FROM   nexus.pricing_logs
+                WHERE  LOWER(sales_person) = LOWER(%s)
+                ORDER  BY created_at DESC
+                LIMIT  50
+            """, (sales_person,))
+            return await cur.fetchall()
+
     try:
-        conn = get_nexus_connection()
-        cur  = conn.cursor()
-        cur.execute("""
-            SELECT log_id, client_name, created_at, payload
-            FROM   nexus.pricing_logs
-            WHERE  LOWER(sales_person) = LOWER(%s)
-            ORDER  BY created_at DESC
-            LIMIT  50
-        """, (sales_person,))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        # Reps opening My Projects together share one Nexus query
+        rows = await nexus_flight.ado(f'projects:{sales_person.lower()}', fetch)
     except Exception as e:
-        import traceback; traceback.print_exc()
-        return JsonResponse({'error': str(e), 'projects': []}, status=500)
+        if not isinstance(e, NexusUnavailable):
+            import traceback; traceback.print_exc()
+        projects = await cache.aget(cache_key)
+        cache_lookup('nexus_projects_fallback', projects is not None)
+        if projects is not None:
+            return JsonResponse({'projects': projects, 'stale': True})
+        status = 503 if isinstance(e, NexusUnavailable) else 500
+        return JsonResponse({'error': str(e), 'projects': []}, status=status)
 
     # ── Load all local export logs for this salesperson in ONE query ──────────
     # This is fast: one SQLite SELECT, no loops, no N+1 queries
     from .models import NexusExportLog
     local_logs = {
         log.log_id: log
-        for log in NexusExportLog.objects.filter(sales_person__iexact=sales_person)
+        async for log in NexusExportLog.objects.filter(sales_person__iexact=sales_person)
     }
 
     projects = []
@@ -507,24 +776,20 @@ def get_nexus_projects(request):
         tank_count = len(payload)
         
         # ── Determine lock status ─────────────────────────────────────────────
-        local_log    = local_logs.get(log_id)
-        export_hash  = local_log.export_hash if local_log else None
-        is_modified  = _payload_is_modified(export_hash, payload)
+        local_log    = _local_export_log(local_logs, log_id)
+        changes      = _diff_payload(local_log, payload)
+        is_modified  = changes is not None
         
         # If we detect modification, persist it to local DB so we don't
         # recompute next time (auto-lock on first detection)
         if is_modified and local_log and not local_log.is_modified:
             local_log.is_modified       = True
-            local_log.modification_type = 'nexus_modified'
-            local_log.save(update_fields=['is_modified', 'modification_type', 'updated_at'])
-
-        lock_reason = None
-        if is_modified:
-            # Try to give a specific reason
-            if _payload_has_accessories(payload):
-                lock_reason = 'Accessories were added in Nexus'
-            else:
-                lock_reason = 'Collection was edited in Nexus'
+            local_log.modification_type = _modification_type(changes, payload)
+            await local_log.asave(update_fields=['is_modified', 'modification_type', 'updated_at'])
+
+        lock_reason = _lock_reason(changes, payload) if is_modified else None
+        client_index.add(sales_person, _client_entry(
+            log_id, client_name, created_at, tank_count, is_modified))
 
         projects.append({
             'log_id':      log_id,
@@ -536,20 +801,32 @@ def get_nexus_projects(request):
             'is_locked':   is_modified,
             'lock_reason': lock_reason,
             'can_import':  not is_modified,
+            # Tank keys that differ from the export (None when unchanged),
+            # so unchanged tanks can still be re-imported selectively
+            'changes':     changes,
         })
 
+    await cache.aset(cache_key, projects, timeout=NEXUS_PROJECTS_FALLBACK_TTL)
     return JsonResponse({'projects': projects})
 
 
 
+def _local_export_log(local_logs, log_id):
+    """
+    Local NexusExportLog for a Nexus row. Nexus returns log_id as an
+    integer while the local mirror stores it as text, so look up by str.
+    """
+    return local_logs.get(str(log_id))
+
+
 def _compute_payload_hash(tanks: list) -> str:
     """
     Compute a stable SHA-256 hash of the base tank fields only.
     
-    We hash ONLY the fields TankMate originally sent — not accessories.
-    This means:
-      - If Nexus adds accessories → hash changes → LOCKED
-      - If nothing changes → hash matches → ALLOWED
+    Legacy whole-collection fingerprint. Exports made before per-tank
+    leaf hashes existed only have this hash stored, so it is still used
+    to check those logs. New exports store a Merkle root instead
+    (see _compute_tank_hashes / _merkle_root).
     
     Sorting keys and the list itself ensures the hash is stable
     regardless of field insertion order.
@@ -573,6 +850,117 @@ def _compute_payload_hash(tanks: list) -> str:
     return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
 
 
+# Fields covered by a per-tank leaf hash: what TankMate sent, plus the
+# accessory fields Nexus fills in, so adding accessories is detected too.
+LEAF_FIELDS = ['tankModel', 'tankHeight', 'tankDiameter',
+               'netCapacity', 'grossCapacity', 'tankCost',
+               'accessoriesList', 'nozzlesList', 'antivortexList',
+               'accessoriesCost', 'nozzlesCost', 'antiNozCost']
+
+
+def _compute_tank_hashes(tanks: list) -> dict:
+    """
+    Compute one SHA-256 leaf hash per tank, keyed by tank model.
+    
+    A model that appears more than once in a collection gets a
+    '#n' suffix on its later occurrences so every tank has its own leaf.
+    """
+    leaves = {}
+    seen   = {}
+    for tank in tanks:
+        if not isinstance(tank, dict):
+            continue
+        model = str(tank.get('tankModel', ''))
+        occurrence  = seen.get(model, 0)
+        seen[model] = occurrence + 1
+        key = model if occurrence == 0 else f"{model}#{occurrence}"
+
+        entry = {f: tank.get(f, '') for f in LEAF_FIELDS}
+        serialized = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+        leaves[key] = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    return leaves
+
+
+def _merkle_root(leaves: dict) -> str:
+    """
+    Fold leaf hashes (sorted by key) pairwise into a single Merkle root.
+    An odd node at the end of a level is paired with itself.
+    """
+    level = [bytes.fromhex(leaves[key]) for key in sorted(leaves)]
+    if not level:
+        return hashlib.sha256(b'').hexdigest()
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest()
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def _diff_payload(local_log, current_payload: list):
+    """
+    Compare the current Nexus payload against what TankMate exported.
+    
+    Returns None when nothing changed, otherwise a dict:
+        {'added': [...], 'removed': [...], 'edited': [...]}
+    listing tank keys. Legacy logs without leaf hashes can only say
+    that *something* changed, so all three lists are empty for them.
+    """
+    stored_leaves = local_log.tank_hashes if local_log else None
+
+    if not stored_leaves:
+        export_hash = local_log.export_hash if local_log else None
+        if _payload_is_modified(export_hash, current_payload):
+            return {'added': [], 'removed': [], 'edited': []}
+        return None
+
+    current_leaves = _compute_tank_hashes(current_payload)
+
+    # Root match → identical collection, no need to walk the leaves
+    if _merkle_root(current_leaves) == local_log.export_hash:
+        return None
+
+    added   = sorted(k for k in current_leaves if k not in stored_leaves)
+    removed = sorted(k for k in stored_leaves if k not in current_leaves)
+    edited  = sorted(k for k in current_leaves
+                     if k in stored_leaves and current_leaves[k] != stored_leaves[k])
+    if not (added or removed or edited):
+        return None
+    return {'added': added, 'removed': removed, 'edited': edited}
+
+
+def _modification_type(changes, payload) -> str:
+    """Short machine-readable label for NexusExportLog.modification_type."""
+    if changes['edited'] and _payload_has_accessories(payload):
+        return 'accessories_added'
+    if changes['edited']:
+        return 'tanks_edited'
+    if changes['added']:
+        return 'tanks_added'
+    if changes['removed']:
+        return 'tanks_removed'
+    return 'nexus_modified'
+
+
+def _lock_reason(changes, payload) -> str:
+    """Human readable lock reason shown in the My Projects modal."""
+    if not (changes['added'] or changes['removed'] or changes['edited']):
+        # Legacy log: only a collection-wide hash is available
+        if _payload_has_accessories(payload):
+            return 'Accessories were added in Nexus'
+        return 'Collection was edited in Nexus'
+
+    if changes['edited'] and _payload_has_accessories(payload):
+        return 'Accessories were added in Nexus'
+
+    parts = []
+    for key, verb in (('edited', 'edited'), ('added', 'added'), ('removed', 'removed')):
+        count = len(changes[key])
+        if count:
+            parts.append(f"{count} tank{'s' if count != 1 else ''} {verb}")
+    return f"{', '.join(parts).capitalize()} in Nexus"
+
+
 def _payload_is_modified(original_hash: str, current_payload: list) -> bool:
     """
     Returns True if the current Nexus payload differs from what TankMate exported.
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings (read automatically from the working directory).
+
+Workers are uvicorn ASGI workers serving tankmate.asgi: async views
+(search, Nexus) wait on I/O without holding a thread, so one worker
+serves many of them at once. Sync views still run one at a time per
+worker in its thread-sensitive executor, as under WSGI.
+
+Workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR, so /metrics reports every worker whichever
+one answers the scrape. The directory is emptied when the master
+starts and a dead worker's live gauges are dropped when it exits.
+"""
+import os
+import shutil
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/tankmate-metrics')
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,6 +2,8 @@
 ASGI config for tankmate project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; the lifespan protocol (sent once per uvicorn worker)
+opens and closes the worker's Nexus connection pool on the server's loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +15,24 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tankmate.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def lifespan(receive, send):
+    from calculator.nexus import close_async_pool, open_async_pool
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await open_async_pool()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    return await django_application(scope, receive, send)
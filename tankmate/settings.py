@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'calculator.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,6 +89,32 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait this many seconds for the write lock instead of failing
+            # with "database is locked" while an import batch commits
+            'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+            # WAL lets readers continue while a writer holds the lock
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            # Take the write lock at BEGIN so transactions queue on the busy
+            # timeout instead of deadlocking on a read→write upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+#
+# Shared by every gunicorn worker on the host through files in CACHE_DIR:
+# the admin performance page merges the workers' request timings here,
+# and SINGLE_FLIGHT_SHARED locks need it. A per-process cache (LocMem)
+# would leave each worker seeing only its own numbers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/tankmate-cache'),
     }
 }
 
@@ -138,4 +165,71 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'custom_login'
 LOGIN_REDIRECT_URL = 'admin_dashboard'
-LOGOUT_REDIRECT_URL = 'custom_login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'custom_login'
+
+# Nexus circuit breaker: open after this many consecutive connection
+# failures, then let one probe through every reset timeout (seconds).
+NEXUS_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('NEXUS_BREAKER_FAILURE_THRESHOLD', 3))
+NEXUS_BREAKER_RESET_TIMEOUT     = int(os.environ.get('NEXUS_BREAKER_RESET_TIMEOUT', 30))
+
+# psycopg 3 connection pool used by the async Nexus views, one per ASGI
+# worker (opened at lifespan startup, see tankmate.asgi); requests wait
+# up to NEXUS_POOL_TIMEOUT seconds for a connection.
+NEXUS_POOL_MIN_SIZE = int(os.environ.get('NEXUS_POOL_MIN_SIZE', 1))
+NEXUS_POOL_MAX_SIZE = int(os.environ.get('NEXUS_POOL_MAX_SIZE', 10))
+NEXUS_POOL_TIMEOUT  = float(os.environ.get('NEXUS_POOL_TIMEOUT', 8))
+
+# Seconds before the cached Nexus salesperson directory is refreshed
+# (in the background) from nexus.pricing_logs.
+NEXUS_USERS_TTL = int(os.environ.get('NEXUS_USERS_TTL', 300))
+
+# Seconds before a failed refresh of the directory is retried; the
+# stale names are served meanwhile.
+NEXUS_USERS_RETRY_AFTER = int(os.environ.get('NEXUS_USERS_RETRY_AFTER', 30))
+
+# Seconds a salesperson's last-known-good My Projects list is kept as
+# the fallback while Nexus is unavailable.
+NEXUS_PROJECTS_FALLBACK_TTL = int(os.environ.get('NEXUS_PROJECTS_FALLBACK_TTL', 24 * 60 * 60))
+
+# Seconds before a salesperson's Nexus rows are re-synced into the
+# in-memory client-name typeahead index.
+NEXUS_CLIENT_INDEX_TTL = int(os.environ.get('NEXUS_CLIENT_INDEX_TTL', 300))
+
+# How confirmed catalog imports run: 'thread' (background thread in the
+# web worker), 'inline' (inside the request) or 'command' (queued for
+# `manage.py run_import_jobs`).
+IMPORT_JOB_RUNNER = os.environ.get('IMPORT_JOB_RUNNER', 'thread')
+
+# A running import job that has not saved progress for this many seconds
+# lost its worker and is marked failed (its journal can undo it).
+IMPORT_JOB_STALE_AFTER = int(os.environ.get('IMPORT_JOB_STALE_AFTER', 600))
+
+# Bulk catalog writes commit in batches sized to hold the database write
+# lock for about this many seconds each (0 = fixed batch size).
+BULK_WRITE_TIME_BUDGET = float(os.environ.get('BULK_WRITE_TIME_BUDGET', 0.25))
+
+# Per-request timing (Server-Timing header, admin performance page).
+# Every request is timed; this fraction also gets query, Nexus and
+# serialization detail. Per-worker aggregates reach the cache every
+# REQUEST_TIMING_FLUSH_INTERVAL seconds.
+REQUEST_TIMING_ENABLED        = os.environ.get('REQUEST_TIMING_ENABLED', '1') == '1'
+REQUEST_TIMING_SAMPLE_RATE    = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.1))
+REQUEST_TIMING_FLUSH_INTERVAL = int(os.environ.get('REQUEST_TIMING_FLUSH_INTERVAL', 30))
+
+# Check sampled requests against calculator.instrumentation.QUERY_BUDGETS:
+# '' (off), 'warn' (log) or 'raise' (fail the request). Meant for
+# staging, together with REQUEST_TIMING_SAMPLE_RATE=1.
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', '')
+
+# Bearer token required to scrape /metrics (empty = open). Under gunicorn,
+# PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) aggregates all workers.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Single-flight coalescing (calculator.singleflight). Identical requests
+# in flight in one worker always share a computation; with
+# SINGLE_FLIGHT_SHARED=1, expensive Nexus reads are also coalesced across
+# workers through a lock in the shared cache (CACHES), held for at most
+# SINGLE_FLIGHT_LOCK_TIMEOUT seconds. The file cache's add() is not
+# atomic, so two workers can occasionally both lead a flight.
+SINGLE_FLIGHT_SHARED       = os.environ.get('SINGLE_FLIGHT_SHARED', '0') == '1'
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 10))